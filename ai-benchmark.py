@@ -0,0 +1,523 @@
+# FocusFlow AI Engine - Benchmark Suite
+#
+# Usage:
+#   python ai-benchmark.py                  # compare with benchmarks/baseline.json
+#   python ai-benchmark.py --save-baseline benchmarks/baseline.json
+#   python ai-benchmark.py --users 500 --compare bench-baseline.json
+import argparse
+import functools
+import importlib.util
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+def _load_engine():
+    """Import ai-engine.py, whose file name is not a valid module name"""
+    module = sys.modules.get('ai_engine')
+    if module is not None:
+        return module
+    
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai-engine.py')
+    spec = importlib.util.spec_from_file_location('ai_engine', path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['ai_engine'] = module
+    spec.loader.exec_module(module)
+    return module
+
+ai_engine = _load_engine()
+
+class SyntheticWorkload:
+    """
+    Seeded generator of realistic user_data payloads for FocusFlowAI.
+    Each user gets a preferred working window, a productivity trend and a
+    procrastination tendency, so the detectors see structured rather than
+    uniform noise. The same seed always yields the same payloads.
+    """
+    
+    priorities = ['low', 'medium', 'high', 'urgent']
+    priority_probabilities = [0.25, 0.4, 0.25, 0.1]
+    
+    def __init__(self, seed: int = 42, tasks_per_user: int = 50, logs_per_user: int = 200,
+                 min_history_days: int = 7, max_history_days: int = 365,
+                 end_date: datetime = datetime(2024, 6, 30)):
+        self.seed = seed
+        self.tasks_per_user = tasks_per_user
+        self.logs_per_user = logs_per_user
+        self.min_history_days = min_history_days
+        self.max_history_days = max_history_days
+        self.end_date = end_date
+    
+    def users(self, n_users: int) -> List[Dict]:
+        """n_users payloads; user i is identical for a given seed regardless of n_users"""
+        return list(self.iter_users(n_users))
+    
+    def iter_users(self, n_users: int) -> Iterator[Dict]:
+        for user_index in range(n_users):
+            yield self.user(user_index)
+    
+    def user(self, user_index: int) -> Dict:
+        """Payload for one user, in the shape generate_comprehensive_insights expects"""
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(0, user_index)))
+        history_days = int(rng.integers(self.min_history_days, self.max_history_days + 1))
+        start_date = self.end_date - timedelta(days=history_days)
+        peak_hour = int(rng.integers(7, 20))
+        procrastination = rng.uniform(0.5, 3.0)
+        
+        recent_tasks = self.tasks(rng, self.tasks_per_user, start_date, procrastination, user_index)
+        time_logs = self._time_logs(rng, start_date, peak_hour)
+        historical_data = self._history(rng, history_days, start_date)
+        scores = [day['productivity_score'] for day in historical_data]
+        
+        total_tasks = int(rng.integers(1, 12))
+        estimated = int(rng.integers(0, 8)) * 30
+        return {
+            'user_id': f"user-{user_index}",
+            'tasks_completed': int(rng.integers(0, total_tasks + 1)),
+            'total_tasks': total_tasks,
+            'estimated_minutes': estimated,
+            'actual_minutes': int(estimated * rng.lognormal(0.1, 0.3)),
+            'habits_completed': int(rng.integers(0, 5)),
+            'total_habits': int(rng.integers(0, 5)),
+            'focus_sessions': int(rng.integers(0, 6)),
+            'distraction_events': int(rng.poisson(2)),
+            'recent_tasks': recent_tasks,
+            'time_logs': time_logs,
+            'historical_data': historical_data,
+            'avg_daily_working_hours': round(float(rng.normal(8, 1.5)), 2),
+            'productivity_trend': scores[-14:],
+            'habit_completion_rate': round(float(rng.beta(5, 2)), 3),
+            'task_overdue_rate': round(float(rng.beta(2, 8)), 3)
+        }
+    
+    def training_tasks(self, n_tasks: int) -> List[Dict]:
+        """Cohort-wide task history for training ProcrastinationDetector"""
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(1,)))
+        start_date = self.end_date - timedelta(days=self.max_history_days)
+        return self.tasks(rng, n_tasks, start_date, rng.uniform(0.5, 3.0), 'train')
+    
+    def tasks(self, rng: np.random.Generator, n_tasks: int, start_date: datetime,
+              procrastination: float, prefix) -> List[Dict]:
+        span_hours = max((self.end_date - start_date).total_seconds() / 3600, 1)
+        created_offsets = np.sort(rng.uniform(0, span_hours, n_tasks))
+        start_delays = rng.lognormal(np.log(procrastination * 4), 1.0, n_tasks)
+        work_hours = rng.lognormal(0, 0.6, n_tasks)
+        estimated = rng.choice([15, 30, 45, 60, 90, 120, 240], n_tasks)
+        overrun = rng.lognormal(0.1 * procrastination, 0.4, n_tasks)
+        priorities = rng.choice(self.priorities, n_tasks, p=self.priority_probabilities)
+        postponements = rng.poisson(procrastination * 0.5, n_tasks)
+        started = rng.random(n_tasks) < 0.85
+        completed = started & (rng.random(n_tasks) < 0.8)
+        
+        tasks = []
+        for i in range(n_tasks):
+            created_at = start_date + timedelta(hours=float(created_offsets[i]))
+            task = {
+                'id': f"{prefix}-task-{i}",
+                'title': f"Task {i}",
+                'created_at': created_at.isoformat(timespec='seconds'),
+                'estimated_minutes': int(estimated[i]),
+                'actual_minutes': int(estimated[i] * overrun[i]) if completed[i] else 0,
+                'priority': str(priorities[i]),
+                'postponement_count': int(postponements[i])
+            }
+            if started[i]:
+                started_at = created_at + timedelta(hours=float(start_delays[i]))
+                task['started_at'] = started_at.isoformat(timespec='seconds')
+                if completed[i]:
+                    completed_at = started_at + timedelta(hours=float(work_hours[i]))
+                    task['completed_at'] = completed_at.isoformat(timespec='seconds')
+            tasks.append(task)
+        
+        return tasks
+    
+    def _time_logs(self, rng: np.random.Generator, start_date: datetime, peak_hour: int) -> List[Dict]:
+        days = (self.end_date - start_date).days
+        day_offsets = rng.integers(0, max(days, 1), self.logs_per_user)
+        hours = np.clip(np.round(rng.normal(peak_hour, 2.5, self.logs_per_user)), 0, 23).astype(int)
+        minutes = rng.integers(0, 60, self.logs_per_user)
+        # Productivity peaks around the user's preferred hour
+        scores = np.clip(85 - 4 * np.abs(hours - peak_hour) + rng.normal(0, 8, self.logs_per_user), 0, 100)
+        
+        return [
+            {
+                'start_time': (
+                    start_date + timedelta(days=int(day_offsets[i]), hours=int(hours[i]),
+                                           minutes=int(minutes[i]))
+                ).isoformat(timespec='seconds'),
+                'duration_minutes': int(rng.integers(15, 120)),
+                'productivity_score': int(round(scores[i]))
+            }
+            for i in range(self.logs_per_user)
+        ]
+    
+    def _history(self, rng: np.random.Generator, history_days: int, start_date: datetime) -> List[Dict]:
+        baseline = rng.uniform(50, 80)
+        slope = rng.normal(0, 0.05)
+        weekly = rng.uniform(0, 8)
+        day_index = np.arange(history_days)
+        scores = np.clip(
+            baseline + slope * day_index + weekly * np.sin(2 * np.pi * day_index / 7)
+            + rng.normal(0, 6, history_days),
+            0, 100
+        )
+        
+        return [
+            {
+                'date': (start_date + timedelta(days=int(day))).isoformat(),
+                'productivity_score': int(round(scores[day]))
+            }
+            for day in day_index
+        ]
+
+# Committed reference results; --compare defaults to it
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json')
+# Options that change the workload; results are only comparable when these match
+WORKLOAD_OPTIONS = ('users', 'tasks_per_user', 'logs_per_user', 'min_history_days',
+                    'max_history_days', 'train_tasks', 'seed')
+
+# Cold-start budget for importing ai-engine.py and using its sklearn-free components
+IMPORT_BUDGET = {'seconds': 0.4, 'rss_mb': 64}
+# Modules that must not be loaded until a component that needs them is used
+LAZY_MODULES = ('sklearn', 'scipy', 'pandas', 'joblib', 'asyncio', 'multiprocessing')
+
+_IMPORT_PROBE = """
+import importlib.util, json, resource, sys, time
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('ai_engine', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+import_seconds = time.perf_counter() - started
+engine = module.FocusFlowAI()
+engine.productivity_scorer.calculate_daily_score({'tasks_completed': 3, 'total_tasks': 5})
+engine.burnout_detector.assess_burnout_risk({'productivity_trend': [70, 68, 65, 60, 55, 50, 45]})
+try:
+    # Peak RSS of this process image; ru_maxrss would include the parent's pre-exec peak
+    with open('/proc/self/status') as status:
+        rss_mb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM')) / 1024
+except OSError:
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({
+    'import_seconds': import_seconds,
+    'rss_mb': rss_mb,
+    'loaded': [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+}))
+"""
+
+def measure_import_cost() -> Dict:
+    """Import ai-engine.py in a fresh interpreter and exercise the sklearn-free components"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai-engine.py')
+    completed = subprocess.run(
+        [sys.executable, '-c', _IMPORT_PROBE, path, json.dumps(LAZY_MODULES)],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout)
+
+def check_import_budget(cost: Dict, budget: Dict = IMPORT_BUDGET) -> List[str]:
+    """Budget violations for a measure_import_cost() result"""
+    violations = []
+    if cost['import_seconds'] > budget['seconds']:
+        violations.append(f"import took {cost['import_seconds']:.3f}s (budget {budget['seconds']}s)")
+    if cost['rss_mb'] > budget['rss_mb']:
+        violations.append(f"RSS {cost['rss_mb']:.1f} MB after import (budget {budget['rss_mb']} MB)")
+    if cost['loaded']:
+        violations.append(f"heavy modules loaded eagerly: {', '.join(cost['loaded'])}")
+    return violations
+
+def _measure(fn: Callable[[], object], repeat: int) -> Dict:
+    """Latency samples for repeated calls of fn, plus the peak traced memory of one call"""
+    fn()  # warm-up
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'calls': repeat,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'mean_ms': float(latencies_ms.mean()),
+        'peak_memory_mb': peak / 2**20
+    }
+
+class _BenchmarkFixtures:
+    """Setup shared by benchmark cases, built on first access so unselected cases cost nothing"""
+    
+    def __init__(self, workload: SyntheticWorkload, users: List[Dict], train_tasks: int):
+        self.workload = workload
+        self.users = users
+        self.train_tasks = train_tasks
+        self.scorer = ai_engine.ProductivityScorer()
+        self.analyzer = ai_engine.OptimalTimeAnalyzer()
+        self.burnout = ai_engine.BurnoutDetector()
+        self.trend = ai_engine.TrendPredictor()
+    
+    @functools.cached_property
+    def training_data(self) -> List[Dict]:
+        return self.workload.training_tasks(self.train_tasks)
+    
+    @functools.cached_property
+    def engine(self):
+        engine = ai_engine.FocusFlowAI()
+        engine.procrastination_detector.train(self.training_data)
+        engine.procrastination_detector.distill(self.training_data)
+        return engine
+    
+    @functools.cached_property
+    def detector(self):
+        return self.engine.procrastination_detector
+    
+    @functools.cached_property
+    def cohort_analyzer(self):
+        analyzer = ai_engine.OptimalTimeAnalyzer()
+        analyzer.fit_cohorts([[user['time_logs'] for user in self.users]])
+        return analyzer
+    
+    @functools.cached_property
+    def score_columns(self) -> Dict[str, np.ndarray]:
+        return {
+            field: np.array([user[field] for user in self.users], dtype=float)
+            for field in self.scorer.field_defaults
+        }
+    
+    @functools.cached_property
+    def record_users(self) -> List[Dict]:
+        return [ai_engine.user_data_to_records(user) for user in self.users]
+    
+    @functools.cached_property
+    def burnout_inputs(self) -> Dict[str, np.ndarray]:
+        burnout_inputs = {
+            field: np.array([user[field] for user in self.users], dtype=float)
+            for field in ('avg_daily_working_hours', 'habit_completion_rate', 'task_overdue_rate')
+        }
+        burnout_inputs['productivity_trend'] = np.array([
+            ([np.nan] * 7 + list(user['productivity_trend']))[-7:] for user in self.users
+        ], dtype=float)
+        return burnout_inputs
+    
+    @functools.cached_property
+    def events(self) -> Dict[str, np.ndarray]:
+        # Ten user_events per user over two weeks, as columns
+        event_rng = np.random.default_rng(0)
+        n_events = 10 * len(self.users)
+        return {
+            'user_id': event_rng.integers(0, len(self.users), n_events).astype(str),
+            'event_type_id': event_rng.integers(0, 10, n_events).astype(str),
+            'occurred_at': (
+                np.datetime64('2024-01-01T00:00') + np.sort(event_rng.integers(0, 14 * 24 * 60, n_events))
+            ).astype(str),
+            'duration_minutes': event_rng.choice([0, 15, 30, 60], n_events),
+            'points_earned': event_rng.integers(5, 60, n_events),
+            'weightage_applied': np.ones(n_events)
+        }
+    
+    @functools.cached_property
+    def gamification(self):
+        gamification = ai_engine.GamificationEngine()
+        gamification.apply_events(self.events)
+        return gamification
+
+def run_benchmarks(n_users: int = 200, train_tasks: int = 20000, repeat: int = 5,
+                   workload: Optional[SyntheticWorkload] = None,
+                   only: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """
+    Benchmark every engine component on a synthetic cohort.
+    Each entry reports per-call latency (p50/p99/mean), throughput in items per
+    second for the item count processed per call, and peak traced memory.
+    """
+    workload = workload or SyntheticWorkload()
+    users = workload.users(n_users)
+    fixtures = _BenchmarkFixtures(workload, users, train_tasks)
+    n_tasks = sum(len(user['recent_tasks']) for user in users)
+    n_logs = sum(len(user['time_logs']) for user in users)
+    n_days = sum(len(user['historical_data']) for user in users)
+    n_events = 10 * n_users
+    log_lists = [user['time_logs'] for user in users]
+    
+    # name -> (callable, items processed per call, item unit); fixtures build on first
+    # access, inside _measure's untimed warm-up call, so --only skips unused setup
+    cases = {
+        'productivity_scorer.daily': (
+            lambda: [fixtures.scorer.calculate_daily_score(user) for user in users], n_users, 'users'),
+        'productivity_scorer.columnar': (
+            lambda: fixtures.scorer.calculate_scores(fixtures.score_columns), n_users, 'users'),
+        'procrastination.train': (
+            lambda: ai_engine.ProcrastinationDetector().train(fixtures.training_data), train_tasks, 'tasks'),
+        'procrastination.train_large': (
+            lambda: ai_engine.ProcrastinationDetector().train_large(iter(fixtures.training_data)),
+            train_tasks, 'tasks'),
+        'procrastination.detect': (
+            lambda: [fixtures.detector.detect_procrastination(user['recent_tasks']) for user in users],
+            n_tasks, 'tasks'),
+        'procrastination.detect_fast': (
+            lambda: [fixtures.detector.detect_procrastination(user['recent_tasks'], backend='fast') for user in users],
+            n_tasks, 'tasks'),
+        'procrastination.detect_batch': (
+            lambda: fixtures.detector.detect_procrastination_batch([user['recent_tasks'] for user in users]),
+            n_tasks, 'tasks'),
+        'optimal_time.analyze': (
+            lambda: [fixtures.analyzer.analyze_productivity_patterns(user['time_logs']) for user in users],
+            n_logs, 'logs'),
+        'cohorts.fit': (
+            lambda: ai_engine.OptimalTimeAnalyzer().fit_cohorts(
+                log_lists[start:start + 50] for start in range(0, n_users, 50)
+            ), n_users, 'users'),
+        'cohorts.assign': (
+            lambda: [fixtures.cohort_analyzer.assign_cohorts([time_logs]) for time_logs in log_lists], n_users, 'users'),
+        'burnout.assess': (
+            lambda: [fixtures.burnout.assess_burnout_risk(user) for user in users], n_users, 'users'),
+        'burnout.assess_batch': (
+            lambda: fixtures.burnout.assess_burnout_risk_batch(fixtures.burnout_inputs), n_users, 'users'),
+        'gamification.apply_events': (
+            lambda: ai_engine.GamificationEngine().apply_events(fixtures.events), n_events, 'events'),
+        'gamification.leaderboard': (
+            lambda: [fixtures.gamification.leaderboard(period) for period in ai_engine.GamificationEngine.periods],
+            n_users, 'users'),
+        'trend.forecast': (
+            lambda: [fixtures.trend.forecast(fixtures.trend.build_statistics(user['historical_data'])) for user in users],
+            n_days, 'days'),
+        'engine.insights': (
+            lambda: [fixtures.engine.generate_comprehensive_insights(user) for user in users], n_users, 'users'),
+        'engine.insights_batch': (
+            lambda: fixtures.engine.generate_insights_batch(users), n_users, 'users'),
+        'records.convert': (
+            lambda: [ai_engine.user_data_to_records(user) for user in users], n_users, 'users'),
+        'engine.insights_batch_records': (
+            lambda: fixtures.engine.generate_insights_batch(fixtures.record_users), n_users, 'users')
+    }
+    
+    results = {}
+    if not only or any('engine.import'.startswith(prefix) for prefix in only):
+        costs = [measure_import_cost() for _ in range(repeat)]
+        import_ms = np.array([cost['import_seconds'] for cost in costs]) * 1000
+        results['engine.import'] = {
+            'calls': repeat,
+            'p50_ms': float(np.percentile(import_ms, 50)),
+            'p99_ms': float(np.percentile(import_ms, 99)),
+            'mean_ms': float(import_ms.mean()),
+            'peak_memory_mb': max(cost['rss_mb'] for cost in costs),
+            'items_per_call': 1,
+            'unit': 'imports',
+            'throughput_per_s': 1000 / float(import_ms.mean())
+        }
+    
+    for name, (fn, items, unit) in cases.items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        metrics = _measure(fn, repeat)
+        metrics['items_per_call'] = items
+        metrics['unit'] = unit
+        metrics['throughput_per_s'] = items / (metrics['mean_ms'] / 1000) if metrics['mean_ms'] else 0.0
+        results[name] = metrics
+    
+    return results
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict],
+                        tolerance: float = 0.2) -> List[str]:
+    """Regressions where p50 latency or peak memory grew by more than tolerance"""
+    regressions = []
+    for name, metrics in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for key in ('p50_ms', 'peak_memory_mb'):
+            if reference[key] > 0 and metrics[key] > reference[key] * (1 + tolerance):
+                regressions.append(
+                    f"{name} {key}: {metrics[key]:.3f} vs baseline {reference[key]:.3f} "
+                    f"(+{(metrics[key] / reference[key] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+def _print_report(results: Dict[str, Dict]):
+    print(f"{'benchmark':32} {'p50 ms':>10} {'p99 ms':>10} {'throughput':>16} {'peak MB':>9}")
+    for name, metrics in results.items():
+        throughput = f"{metrics['throughput_per_s']:,.0f} {metrics['unit']}/s"
+        print(
+            f"{name:32} {metrics['p50_ms']:10.2f} {metrics['p99_ms']:10.2f} "
+            f"{throughput:>16} {metrics['peak_memory_mb']:9.2f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the FocusFlow AI engine")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--tasks-per-user', type=int, default=50)
+    parser.add_argument('--logs-per-user', type=int, default=200)
+    parser.add_argument('--min-history-days', type=int, default=7)
+    parser.add_argument('--max-history-days', type=int, default=365)
+    parser.add_argument('--train-tasks', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', nargs='*', help="Benchmark name prefixes to run")
+    parser.add_argument('--save-baseline', help="Write results to this JSON file")
+    parser.add_argument('--compare', default=DEFAULT_BASELINE,
+                        help="Baseline JSON file to check for regressions (default: benchmarks/baseline.json; "
+                             "'' to skip)")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--check-import', action='store_true',
+                        help="Only check the cold-import time/memory budget and lazy loading")
+    args = parser.parse_args()
+    
+    if args.check_import:
+        cost = measure_import_cost()
+        print(f"import {cost['import_seconds'] * 1000:.1f} ms, RSS {cost['rss_mb']:.1f} MB")
+        violations = check_import_budget(cost)
+        for violation in violations:
+            print(f"BUDGET EXCEEDED {violation}")
+        sys.exit(1 if violations else 0)
+    
+    logging.basicConfig(level=logging.ERROR)
+    workload = SyntheticWorkload(
+        seed=args.seed,
+        tasks_per_user=args.tasks_per_user,
+        logs_per_user=args.logs_per_user,
+        min_history_days=args.min_history_days,
+        max_history_days=args.max_history_days
+    )
+    results = run_benchmarks(args.users, args.train_tasks, args.repeat, workload, args.only)
+    _print_report(results)
+    
+    regressions = []
+    if args.compare and (args.compare != DEFAULT_BASELINE or os.path.exists(args.compare)):
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        mismatched = [
+            option for option in WORKLOAD_OPTIONS
+            if baseline['config'].get(option) != getattr(args, option)
+        ]
+        if mismatched:
+            print(f"Not comparing: {args.compare} was recorded with different {', '.join(mismatched)}")
+        else:
+            regressions = compare_to_baseline(results, baseline['results'], args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            if not regressions:
+                print("No regressions against baseline")
+    
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({
+                'created_at': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'config': {option: getattr(args, option) for option in WORKLOAD_OPTIONS + ('repeat',)},
+                'results': results
+            }, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    
+    if regressions:
+        sys.exit(1)
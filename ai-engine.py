@@ -1,21 +1,360 @@
 # FocusFlow AI Engine - Productivity Intelligence Service
-import pandas as pd
+#
+# Heavy dependencies (scikit-learn, joblib, pandas, asyncio, process pools) are
+# imported on first use by the components that need them, so short-lived workers
+# and sklearn-free components (ProductivityScorer, BurnoutDetector) start fast.
 import numpy as np
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from sklearn.ensemble import RandomForestClassifier, IsolationForest
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
-from sklearn.linear_model import LinearRegression
-import joblib
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+import copy
+import hashlib
+import heapq
+import itertools
+import json
 import logging
+import numbers
+import os
+import sys
+import threading
+import time
+import warnings
 
 logger = logging.getLogger(__name__)
 
+def _to_datetime64(values) -> np.ndarray:
+    """
+    Parse naive ISO-8601 timestamps into a datetime64[us] array in one pass.
+    Missing or empty values become NaT. Timezone-aware strings raise instead of
+    being silently shifted to UTC, so callers can fall back to datetime.fromisoformat.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        return np.array(values, dtype='datetime64[us]')
+
+def _parse_timestamps(values) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse ISO-8601 timestamps or datetime objects (as DB drivers return them),
+    tolerating timezone offsets. Returns (instants, wall_clock): instants are normalized to UTC for arithmetic,
+    wall_clock keeps each value's local time as datetime.fromisoformat(...).hour sees it.
+    For naive input both are the same array.
+    """
+    try:
+        parsed = _to_datetime64(values)
+        return parsed, parsed
+    except (ValueError, UserWarning):
+        pass
+    
+    instants, wall_clock = [], []
+    for value in values:
+        if not value:
+            instants.append(None)
+            wall_clock.append(None)
+            continue
+        moment = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+        wall_clock.append(moment.replace(tzinfo=None))
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        instants.append(moment)
+    
+    return np.array(instants, dtype='datetime64[us]'), np.array(wall_clock, dtype='datetime64[us]')
+
+def _utc_instant(value) -> np.datetime64:
+    """One timestamp as _parse_timestamps' instants see it: aware values in UTC, naive ones as-is"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, 'us')
+
+def _hours_between(later: np.ndarray, earlier: np.ndarray) -> np.ndarray:
+    """Elementwise hours from earlier to later, NaN where either is NaT"""
+    delta = (later - earlier).astype('timedelta64[us]')
+    hours = (delta.astype(np.int64) / 1e6) / 3600
+    return np.where(np.isnat(delta), np.nan, hours)
+
+def _wall_clock_hours(wall_clock: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(hour of day, weekday with Monday as 0) of wall-clock times, -1 where NaT"""
+    missing = np.isnat(wall_clock)
+    hours = wall_clock.astype('datetime64[h]').astype(np.int64) % 24
+    # 1970-01-01 was a Thursday (weekday 3)
+    weekdays = (wall_clock.astype('datetime64[D]').astype(np.int64) + 3) % 7
+    return np.where(missing, -1, hours), np.where(missing, -1, weekdays)
+
+def _object_array(values: List) -> np.ndarray:
+    """1-D object array holding values as-is (np.array would try to nest sequences)"""
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+class TaskRecords:
+    """
+    Compact columnar form of a task list.
+    Fixed-width fields live in one structured NumPy array (dtype.itemsize, 38 bytes a task):
+    timestamps are parsed once into UTC datetime64 instants, priorities are stored
+    as integer codes and missing minutes as NaN. Task ids and titles, only needed
+    to report detections, are kept alongside as object arrays, as are segment keys
+    when a ProcrastinationDetector segments its models by a task field.
+    """
+    
+    priority_codes = {
+        'low': 1, 'medium': 2, 'high': 3, 'urgent': 4
+    }
+    
+    dtype = np.dtype([
+        ('created_at', 'datetime64[us]'),
+        ('started_at', 'datetime64[us]'),
+        ('completed_at', 'datetime64[us]'),
+        ('completion_hour', np.int8),  # local hour of completed_at, -1 if not completed
+        ('priority', np.int8),
+        ('postponement_count', np.int32),
+        ('estimated_minutes', np.float32),
+        ('actual_minutes', np.float32)
+    ])
+    
+    def __init__(self, data: np.ndarray, ids: Optional[np.ndarray] = None,
+                 titles: Optional[np.ndarray] = None, segments: Optional[np.ndarray] = None):
+        self.data = data
+        self.ids = ids
+        self.titles = titles
+        self.segments = segments
+    
+    @classmethod
+    def from_dicts(cls, tasks: List[Dict], segment_field: Optional[str] = None) -> 'TaskRecords':
+        """
+        One-time conversion from task dicts as returned by the API or database.
+        segment_field, if given, names a task key captured as the segment keys.
+        """
+        data = np.zeros(len(tasks), dtype=cls.dtype)
+        data['created_at'], _ = _parse_timestamps([task.get('created_at') for task in tasks])
+        data['started_at'], _ = _parse_timestamps([task.get('started_at') for task in tasks])
+        data['completed_at'], completed_local = _parse_timestamps(
+            [task.get('completed_at') for task in tasks]
+        )
+        data['completion_hour'] = _wall_clock_hours(completed_local)[0]
+        data['priority'] = [cls.priority_codes.get(task.get('priority', 'medium'), 2) for task in tasks]
+        data['postponement_count'] = [task.get('postponement_count') or 0 for task in tasks]
+        # None and missing minutes both become NaN
+        data['estimated_minutes'] = np.array(
+            [task.get('estimated_minutes') for task in tasks], dtype=float
+        )
+        data['actual_minutes'] = np.array([task.get('actual_minutes') for task in tasks], dtype=float)
+        
+        segments = (
+            _object_array([task.get(segment_field) for task in tasks]) if segment_field else None
+        )
+        return cls(data, _object_array([task.get('id') for task in tasks]),
+                   _object_array([task.get('title') for task in tasks]), segments)
+    
+    @classmethod
+    def concatenate(cls, parts: List['TaskRecords']) -> 'TaskRecords':
+        """Join several task record sets, e.g. one per user, into one"""
+        def joined(column: str) -> Optional[np.ndarray]:
+            if all(getattr(part, column) is None for part in parts):
+                return None
+            return np.concatenate([
+                _object_array([None] * len(part)) if getattr(part, column) is None
+                else getattr(part, column)
+                for part in parts
+            ])
+        
+        data = np.concatenate([part.data for part in parts]) if parts else np.zeros(0, cls.dtype)
+        return cls(data, joined('ids'), joined('titles'), joined('segments'))
+    
+    def __len__(self) -> int:
+        return len(self.data)
+    
+    def __getitem__(self, index) -> 'TaskRecords':
+        """Records at a slice, index array or boolean mask"""
+        return TaskRecords(self.data[index], *(
+            None if column is None else column[index]
+            for column in (self.ids, self.titles, self.segments)
+        ))
+    
+    def identity(self, i: int) -> Tuple[object, object]:
+        """(id, title) of the i-th task, None where not kept"""
+        values = []
+        for column in (self.ids, self.titles):
+            value = None if column is None else column[i]
+            # Fixed-width string columns (as FeatureStore keeps them) mark missing values with ''
+            if isinstance(value, np.str_):
+                value = str(value) or None
+            values.append(value)
+        return tuple(values)
+
+# Time logs: UTC start instant plus its local hour and weekday (-1 when start_time is missing)
+TIME_LOG_DTYPE = np.dtype([
+    ('start_time', 'datetime64[us]'),
+    ('hour', np.int8),
+    ('weekday', np.int8),
+    ('productivity_score', np.float64)
+])
+
+# Daily history entries for trend prediction
+HISTORY_DTYPE = np.dtype([
+    ('date', 'datetime64[us]'),
+    ('productivity_score', np.float64)
+])
+
+def tasks_to_records(tasks: List[Dict]) -> TaskRecords:
+    """Convert a task dict list to TaskRecords"""
+    return TaskRecords.from_dicts(tasks)
+
+def time_logs_to_records(time_logs: List[Dict]) -> np.ndarray:
+    """Convert time log dicts to a TIME_LOG_DTYPE record array"""
+    records = np.zeros(len(time_logs), dtype=TIME_LOG_DTYPE)
+    records['start_time'], wall_clock = _parse_timestamps([log.get('start_time') for log in time_logs])
+    records['hour'], records['weekday'] = _wall_clock_hours(wall_clock)
+    records['productivity_score'] = [log.get('productivity_score', 50) for log in time_logs]
+    return records
+
+def history_to_records(historical_data: List[Dict]) -> np.ndarray:
+    """Convert daily history dicts to a HISTORY_DTYPE record array (NaT for missing dates)"""
+    records = np.zeros(len(historical_data), dtype=HISTORY_DTYPE)
+    records['date'], _ = _parse_timestamps([item.get('date') for item in historical_data])
+    records['productivity_score'] = [item.get('productivity_score', 50) for item in historical_data]
+    return records
+
+def user_data_to_records(user_data: Dict) -> Dict:
+    """
+    Copy of user_data with recent_tasks, time_logs and historical_data converted
+    to their compact record forms, e.g. once when loading a cohort for batch jobs
+    """
+    converters = {
+        'recent_tasks': tasks_to_records,
+        'time_logs': time_logs_to_records,
+        'historical_data': history_to_records
+    }
+    converted = dict(user_data)
+    for field, converter in converters.items():
+        if isinstance(converted.get(field), list):
+            converted[field] = converter(converted[field])
+    return converted
+
+def _task_records(tasks, segment_by: Optional[str] = None) -> TaskRecords:
+    """TaskRecords as given, or converted from dicts capturing the segment_by field"""
+    if isinstance(tasks, TaskRecords):
+        return tasks
+    return TaskRecords.from_dicts(tasks, None if segment_by in (None, 'priority') else segment_by)
+
+def _segment_keys(records: TaskRecords, segment_by: str) -> np.ndarray:
+    """Per-task segment keys: priority codes or the captured field, None where not captured"""
+    if segment_by == 'priority':
+        return records.data['priority']
+    if records.segments is not None:
+        return records.segments
+    return _object_array([None] * len(records))
+
+def _task_chunks(tasks: Iterable, chunk_size: int) -> Iterator:
+    """Split TaskRecords, or a stream of task dicts and TaskRecords batches, into chunks"""
+    if isinstance(tasks, TaskRecords):
+        for start in range(0, len(tasks), chunk_size):
+            yield tasks[start:start + chunk_size]
+        return
+    
+    pending = []
+    for item in tasks:
+        if isinstance(item, TaskRecords):
+            if pending:
+                yield pending
+                pending = []
+            yield item
+            continue
+        pending.append(item)
+        if len(pending) >= chunk_size:
+            yield pending
+            pending = []
+    if pending:
+        yield pending
+
+class _Reservoir:
+    """Uniform sample of at most size feature rows from a stream; size None keeps every row"""
+    
+    def __init__(self, size: Optional[int], rng: np.random.Generator):
+        self.size = size
+        self.rng = rng
+        self.rows = None
+        self.chunks = []
+        self.count = 0
+    
+    def add(self, rows: np.ndarray):
+        if self.size is None:
+            self.chunks.append(rows)
+            self.count += len(rows)
+            return
+        if self.rows is None:
+            self.rows = np.empty((self.size, rows.shape[1]))
+        
+        # Fill up first, then row number t replaces a random slot with probability size / (t + 1)
+        filled = min(self.count, self.size)
+        take = min(self.size - filled, len(rows))
+        self.rows[filled:filled + take] = rows[:take]
+        rest = rows[take:]
+        if len(rest):
+            slots = self.rng.integers(0, self.count + take + np.arange(len(rest)) + 1)
+            keep = slots < self.size
+            self.rows[slots[keep]] = rest[keep]
+        self.count += len(rows)
+    
+    def sample(self) -> np.ndarray:
+        if self.size is None:
+            return np.concatenate(self.chunks) if self.chunks else np.empty((0, 0))
+        return self.rows[:min(self.count, self.size)]
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, None where unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+# Generations stamped on trained models; unlike id(), never reused within a process
+_model_generations = itertools.count(1)
+
+def _is_records(value) -> bool:
+    return isinstance(value, (TaskRecords, np.ndarray))
+
+def _rows(value):
+    """A dict list or records from user_data, [] when absent (arrays have no truth value)"""
+    return [] if value is None else value
+
+def _pack_records(values: List, to_records, concatenate=np.concatenate) -> Tuple[object, np.ndarray]:
+    """
+    Join per-user inputs, each a dict list or already records, into one record set,
+    converting all the dict lists in a single pass. Also returns each user's row count.
+    """
+    converted = to_records([row for value in values if not _is_records(value) for row in value])
+    parts, position = [], 0
+    for value in values:
+        if _is_records(value):
+            parts.append(value)
+        else:
+            parts.append(converted[position:position + len(value)])
+            position += len(value)
+    
+    lengths = np.array([len(part) for part in parts], dtype=np.int64)
+    return (concatenate(parts) if parts else converted), lengths
+
 class ProductivityScorer:
     """Calculates productivity scores based on task completion and time tracking"""
     
+    # Fallbacks used by calculate_daily_score when a field is missing
+    field_defaults = {
+        'tasks_completed': 0,
+        'total_tasks': 1,
+        'estimated_minutes': 0,
+        'actual_minutes': 1,
+        'habits_completed': 0,
+        'total_habits': 1,
+        'focus_sessions': 0,
+        'distraction_events': 0
+    }
+    
     def __init__(self):
         self.weights = {
             'task_completion': 0.4,
@@ -78,17 +417,221 @@ class ProductivityScorer:
             focus_quality * self.weights['focus_quality']
         )
         
-        return min(max(total_score, 0), 100)
+        return self.as_daily_score(total_score)
+    
+    @staticmethod
+    def as_daily_score(total_score: float) -> float:
+        """
+        A weighted total clamped to 0-100 as calculate_daily_score returns it:
+        a Python float, or the int bound when the total falls outside the range
+        """
+        return min(max(float(total_score), 0), 100)
+    
+    def calculate_scores(self, frame, clip: bool = True) -> np.ndarray:
+        """
+        Calculate daily productivity scores (0-100) for many user-days at once.
+        Accepts a pandas DataFrame or a dict of equal-length arrays with the same
+        fields as calculate_daily_score. Missing columns and NaN cells take the same
+        defaults as missing dict keys, so each row scores exactly as the dict path would.
+        clip=False returns the unclamped totals, e.g. for as_daily_score.
+        """
+        # A DataFrame can only exist if pandas is already imported
+        pandas = sys.modules.get('pandas')
+        if pandas is not None and isinstance(frame, pandas.DataFrame):
+            n_rows = len(frame)
+        else:
+            n_rows = len(next(iter(frame.values()))) if frame else 0
+        
+        columns = {}
+        for field, default in self.field_defaults.items():
+            if field not in frame:
+                columns[field] = np.full(n_rows, default, dtype=float)
+                continue
+            values = frame[field]
+            if hasattr(values, 'to_numpy'):
+                values = values.to_numpy(dtype=float, na_value=np.nan)
+            else:
+                values = np.asarray(values, dtype=float)
+            columns[field] = np.where(np.isnan(values), default, values)
+        
+        return self._score_columns(columns, clip)
+    
+    def _score_columns(self, columns: Dict[str, np.ndarray], clip: bool = True) -> np.ndarray:
+        """Vectorized calculate_daily_score over equal-length float columns"""
+        task_completion_rate = (
+            columns['tasks_completed'] / np.maximum(columns['total_tasks'], 1)
+        ) * 100
+        
+        estimated = columns['estimated_minutes']
+        time_efficiency = np.where(
+            estimated > 0,
+            np.minimum((estimated / np.maximum(columns['actual_minutes'], 1)) * 100, 100),
+            50
+        )
+        
+        habit_consistency = (
+            columns['habits_completed'] / np.maximum(columns['total_habits'], 1)
+        ) * 100
+        
+        focus_quality = np.where(
+            columns['focus_sessions'] > 0,
+            np.maximum(100 - (columns['distraction_events'] * 10), 0),
+            50
+        )
+        
+        total_score = (
+            task_completion_rate * self.weights['task_completion'] +
+            time_efficiency * self.weights['time_efficiency'] +
+            habit_consistency * self.weights['habit_consistency'] +
+            focus_quality * self.weights['focus_quality']
+        )
+        
+        return np.clip(total_score, 0, 100) if clip else total_score
+
+class DistilledScorer:
+    """
+    Compact additive stand-in for a fitted anomaly model.
+    Each feature is cut at quantiles of the training rows and every bin carries a
+    score contribution, fitted by backfitting to the model's decision_function;
+    the intercept is then shifted so the same share of rows scores below zero.
+    Scoring is one searchsorted and lookup per feature, microseconds per request
+    instead of a traversal of every tree. Works on unscaled features.
+    """
+    
+    def __init__(self, n_bins: int = 32, sweeps: int = 10):
+        self.n_bins = n_bins
+        self.sweeps = sweeps
+        self.edges = None
+        self.contributions = None
+        self.intercept = 0.0
+    
+    def fit(self, features: np.ndarray, target: np.ndarray) -> 'DistilledScorer':
+        quantiles = np.linspace(0, 1, self.n_bins + 1)[1:-1]
+        self.edges = [np.unique(np.quantile(column, quantiles)) for column in features.T]
+        bins = self._bins(features)
+        
+        self.intercept = float(target.mean())
+        self.contributions = [np.zeros(len(edges) + 1) for edges in self.edges]
+        fitted = np.zeros(features.shape)
+        for _ in range(self.sweeps):
+            for j, edges in enumerate(self.edges):
+                # Fit feature j's bins to what the other features leave unexplained
+                partial = target - self.intercept - fitted.sum(axis=1) + fitted[:, j]
+                counts = np.bincount(bins[:, j], minlength=len(edges) + 1)
+                sums = np.bincount(bins[:, j], weights=partial, minlength=len(edges) + 1)
+                self.contributions[j] = np.divide(
+                    sums, counts, out=np.zeros(len(counts)), where=counts > 0
+                )
+                fitted[:, j] = self.contributions[j][bins[:, j]]
+        
+        # Flag the same share of rows as the model did
+        approx = fitted.sum(axis=1) + self.intercept
+        outlier_rate = np.mean(target < 0)
+        if 0 < outlier_rate < 1:
+            self.intercept -= float(np.quantile(approx, outlier_rate))
+        return self
+    
+    def _bins(self, features: np.ndarray) -> np.ndarray:
+        return np.column_stack([
+            np.searchsorted(edges, features[:, j], side='right') for j, edges in enumerate(self.edges)
+        ])
+    
+    def decision_function(self, features: np.ndarray) -> np.ndarray:
+        """Approximate anomaly scores; negative means outlier"""
+        scores = np.full(len(features), self.intercept)
+        for j, (edges, contribution) in enumerate(zip(self.edges, self.contributions)):
+            scores += contribution[np.searchsorted(edges, features[:, j], side='right')]
+        return scores
 
 class ProcrastinationDetector:
     """Detects procrastination patterns using ML"""
     
+    priority_weight = TaskRecords.priority_codes
+    
+    # Per-segment (scaler, model) pairs set by train_large(segment_by=...). Class-level
+    # defaults keep detectors persisted before segmentation existed loadable.
+    segment_by = None
+    segment_models = {}
+    
+    # Scoring backend: 'forest' (IsolationForest) or 'fast' (DistilledScorer from distill())
+    backend = 'forest'
+    fast_scorer = None
+    
+    # Bumped whenever the scoring models change (train, train_large, distill, registry load)
+    generation = 0
+    
     def __init__(self):
-        self.model = IsolationForest(contamination=0.1, random_state=42)
-        self.scaler = StandardScaler()
+        self._model = None
+        self._scaler = None
         self.is_trained = False
     
-    def extract_features(self, task_data: List[Dict]) -> np.ndarray:
+    @property
+    def model(self):
+        """IsolationForest, created on first use so sklearn loads only when needed"""
+        if self._model is None:
+            from sklearn.ensemble import IsolationForest
+            self._model = IsolationForest(contamination=0.1, random_state=42)
+        return self._model
+    
+    @model.setter
+    def model(self, model):
+        self._model = model
+        self.generation = next(_model_generations)
+    
+    @property
+    def scaler(self):
+        """StandardScaler, created on first use"""
+        if self._scaler is None:
+            from sklearn.preprocessing import StandardScaler
+            self._scaler = StandardScaler()
+        return self._scaler
+    
+    @scaler.setter
+    def scaler(self, scaler):
+        self._scaler = scaler
+        self.generation = next(_model_generations)
+    
+    def extract_task_columns(self, task_data: Union[TaskRecords, List[Dict]]) -> Dict[str, np.ndarray]:
+        """
+        Task columns shared by feature extraction and reason analysis.
+        Reads TaskRecords directly; a dict list is converted once with TaskRecords.from_dicts.
+        Derived feature columns (delay, time ratio, completion hour, priority code) are plain arrays.
+        """
+        records = _task_records(task_data, self.segment_by)
+        data = records.data
+        
+        # Delay feature (hours between creation and first action)
+        delay_hours = np.nan_to_num(_hours_between(data['started_at'], data['created_at']), nan=0.0)
+        
+        # Time ratio feature, missing minutes counting as 60
+        estimated = data['estimated_minutes'].astype(float)
+        actual = data['actual_minutes'].astype(float)
+        time_ratio = (
+            np.where(np.isnan(actual), 60, actual) /
+            np.maximum(np.where(np.isnan(estimated), 60, estimated), 1)
+        )
+        
+        # Time of day feature (hour of completion, defaulting to noon)
+        completion_hour = np.where(data['completion_hour'] < 0, 12, data['completion_hour'])
+        
+        columns = {
+            'created_at': data['created_at'],
+            'started_at': data['started_at'],
+            'completed_at': data['completed_at'],
+            'delay_hours': delay_hours,
+            'time_ratio': time_ratio,
+            'postponements': data['postponement_count'].astype(float),
+            'completion_hour': completion_hour.astype(float),
+            'priority': data['priority'].astype(float),
+            # Raw minutes for reason analysis, 0 when missing
+            'estimated_minutes': np.nan_to_num(estimated, nan=0.0),
+            'actual_minutes': np.nan_to_num(actual, nan=0.0)
+        }
+        if self.segment_by:
+            columns['segment'] = _segment_keys(records, self.segment_by)
+        return columns
+    
+    def extract_features(self, task_data: Union[TaskRecords, List[Dict]]) -> np.ndarray:
         """
         Extract features for procrastination detection:
         - Delay between task creation and start
@@ -97,119 +640,545 @@ class ProcrastinationDetector:
         - Time of day patterns
         - Task priority vs completion time
         """
-        features = []
-        
-        for task in task_data:
-            # Delay feature (hours between creation and first action)
-            if task.get('created_at') and task.get('started_at'):
-                delay = (
-                    datetime.fromisoformat(task['started_at']) - 
-                    datetime.fromisoformat(task['created_at'])
-                ).total_seconds() / 3600
-            else:
-                delay = 0
-            
-            # Time ratio feature
-            estimated = task.get('estimated_minutes', 60)
-            actual = task.get('actual_minutes', 60)
-            time_ratio = actual / max(estimated, 1)
-            
-            # Postponement feature
-            postponements = task.get('postponement_count', 0)
-            
-            # Time of day feature (hour of completion)
-            if task.get('completed_at'):
-                completion_hour = datetime.fromisoformat(task['completed_at']).hour
-            else:
-                completion_hour = 12  # Default to noon
-            
-            # Priority urgency feature
-            priority_weight = {
-                'low': 1, 'medium': 2, 'high': 3, 'urgent': 4
-            }
-            priority = priority_weight.get(task.get('priority', 'medium'), 2)
-            
-            features.append([delay, time_ratio, postponements, completion_hour, priority])
-        
-        return np.array(features)
+        return self._features_from_columns(self.extract_task_columns(task_data))
+    
+    def _features_from_columns(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Stack task columns into the model's feature matrix"""
+        return np.column_stack([
+            columns['delay_hours'],
+            columns['time_ratio'],
+            columns['postponements'],
+            columns['completion_hour'],
+            columns['priority']
+        ])
     
-    def train(self, training_data: List[Dict]):
+    def train(self, training_data: Union[TaskRecords, List[Dict]]):
         """Train the procrastination detection model"""
         if len(training_data) < 50:
             logger.warning("Insufficient data for training procrastination detector")
             return
         
+        from sklearn.base import clone
+        
         features = self.extract_features(training_data)
-        scaled_features = self.scaler.fit_transform(features)
         
-        self.model.fit(scaled_features)
+        # Fit fresh copies and publish them together so concurrent readers never
+        # see a half-fitted scaler or model
+        scaler = clone(self.scaler)
+        model = clone(self.model)
+        model.fit(scaler.fit_transform(features))
+        
+        self.scaler, self.model = scaler, model
+        self.segment_by, self.segment_models = None, {}
+        self.fast_scorer = None
         self.is_trained = True
+        self.generation = next(_model_generations)
         logger.info("Procrastination detector trained successfully")
     
-    def detect_procrastination(self, task_data: List[Dict]) -> List[Dict]:
+    def train_large(self, tasks: Iterable, chunk_size: int = 50000,
+                    sample_size: Optional[int] = 200000, max_samples='auto',
+                    n_estimators: int = 100, n_jobs: Optional[int] = -1,
+                    segment_by: Optional[str] = None, random_state: int = 42) -> Dict:
+        """
+        Train on a task stream too large to hold as dicts, e.g. a cursor over the tasks table.
+        tasks may be TaskRecords or any iterable of task dicts and TaskRecords batches;
+        features are extracted chunk_size tasks at a time. The scaler sees every task
+        (partial_fit) while the forest is fitted on a uniform sample of sample_size rows
+        (None keeps all), each tree drawing max_samples of them, with trees built on
+        n_jobs cores. segment_by ('priority' or a task field such as a cohort key)
+        additionally trains one model per segment in parallel; tasks of segments with
+        fewer than 50 tasks, or without the field, are scored by the global model.
+        Returns a report of task counts, timings and memory.
+        """
+        from sklearn.base import clone
+        from joblib import Parallel, delayed
+        
+        started = time.perf_counter()
+        rng = np.random.default_rng(random_state)
+        scaler = clone(self.scaler)
+        reservoir = _Reservoir(sample_size, rng)
+        segment_scalers, segment_reservoirs = {}, {}
+        n_tasks = n_chunks = 0
+        
+        for chunk in _task_chunks(tasks, chunk_size):
+            records = _task_records(chunk, segment_by)
+            features = self._features_from_columns(self.extract_task_columns(records))
+            scaler.partial_fit(features)
+            reservoir.add(features)
+            n_tasks += len(records)
+            n_chunks += 1
+            
+            if segment_by:
+                # Group rows by segment with one stable sort instead of a mask per segment
+                index = {}
+                codes = np.array(
+                    [index.setdefault(key, len(index)) for key in _segment_keys(records, segment_by).tolist()],
+                    dtype=np.int64
+                )
+                order = np.argsort(codes, kind='stable')
+                bounds = np.flatnonzero(np.diff(codes[order])) + 1
+                for key, rows in zip(index, np.split(order, bounds)):
+                    if key is None:
+                        continue
+                    segment_scalers.setdefault(key, clone(self.scaler)).partial_fit(features[rows])
+                    segment_reservoirs.setdefault(key, _Reservoir(sample_size, rng)).add(features[rows])
+        
+        extract_seconds = time.perf_counter() - started
+        report = {
+            'tasks': n_tasks,
+            'chunks': n_chunks,
+            'sampled': min(n_tasks, sample_size or n_tasks),
+            'segments': {},
+            'extract_seconds': extract_seconds
+        }
+        if n_tasks < 50:
+            logger.warning("Insufficient data for training procrastination detector")
+            report.update(trained=False, peak_rss_mb=_peak_rss_mb())
+            return report
+        
+        model = clone(self.model).set_params(
+            n_estimators=n_estimators, max_samples=max_samples, n_jobs=n_jobs
+        )
+        model.fit(scaler.transform(reservoir.sample()))
+        
+        # Segment forests are small; train them side by side, one core each
+        def fit_segment(key):
+            segment_model = clone(model).set_params(n_jobs=1)
+            segment_model.fit(segment_scalers[key].transform(segment_reservoirs[key].sample()))
+            return key, (segment_scalers[key], segment_model)
+        
+        eligible = [key for key, sample in segment_reservoirs.items() if sample.count >= 50]
+        segment_models = dict(
+            Parallel(n_jobs=n_jobs, prefer='threads')(delayed(fit_segment)(key) for key in eligible)
+        )
+        
+        self.scaler, self.model = scaler, model
+        self.segment_by, self.segment_models = segment_by, segment_models
+        self.fast_scorer = None
+        self.is_trained = True
+        self.generation = next(_model_generations)
+        
+        report['segments'] = {
+            key: {'tasks': sample.count, 'trained': key in segment_models}
+            for key, sample in segment_reservoirs.items()
+        }
+        report.update(
+            trained=True,
+            fit_seconds=time.perf_counter() - started - extract_seconds,
+            total_seconds=time.perf_counter() - started,
+            sample_mb=sum(
+                sample.sample().nbytes for sample in [reservoir, *segment_reservoirs.values()]
+            ) / 1e6,
+            peak_rss_mb=_peak_rss_mb()
+        )
+        logger.info(
+            f"Procrastination detector trained on {n_tasks} tasks "
+            f"({len(segment_models)} segment models) in {report['total_seconds']:.1f}s"
+        )
+        return report
+    
+    def distill(self, task_data: Union[TaskRecords, List[Dict]], n_bins: int = 32,
+                sample_size: Optional[int] = 50000, random_state: int = 42) -> 'DistilledScorer':
+        """
+        Fit the 'fast' backend to the trained forest's scores on task_data (at most
+        sample_size tasks of it). Retraining discards it, so distill again afterwards.
+        """
+        if not self.is_trained:
+            raise ValueError("Train the detector before distilling a fast scorer")
+        
+        columns = self.extract_task_columns(task_data)
+        features = self._features_from_columns(columns)
+        keys = columns.get('segment')
+        if sample_size is not None and len(features) > sample_size:
+            rows = np.random.default_rng(random_state).choice(len(features), sample_size, replace=False)
+            features = features[rows]
+            keys = None if keys is None else keys[rows]
+        
+        self.fast_scorer = DistilledScorer(n_bins).fit(features, self._forest_scores(features, keys))
+        self.generation = next(_model_generations)
+        return self.fast_scorer
+    
+    def evaluate_fast_scorer(self, task_data: Union[TaskRecords, List[Dict]],
+                             requests: int = 200) -> Dict:
+        """
+        Compare the fast backend with the forest on held-out tasks: agreement of the
+        outlier flags, precision and recall of the fast flags, rank correlation and
+        mean absolute score error, plus per-task cost in bulk and per single-task request.
+        """
+        if self.fast_scorer is None:
+            raise ValueError("No fast scorer; call distill() first")
+        
+        columns = self.extract_task_columns(task_data)
+        features = self._features_from_columns(columns)
+        keys = columns.get('segment')
+        n_tasks = len(features)
+        
+        started = time.perf_counter()
+        forest = self._forest_scores(features, keys)
+        forest_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        fast = self.fast_scorer.decision_function(features)
+        fast_seconds = time.perf_counter() - started
+        
+        # Latency of one-task requests, as on the dashboard path
+        request_rows = np.arange(min(requests, n_tasks))
+        started = time.perf_counter()
+        for row in request_rows:
+            self._forest_scores(features[row:row + 1], None if keys is None else keys[row:row + 1])
+        forest_request_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        for row in request_rows:
+            self.fast_scorer.decision_function(features[row:row + 1])
+        fast_request_seconds = time.perf_counter() - started
+        
+        forest_flags, fast_flags = forest < 0, fast < 0
+        both = int(np.sum(forest_flags & fast_flags))
+        ranks = np.corrcoef(np.argsort(np.argsort(forest)), np.argsort(np.argsort(fast)))[0, 1]
+        n_requests = max(len(request_rows), 1)
+        
+        return {
+            'tasks': n_tasks,
+            'agreement': float(np.mean(forest_flags == fast_flags)),
+            'precision': both / max(int(fast_flags.sum()), 1),
+            'recall': both / max(int(forest_flags.sum()), 1),
+            'forest_outlier_rate': float(forest_flags.mean()),
+            'fast_outlier_rate': float(fast_flags.mean()),
+            'rank_correlation': float(ranks),
+            'mean_abs_error': float(np.mean(np.abs(forest - fast))),
+            'forest_us_per_task': forest_seconds / max(n_tasks, 1) * 1e6,
+            'fast_us_per_task': fast_seconds / max(n_tasks, 1) * 1e6,
+            'forest_us_per_request': forest_request_seconds / n_requests * 1e6,
+            'fast_us_per_request': fast_request_seconds / n_requests * 1e6
+        }
+    
+    def score_tasks(self, task_data: Union[TaskRecords, List[Dict]],
+                    backend: Optional[str] = None) -> np.ndarray:
+        """
+        Anomaly score for every task (IsolationForest decision_function, or its
+        distilled approximation with the 'fast' backend; default self.backend).
+        Negative scores are outliers; lower means more likely procrastination,
+        so callers can rank tasks with np.argsort. Empty if the model is not trained.
+        """
+        if not self.is_trained or not task_data:
+            return np.array([])
+        
+        return self._score_task_columns(self.extract_task_columns(task_data), backend)
+    
+    def _score_task_columns(self, columns: Dict[str, np.ndarray],
+                            backend: Optional[str] = None) -> np.ndarray:
+        """Scores for already extracted task columns from the selected backend"""
+        features = self._features_from_columns(columns)
+        backend = backend or self.backend
+        if backend == 'fast':
+            if self.fast_scorer is None:
+                raise ValueError("Fast backend selected but no fast scorer; call distill() after training")
+            return self.fast_scorer.decision_function(features)
+        if backend != 'forest':
+            raise ValueError(f"Unknown scoring backend: {backend}")
+        return self._forest_scores(features, columns.get('segment'))
+    
+    def _forest_scores(self, features: np.ndarray, keys: Optional[np.ndarray]) -> np.ndarray:
+        """Forest pass over a feature matrix, one per segment model used"""
+        if not len(features):
+            return np.empty(0)
+        if not self.segment_models or keys is None:
+            return self.model.decision_function(self.scaler.transform(features))
+        
+        scores = np.empty(len(features))
+        remaining = np.ones(len(features), dtype=bool)
+        for key, (scaler, model) in self.segment_models.items():
+            rows = keys == key
+            if rows.any():
+                scores[rows] = model.decision_function(scaler.transform(features[rows]))
+                remaining &= ~rows
+        if remaining.any():
+            scores[remaining] = self.model.decision_function(self.scaler.transform(features[remaining]))
+        return scores
+    
+    def detect_procrastination(self, task_data: Union[TaskRecords, List[Dict]],
+                               backend: Optional[str] = None) -> List[Dict]:
         """Detect procrastination patterns in recent tasks"""
         if not self.is_trained:
             return []
         
-        features = self.extract_features(task_data)
-        scaled_features = self.scaler.transform(features)
+        records = _task_records(task_data, self.segment_by)
+        columns = self.extract_task_columns(records)
+        scores = self._score_task_columns(columns, backend)
         
-        # Predictions: -1 for outliers (procrastination), 1 for normal
-        predictions = self.model.predict(scaled_features)
+        # Negative scores are outliers (procrastination), same as model.predict == -1
+        outliers = np.flatnonzero(scores < 0)
+        reasons = self._analyze_procrastination_reasons(columns, outliers)
         
         procrastination_tasks = []
-        for i, (task, pred) in enumerate(zip(task_data, predictions)):
-            if pred == -1:  # Outlier indicates potential procrastination
-                procrastination_tasks.append({
-                    'task_id': task.get('id'),
-                    'task_title': task.get('title'),
-                    'procrastination_score': abs(self.model.decision_function([scaled_features[i]])[0]),
-                    'reasons': self._analyze_procrastination_reasons(task)
-                })
+        for i, task_reasons in zip(outliers, reasons):
+            task_id, task_title = records.identity(i)
+            procrastination_tasks.append({
+                'task_id': task_id,
+                'task_title': task_title,
+                'procrastination_score': abs(scores[i]),
+                'reasons': task_reasons
+            })
         
         return procrastination_tasks
     
-    def _analyze_procrastination_reasons(self, task: Dict) -> List[str]:
-        """Analyze potential reasons for procrastination"""
-        reasons = []
+    def detect_procrastination_batch(self, task_lists: List,
+                                     backend: Optional[str] = None) -> List[List[Dict]]:
+        """
+        Detect procrastination for many users with one model pass over all their tasks.
+        Each user's tasks may be a dict list or TaskRecords.
+        """
+        results = [[] for _ in task_lists]
+        if not self.is_trained:
+            return results
         
+        records, lengths = _pack_records(
+            task_lists, lambda tasks: _task_records(tasks, self.segment_by), TaskRecords.concatenate
+        )
+        if not len(records):
+            return results
+        owners = np.repeat(np.arange(len(task_lists)), lengths)
+        
+        # One model pass scores and flags every task across the cohort
+        columns = self.extract_task_columns(records)
+        scores = self._score_task_columns(columns, backend)
+        outliers = np.flatnonzero(scores < 0)
+        reasons = self._analyze_procrastination_reasons(columns, outliers)
+        
+        for i, task_reasons in zip(outliers, reasons):
+            task_id, task_title = records.identity(i)
+            results[owners[i]].append({
+                'task_id': task_id,
+                'task_title': task_title,
+                'procrastination_score': abs(scores[i]),
+                'reasons': task_reasons
+            })
+        
+        return results
+    
+    def _analyze_procrastination_reasons(self, columns: Dict[str, np.ndarray],
+                                         indices: np.ndarray) -> List[List[str]]:
+        """Analyze potential reasons for procrastination for the given task rows"""
         # Check for excessive delay
-        if task.get('created_at') and task.get('started_at'):
-            delay_hours = (
-                datetime.fromisoformat(task['started_at']) - 
-                datetime.fromisoformat(task['created_at'])
-            ).total_seconds() / 3600
-            if delay_hours > 24:
-                reasons.append("Task started more than 24 hours after creation")
+        delayed = columns['delay_hours'][indices] > 24
         
         # Check for time overestimation
-        if task.get('estimated_minutes') and task.get('actual_minutes'):
-            if task['actual_minutes'] > task['estimated_minutes'] * 2:
-                reasons.append("Task took significantly longer than estimated")
+        estimated = columns['estimated_minutes'][indices]
+        actual = columns['actual_minutes'][indices]
+        overran = (estimated != 0) & (actual != 0) & (actual > estimated * 2)
         
         # Check for priority mismatch
-        if task.get('priority') == 'urgent' and task.get('completed_at'):
-            delay = (
-                datetime.fromisoformat(task['completed_at']) - 
-                datetime.fromisoformat(task['created_at'])
-            ).total_seconds() / 3600
-            if delay > 4:
-                reasons.append("Urgent task completed with significant delay")
+        completion_delay = _hours_between(
+            columns['completed_at'][indices], columns['created_at'][indices]
+        )
+        late_urgent = (columns['priority'][indices] == 4) & (completion_delay > 4)
+        
+        reasons = []
+        for is_delayed, is_overrun, is_late_urgent in zip(delayed, overran, late_urgent):
+            task_reasons = []
+            if is_delayed:
+                task_reasons.append("Task started more than 24 hours after creation")
+            if is_overrun:
+                task_reasons.append("Task took significantly longer than estimated")
+            if is_late_urgent:
+                task_reasons.append("Urgent task completed with significant delay")
+            reasons.append(task_reasons)
         
         return reasons
 
+class HourlyAccumulator:
+    """
+    Fixed-size streaming accumulator of productivity by hour of day.
+    Holds (optionally time-decayed) counts and score sums in a 24-slot array,
+    or 7x24 by weekday, so memory stays constant however many time logs are fed in.
+    Accumulators built by different workers combine with merge().
+    """
+    
+    _unseen = np.iinfo(np.int64).max
+    
+    def __init__(self, by_weekday: bool = False, half_life_days: Optional[float] = None,
+                 reference_time: Optional[datetime] = None):
+        self.by_weekday = by_weekday
+        self.half_life_days = half_life_days
+        # Decay weights are relative to reference_time (now by default); logs at that time weigh 1
+        self.reference_time = (
+            _utc_instant(reference_time or datetime.now(timezone.utc)) if half_life_days else None
+        )
+        
+        shape = (7, 24) if by_weekday else (24,)
+        self.counts = np.zeros(shape)
+        self.sums = np.zeros(shape)
+        # Arrival order of each slot's first log, to break ties like the list-based analyzer
+        self.first_seen = np.full(shape, self._unseen, dtype=np.int64)
+        self.logs_seen = 0
+    
+    def update(self, time_logs: Iterable, chunk_size: int = 10000,
+               columns: Optional[List[str]] = None) -> 'HourlyAccumulator':
+        """
+        Consume time logs chunk by chunk: dicts from any iterable, or row tuples whose
+        column names are given by columns. A DB-API cursor is read with fetchmany(chunk_size)
+        and names its columns itself. Logs without a productivity_score (or NULL) score 50.
+        """
+        if hasattr(time_logs, 'fetchmany'):
+            cursor = time_logs
+            if columns is None and cursor.description is not None:
+                columns = [column[0] for column in cursor.description]
+            time_logs = itertools.chain.from_iterable(iter(lambda: cursor.fetchmany(chunk_size), []))
+        
+        time_index = score_index = None
+        if columns is not None:
+            if 'start_time' not in columns:
+                raise ValueError("Time log rows need a start_time column")
+            time_index = columns.index('start_time')
+            score_index = columns.index('productivity_score') if 'productivity_score' in columns else None
+        
+        start_times, scores = [], []
+        for log in time_logs:
+            if isinstance(log, dict):
+                start_time, score = log.get('start_time'), log.get('productivity_score', 50)
+            elif time_index is None:
+                raise ValueError("Pass columns to read time logs from row tuples")
+            else:
+                start_time = log[time_index]
+                score = 50 if score_index is None else log[score_index]
+            if not start_time:
+                continue
+            start_times.append(start_time)
+            scores.append(50 if score is None else score)
+            if len(start_times) >= chunk_size:
+                self.update_arrays(start_times, scores)
+                start_times, scores = [], []
+        
+        if start_times:
+            self.update_arrays(start_times, scores)
+        return self
+    
+    def update_arrays(self, start_times, scores=None) -> 'HourlyAccumulator':
+        """Fold in columns of start times (ISO strings, datetimes or datetime64) and productivity scores"""
+        if isinstance(start_times, np.ndarray) and np.issubdtype(start_times.dtype, np.datetime64):
+            instants = wall_clock = start_times.astype('datetime64[us]')
+        else:
+            instants, wall_clock = _parse_timestamps(start_times)
+        scores = np.full(len(instants), 50.0) if scores is None else np.asarray(scores, dtype=float)
+        
+        hours, weekdays = _wall_clock_hours(wall_clock)
+        return self._accumulate(instants, hours, weekdays, scores)
+    
+    def update_records(self, records: np.ndarray) -> 'HourlyAccumulator':
+        """Fold in a TIME_LOG_DTYPE record array, whose hours and weekdays are already decoded"""
+        return self._accumulate(
+            records['start_time'], records['hour'].astype(np.int64),
+            records['weekday'].astype(np.int64), records['productivity_score']
+        )
+    
+    def _accumulate(self, instants: np.ndarray, hours: np.ndarray, weekdays: np.ndarray,
+                    scores: np.ndarray) -> 'HourlyAccumulator':
+        valid = hours >= 0
+        instants, slots, scores = instants[valid], hours[valid], scores[valid]
+        if self.by_weekday:
+            slots = weekdays[valid] * 24 + slots
+        
+        if self.half_life_days:
+            age_days = (self.reference_time - instants) / np.timedelta64(1, 'D')
+            weights = 0.5 ** (age_days / self.half_life_days)
+        else:
+            weights = np.ones(len(slots))
+        
+        size = self.counts.size
+        self.counts += np.bincount(slots, weights=weights, minlength=size).reshape(self.counts.shape)
+        self.sums += np.bincount(slots, weights=weights * scores, minlength=size).reshape(self.sums.shape)
+        np.minimum.at(self.first_seen.reshape(-1), slots, self.logs_seen + np.arange(len(slots)))
+        self.logs_seen += len(slots)
+        return self
+    
+    def merge(self, other: 'HourlyAccumulator') -> 'HourlyAccumulator':
+        """Add another accumulator's totals into this one"""
+        if (self.by_weekday, self.half_life_days) != (other.by_weekday, other.half_life_days):
+            raise ValueError("Cannot merge accumulators with different layouts or decay")
+        if self.half_life_days and self.reference_time != other.reference_time:
+            other = copy.deepcopy(other).decay_to(self.reference_time)
+        
+        self.counts += other.counts
+        self.sums += other.sums
+        self.first_seen = np.minimum(
+            self.first_seen,
+            np.where(other.first_seen == self._unseen, self._unseen, other.first_seen + self.logs_seen)
+        )
+        self.logs_seen += other.logs_seen
+        return self
+    
+    def decay_to(self, reference_time: datetime) -> 'HourlyAccumulator':
+        """Move the decay reference forward, down-weighting everything accumulated so far"""
+        if not self.half_life_days:
+            return self
+        
+        reference_time = _utc_instant(reference_time)
+        elapsed_days = (reference_time - self.reference_time) / np.timedelta64(1, 'D')
+        factor = 0.5 ** (elapsed_days / self.half_life_days)
+        self.counts *= factor
+        self.sums *= factor
+        self.reference_time = reference_time
+        return self
+    
+    def _hourly(self, weekday: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """24-slot counts, sums and first-seen order, for one weekday or all days"""
+        if not self.by_weekday:
+            return self.counts, self.sums, self.first_seen
+        if weekday is not None:
+            return self.counts[weekday], self.sums[weekday], self.first_seen[weekday]
+        return self.counts.sum(axis=0), self.sums.sum(axis=0), self.first_seen.min(axis=0)
+    
+    def productivity_by_hour(self, weekday: Optional[int] = None) -> Dict[int, float]:
+        """Average productivity per hour with data, in order of first appearance"""
+        counts, sums, first_seen = self._hourly(weekday)
+        hours = [hour for hour in np.argsort(first_seen, kind='stable') if counts[hour] > 0]
+        return {int(hour): float(sums[hour] / counts[hour]) for hour in hours}
+    
+    def optimal_hours(self, top_n: int = 3, weekday: Optional[int] = None) -> List[int]:
+        """Most productive hours (best first); weekday 0 is Monday when by_weekday is set"""
+        counts, sums, first_seen = self._hourly(weekday)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(counts > 0, sums / counts, -np.inf)
+        
+        order = np.lexsort((first_seen, -means))[:top_n]
+        return [int(hour) for hour in order if counts[hour] > 0]
+
 class OptimalTimeAnalyzer:
     """Analyzes optimal working hours using clustering"""
     
     def __init__(self):
-        self.model = KMeans(n_clusters=3, random_state=42)
+        self._model = None
         self.optimal_hours = None
+        # Cohort clustering state, set by fit_cohorts
+        self.cohort_by_weekday = False
+        self.is_trained = False
+    
+    @property
+    def model(self):
+        """
+        MiniBatchKMeans over user productivity profiles, created on first use so
+        sklearn loads only when needed; mini-batches let fit_cohorts stream users
+        """
+        if self._model is None:
+            from sklearn.cluster import MiniBatchKMeans
+            self._model = MiniBatchKMeans(n_clusters=3, random_state=42)
+        return self._model
     
-    def analyze_productivity_patterns(self, time_logs: List[Dict]) -> Dict:
+    @model.setter
+    def model(self, model):
+        self._model = model
+    
+    def analyze_productivity_patterns(self, time_logs: Union[np.ndarray, List[Dict]]) -> Dict:
         """
         Analyze productivity patterns by time of day
         Returns optimal working hours and productivity by hour
         """
+        if isinstance(time_logs, np.ndarray):
+            accumulator = HourlyAccumulator().update_records(time_logs)
+            return {
+                'optimal_hours': accumulator.optimal_hours(),
+                'productivity_by_hour': accumulator.productivity_by_hour()
+            }
+        
         if not time_logs:
             return {'optimal_hours': [], 'productivity_by_hour': {}}
         
@@ -244,53 +1213,338 @@ class OptimalTimeAnalyzer:
             'optimal_hours': optimal_hours,
             'productivity_by_hour': productivity_by_hour
         }
-
-class BurnoutDetector:
-    """Detects potential burnout patterns"""
     
-    def __init__(self):
-        self.burnout_thresholds = {
-            'working_hours_daily': 10,  # hours
-            'productivity_decline_days': 7,
-            'task_completion_rate_drop': 0.3,  # 30% drop
-            'habit_miss_rate': 0.5  # 50% habits missed
+    def analyze_stream(self, time_logs: Iterable, chunk_size: int = 10000,
+                       by_weekday: bool = False, half_life_days: Optional[float] = None,
+                       columns: Optional[List[str]] = None) -> Dict:
+        """
+        Streaming analyze_productivity_patterns: consumes time logs from any iterable
+        or DB cursor (as HourlyAccumulator.update reads them) into fixed-size hourly
+        accumulators instead of materializing per-hour lists
+        """
+        accumulator = HourlyAccumulator(by_weekday, half_life_days).update(time_logs, chunk_size, columns)
+        return {
+            'optimal_hours': accumulator.optimal_hours(),
+            'productivity_by_hour': accumulator.productivity_by_hour()
         }
     
-    def assess_burnout_risk(self, user_data: Dict) -> Dict:
+    def optimal_hours_batch(self, log_lists: List) -> List[List[int]]:
         """
-        Assess burnout risk based on:
-        - Working hours trends
-        - Productivity decline
-        - Task completion patterns
-        - Habit consistency
+        Top 3 productive hours for many users from one set of (user, hour) accumulators.
+        Each user's time logs may be a dict list or a TIME_LOG_DTYPE record array.
         """
-        risk_factors = []
-        risk_score = 0
+        n_users = len(log_lists)
+        records, lengths = _pack_records(log_lists, time_logs_to_records)
+        owners = np.repeat(np.arange(n_users), lengths)
         
-        # Check excessive working hours
-        avg_daily_hours = user_data.get('avg_daily_working_hours', 0)
-        if avg_daily_hours > self.burnout_thresholds['working_hours_daily']:
-            risk_factors.append(f"Excessive working hours: {avg_daily_hours:.1f}h/day")
-            risk_score += 25
+        valid = records['hour'] >= 0
+        if not valid.any():
+            return [[] for _ in log_lists]
         
-        # Check productivity decline
-        productivity_trend = user_data.get('productivity_trend', [])
-        if len(productivity_trend) >= self.burnout_thresholds['productivity_decline_days']:
-            recent_avg = np.mean(productivity_trend[-3:])
-            earlier_avg = np.mean(productivity_trend[-7:-3])
-            decline = (earlier_avg - recent_avg) / earlier_avg
-            
-            if decline > self.burnout_thresholds['task_completion_rate_drop']:
-                risk_factors.append(f"Productivity declined by {decline*100:.1f}%")
-                risk_score += 30
+        keys = owners[valid] * 24 + records['hour'][valid]
+        scores = records['productivity_score'][valid]
         
-        # Check habit consistency
-        habit_completion_rate = user_data.get('habit_completion_rate', 1.0)
-        if habit_completion_rate < (1 - self.burnout_thresholds['habit_miss_rate']):
-            risk_factors.append(f"Low habit consistency: {habit_completion_rate*100:.1f}%")
-            risk_score += 20
+        counts = np.bincount(keys, minlength=n_users * 24).reshape(n_users, 24)
+        sums = np.bincount(keys, weights=scores, minlength=n_users * 24).reshape(n_users, 24)
+        first_seen = np.full(n_users * 24, len(keys))
+        np.minimum.at(first_seen, keys, np.arange(len(keys)))
         
-        # Check task completion patterns
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(counts > 0, sums / counts, -np.inf)
+        
+        # Highest mean first; ties keep the order in which the hours first appeared
+        order = np.lexsort((first_seen.reshape(n_users, 24), -means), axis=-1)[:, :3]
+        
+        return [
+            [int(hour) for hour in row if counts[user_idx, hour] > 0]
+            for user_idx, row in enumerate(order)
+        ]
+    
+    def productivity_profiles(self, log_lists: List,
+                              by_weekday: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Per-user productivity profiles for cohort clustering: mean score per hour
+        (or per weekday and hour, 7x24) minus the user's overall mean, so users group
+        by when they are productive rather than how much; 0 for slots without logs.
+        Returns (profiles, has_logs), has_logs marking users with any time log.
+        """
+        n_slots = 7 * 24 if by_weekday else 24
+        records, lengths = _pack_records(log_lists, time_logs_to_records)
+        owners = np.repeat(np.arange(len(log_lists)), lengths)
+        
+        valid = records['hour'] >= 0
+        slots = records['hour'][valid].astype(np.int64)
+        if by_weekday:
+            slots += records['weekday'][valid].astype(np.int64) * 24
+        keys = owners[valid] * n_slots + slots
+        
+        size = len(log_lists) * n_slots
+        counts = np.bincount(keys, minlength=size).reshape(-1, n_slots)
+        sums = np.bincount(
+            keys, weights=records['productivity_score'][valid], minlength=size
+        ).reshape(-1, n_slots)
+        
+        totals = counts.sum(axis=1)
+        has_logs = totals > 0
+        user_means = np.divide(sums.sum(axis=1), totals, out=np.zeros(len(totals)), where=has_logs)
+        centered = np.zeros(counts.shape)
+        np.divide(sums, counts, out=centered, where=counts > 0)
+        centered -= user_means[:, None]
+        return np.where(counts > 0, centered, 0.0), has_logs
+    
+    def choose_cohort_count(self, log_lists: List, k_values: Iterable[int] = range(2, 9),
+                            by_weekday: bool = False, sample_size: int = 5000,
+                            random_state: int = 42) -> Dict[int, float]:
+        """
+        Silhouette score for each candidate number of cohorts, clustering a sample of
+        users (log_lists) and scoring on at most sample_size of them. Sets the model
+        to the best-scoring count for fit_cohorts and returns all scores.
+        """
+        from sklearn.base import clone
+        from sklearn.metrics import silhouette_score
+        
+        profiles, has_logs = self.productivity_profiles(log_lists, by_weekday)
+        profiles = profiles[has_logs]
+        
+        scores = {}
+        for k in k_values:
+            if k >= len(profiles):
+                break
+            labels = clone(self.model).set_params(n_clusters=k).fit_predict(profiles)
+            if len(np.unique(labels)) < 2:
+                continue
+            scores[k] = float(silhouette_score(
+                profiles, labels, sample_size=min(sample_size, len(profiles)),
+                random_state=random_state
+            ))
+        
+        if not scores:
+            raise ValueError("Not enough users with time logs to compare cohort counts")
+        self.model = clone(self.model).set_params(n_clusters=max(scores, key=scores.get))
+        return scores
+    
+    def fit_cohorts(self, user_chunks: Iterable[List], by_weekday: bool = False) -> Dict:
+        """
+        Cluster users into cohorts by productivity profile with MiniBatchKMeans.partial_fit,
+        one chunk of users at a time (each chunk a list of per-user time logs, e.g. pages
+        of a database query), so the whole user base never has to be in memory.
+        """
+        from sklearn.base import clone
+        
+        model = clone(self.model)
+        pending = []
+        n_users = n_batches = 0
+        for log_lists in user_chunks:
+            profiles, has_logs = self.productivity_profiles(log_lists, by_weekday)
+            pending.append(profiles[has_logs])
+            n_users += int(has_logs.sum())
+            # partial_fit needs at least n_clusters rows per batch
+            if sum(map(len, pending)) >= model.n_clusters:
+                model.partial_fit(np.concatenate(pending))
+                pending = []
+                n_batches += 1
+        
+        leftover = np.concatenate(pending) if pending else np.empty((0, 0))
+        if n_batches == 0:
+            raise ValueError("Not enough users with time logs to fit cohorts")
+        if len(leftover):
+            model.partial_fit(leftover)
+            n_batches += 1
+        
+        self.model = model
+        self.cohort_by_weekday = by_weekday
+        self.is_trained = True
+        logger.info(f"Cohort model fitted on {n_users} users in {n_batches} batches")
+        return {'users': n_users, 'batches': n_batches, 'cohorts': model.n_clusters}
+    
+    def assign_cohorts(self, log_lists: List) -> np.ndarray:
+        """
+        Cohort index for each user's time logs, -1 for users without any.
+        Nearest-center search is plain NumPy, cheap enough for the request path.
+        """
+        if not self.is_trained:
+            raise ValueError("Cohort model is not fitted; call fit_cohorts first")
+        
+        centers = self.model.cluster_centers_
+        profiles, has_logs = self.productivity_profiles(log_lists, self.cohort_by_weekday)
+        distances = (centers ** 2).sum(axis=1) - 2 * profiles @ centers.T
+        return np.where(has_logs, distances.argmin(axis=1), -1)
+
+class BurnoutWindow:
+    """
+    Rolling burnout inputs for a whole cohort, maintained from daily aggregates.
+    Keeps each user's last window_days observed days in a fixed users x days ring
+    buffer, so appending a day is a vectorized write per date and burnout_inputs()
+    derives every user's assess_burnout_risk inputs in one pass.
+    """
+    
+    # Daily aggregate columns and the value used when a column is missing
+    fields = {
+        'working_hours': 0.0,
+        'productivity_score': 0.0,
+        'habits_completed': 0.0,
+        'total_habits': 0.0,
+        'tasks_overdue': 0.0,
+        'tasks_due': 0.0
+    }
+    
+    def __init__(self, window_days: int = 7):
+        if window_days < 7:
+            raise ValueError("window_days must cover the 7-day productivity trend")
+        self.window_days = window_days
+        self.user_ids = []
+        self.user_index = {}
+        self.values = np.zeros((0, window_days, len(self.fields)))
+        self.days_seen = np.zeros(0, dtype=np.int64)
+        self.last_date = np.zeros(0, dtype='datetime64[D]')
+    
+    def _rows(self, user_ids: List) -> np.ndarray:
+        """Row of each user, adding rows (with amortized growth) for new users"""
+        for user_id in user_ids:
+            if user_id not in self.user_index:
+                self.user_index[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+        
+        n_users = len(self.user_ids)
+        if n_users > len(self.days_seen):
+            capacity = max(n_users, 2 * len(self.days_seen))
+            grow = capacity - len(self.days_seen)
+            self.values = np.concatenate([self.values, np.zeros((grow,) + self.values.shape[1:])])
+            self.days_seen = np.concatenate([self.days_seen, np.zeros(grow, dtype=np.int64)])
+            self.last_date = np.concatenate(
+                [self.last_date, np.full(grow, np.datetime64('NaT'), dtype='datetime64[D]')]
+            )
+        return np.array([self.user_index[user_id] for user_id in user_ids], dtype=np.int64)
+    
+    def append(self, frame) -> int:
+        """
+        Fold in daily aggregates: a pandas DataFrame or dict of equal-length columns
+        with user_id, date and any of the fields. A user's newer date starts a new
+        window day, the same date replaces that day (recomputed aggregates), and
+        older dates are ignored. Returns the number of rows applied.
+        """
+        user_ids = list(frame['user_id'])
+        dates = _parse_timestamps(list(frame['date']))[0].astype('datetime64[D]')
+        columns = np.zeros((len(user_ids), len(self.fields)))
+        for j, (field, default) in enumerate(self.fields.items()):
+            if field not in frame:
+                columns[:, j] = default
+                continue
+            values = frame[field]
+            if hasattr(values, 'to_numpy'):
+                values = values.to_numpy(dtype=float, na_value=np.nan)
+            else:
+                values = np.asarray(values, dtype=float)
+            columns[:, j] = np.where(np.isnan(values), default, values)
+        
+        rows = self._rows(user_ids)
+        applied = 0
+        for date in np.unique(dates[~np.isnat(dates)]):
+            on_date = np.flatnonzero(dates == date)
+            # A user repeated within one date keeps its last row
+            _, last = np.unique(rows[on_date][::-1], return_index=True)
+            on_date = on_date[::-1][last]
+            users = rows[on_date]
+            
+            previous = self.last_date[users]
+            newer = np.isnat(previous) | (previous < date)
+            current = newer | (previous == date)
+            self.days_seen[users[newer]] += 1
+            self.last_date[users[newer]] = date
+            
+            users, on_date = users[current], on_date[current]
+            slots = (self.days_seen[users] - 1) % self.window_days
+            self.values[users, slots] = columns[on_date]
+            applied += len(users)
+        
+        return applied
+    
+    def burnout_inputs(self) -> Dict[str, np.ndarray]:
+        """
+        Per-user assess_burnout_risk inputs over each user's last window_days observed
+        days, aligned with user_ids. productivity_trend is a users x 7 matrix of the
+        latest daily scores, oldest first, NaN-padded for users with fewer days.
+        """
+        n_users = len(self.user_ids)
+        values = self.values[:n_users]
+        days_seen = self.days_seen[:n_users]
+        observed = np.minimum(days_seen, self.window_days)
+        
+        # Slots fill in order until the ring wraps, so the first `observed` slots are live
+        live = np.arange(self.window_days) < observed[:, None]
+        totals = np.where(live[:, :, None], values, 0).sum(axis=1)
+        field = {name: j for j, name in enumerate(self.fields)}
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_hours = np.where(observed > 0, totals[:, field['working_hours']] / observed, 0.0)
+            habit_rate = np.where(
+                totals[:, field['total_habits']] > 0,
+                totals[:, field['habits_completed']] / totals[:, field['total_habits']], 1.0
+            )
+            overdue_rate = np.where(
+                totals[:, field['tasks_due']] > 0,
+                totals[:, field['tasks_overdue']] / totals[:, field['tasks_due']], 0.0
+            )
+        
+        # Latest 7 observed days, oldest first
+        back = np.arange(7, 0, -1)
+        slots = (days_seen[:, None] - back) % self.window_days
+        trend = values[np.arange(n_users)[:, None], slots, field['productivity_score']]
+        trend = np.where(days_seen[:, None] >= back, trend, np.nan)
+        
+        return {
+            'avg_daily_working_hours': avg_hours,
+            'productivity_trend': trend,
+            'habit_completion_rate': habit_rate,
+            'task_overdue_rate': overdue_rate
+        }
+
+class BurnoutDetector:
+    """Detects potential burnout patterns"""
+    
+    def __init__(self):
+        self.burnout_thresholds = {
+            'working_hours_daily': 10,  # hours
+            'productivity_decline_days': 7,
+            'task_completion_rate_drop': 0.3,  # 30% drop
+            'habit_miss_rate': 0.5  # 50% habits missed
+        }
+    
+    def assess_burnout_risk(self, user_data: Dict) -> Dict:
+        """
+        Assess burnout risk based on:
+        - Working hours trends
+        - Productivity decline
+        - Task completion patterns
+        - Habit consistency
+        """
+        risk_factors = []
+        risk_score = 0
+        
+        # Check excessive working hours
+        avg_daily_hours = user_data.get('avg_daily_working_hours', 0)
+        if avg_daily_hours > self.burnout_thresholds['working_hours_daily']:
+            risk_factors.append(f"Excessive working hours: {avg_daily_hours:.1f}h/day")
+            risk_score += 25
+        
+        # Check productivity decline
+        productivity_trend = user_data.get('productivity_trend', [])
+        if len(productivity_trend) >= self.burnout_thresholds['productivity_decline_days']:
+            recent_avg = np.mean(productivity_trend[-3:])
+            earlier_avg = np.mean(productivity_trend[-7:-3])
+            decline = (earlier_avg - recent_avg) / earlier_avg
+            
+            if decline > self.burnout_thresholds['task_completion_rate_drop']:
+                risk_factors.append(f"Productivity declined by {decline*100:.1f}%")
+                risk_score += 30
+        
+        # Check habit consistency
+        habit_completion_rate = user_data.get('habit_completion_rate', 1.0)
+        if habit_completion_rate < (1 - self.burnout_thresholds['habit_miss_rate']):
+            risk_factors.append(f"Low habit consistency: {habit_completion_rate*100:.1f}%")
+            risk_score += 20
+        
+        # Check task completion patterns
         task_overdue_rate = user_data.get('task_overdue_rate', 0)
         if task_overdue_rate > 0.3:
             risk_factors.append(f"High overdue task rate: {task_overdue_rate*100:.1f}%")
@@ -311,6 +1565,65 @@ class BurnoutDetector:
             'recommendations': self._generate_burnout_recommendations(risk_level, risk_factors)
         }
     
+    def assess_burnout_risk_batch(self, inputs: Dict[str, np.ndarray],
+                                  details: bool = False) -> Dict:
+        """
+        assess_burnout_risk for a whole cohort at once, from columns as produced by
+        BurnoutWindow.burnout_inputs (productivity_trend as a users x 7 matrix, NaN-padded).
+        Returns risk_score and risk_level arrays plus a boolean array per risk factor;
+        with details, also 'reports', the per-user dicts assess_burnout_risk returns.
+        """
+        hours = np.asarray(inputs['avg_daily_working_hours'], dtype=float)
+        trend = np.asarray(inputs['productivity_trend'], dtype=float)
+        habit_rate = np.asarray(inputs['habit_completion_rate'], dtype=float)
+        overdue_rate = np.asarray(inputs['task_overdue_rate'], dtype=float)
+        
+        # Recent 3 days against the 4 before them, for users with 7 days of scores
+        has_trend = ~np.isnan(trend).any(axis=1)
+        recent_avg = trend[:, -3:].mean(axis=1)
+        earlier_avg = trend[:, -7:-3].mean(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            decline = (earlier_avg - recent_avg) / earlier_avg
+        
+        factors = {
+            'working_hours': hours > self.burnout_thresholds['working_hours_daily'],
+            'productivity_decline': has_trend & (decline > self.burnout_thresholds['task_completion_rate_drop']),
+            'habit_consistency': habit_rate < (1 - self.burnout_thresholds['habit_miss_rate']),
+            'task_overdue': overdue_rate > 0.3
+        }
+        risk_score = (
+            25 * factors['working_hours'] + 30 * factors['productivity_decline'] +
+            20 * factors['habit_consistency'] + 25 * factors['task_overdue']
+        )
+        risk_level = np.where(risk_score >= 70, 'high', np.where(risk_score >= 40, 'medium', 'low'))
+        result = {'risk_score': risk_score, 'risk_level': risk_level, 'factors': factors}
+        
+        if details:
+            # Text and recommendations only for users with any risk factor
+            reports = []
+            for i in range(len(risk_score)):
+                risk_factors = []
+                if factors['working_hours'][i]:
+                    risk_factors.append(f"Excessive working hours: {hours[i]:.1f}h/day")
+                if factors['productivity_decline'][i]:
+                    risk_factors.append(f"Productivity declined by {decline[i]*100:.1f}%")
+                if factors['habit_consistency'][i]:
+                    risk_factors.append(f"Low habit consistency: {habit_rate[i]*100:.1f}%")
+                if factors['task_overdue'][i]:
+                    risk_factors.append(f"High overdue task rate: {overdue_rate[i]*100:.1f}%")
+                level = str(risk_level[i])
+                reports.append({
+                    'risk_level': level,
+                    'risk_score': int(risk_score[i]),
+                    'risk_factors': risk_factors,
+                    'recommendations': (
+                        self._generate_burnout_recommendations(level, risk_factors) if risk_factors else []
+                    )
+                })
+            result['reports'] = reports
+        
+        return result
+    
     def _generate_burnout_recommendations(self, risk_level: str, factors: List[str]) -> List[str]:
         """Generate personalized burnout prevention recommendations"""
         recommendations = []
@@ -343,11 +1656,57 @@ class BurnoutDetector:
         
         return recommendations
 
+class TrendStatistics:
+    """
+    Running least-squares sufficient statistics for one user's daily scores.
+    Keeps the count, means and co-moments of (day offset, score), so each new
+    day is folded in with add() in O(1) instead of refitting the whole history.
+    Offsets count calendar days, so timestamps with a time of day fall on their date.
+    """
+    
+    def __init__(self):
+        self.anchor = None  # midnight of the earliest date seen; day offsets are measured from it
+        self.last_date = None
+        self.count = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.co_xx = 0.0
+        self.co_xy = 0.0
+    
+    def add(self, date, score: float = 50):
+        """Fold one (date, productivity score) observation into the statistics"""
+        day = np.timedelta64(1, 'D')
+        moment = _parse_timestamps([date])[0][0]
+        if np.isnat(moment):
+            raise ValueError("Historical data entry without a date")
+        
+        midnight = moment.astype('datetime64[D]').astype(moment.dtype)
+        if self.anchor is None:
+            self.anchor, self.last_date = midnight, moment
+        elif midnight < self.anchor:
+            # Re-anchor: every offset shifts by the same whole days, co-moments are unchanged
+            self.mean_x += (self.anchor - midnight) // day
+            self.anchor = midnight
+        self.last_date = max(self.last_date, moment)
+        
+        x = float((moment - self.anchor) // day)
+        self.count += 1
+        dx = x - self.mean_x
+        self.mean_x += dx / self.count
+        self.mean_y += (score - self.mean_y) / self.count
+        self.co_xx += dx * (x - self.mean_x)
+        self.co_xy += dx * (score - self.mean_y)
+    
+    def coefficients(self) -> Tuple[float, float]:
+        """Least-squares (slope, intercept) over day offsets from the anchor"""
+        slope = self.co_xy / self.co_xx if self.co_xx > 0 else 0.0
+        return slope, self.mean_y - slope * self.mean_x
+
 class TrendPredictor:
     """Predicts productivity trends using time series analysis"""
     
     def __init__(self):
-        self.model = LinearRegression()
+        self.statistics = None
         self.is_trained = False
     
     def prepare_time_series_data(self, historical_data: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
@@ -369,108 +1728,1117 @@ class TrendPredictor:
         
         return X, y
     
-    def train(self, historical_data: List[Dict]):
-        """Train the trend prediction model"""
-        X, y = self.prepare_time_series_data(historical_data)
+    def build_statistics(self, historical_data: Union[np.ndarray, List[Dict]]) -> Optional[TrendStatistics]:
+        """Sufficient statistics for one history, or None if it is empty"""
+        return self.build_statistics_batch([historical_data])[0]
+    
+    def build_statistics_batch(self, histories: List) -> List[Optional[TrendStatistics]]:
+        """
+        Sufficient statistics for many histories in one vectorized pass.
+        Each history may be a dict list or a HISTORY_DTYPE record array. Entries
+        need not be sorted; offsets count calendar days from each history's earliest date.
+        """
+        results = [None] * len(histories)
+        records, all_lengths = _pack_records(histories, history_to_records)
+        present = np.flatnonzero(all_lengths)
+        if not len(present):
+            return results
+        
+        lengths = all_lengths[present]
+        owners = np.repeat(np.arange(len(present)), lengths)
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        
+        dates = records['date']
+        if np.isnat(dates).any():
+            raise ValueError("Historical data entry without a date")
+        scores = records['productivity_score']
+        
+        day = np.timedelta64(1, 'D')
+        anchors = np.minimum.reduceat(dates, offsets).astype('datetime64[D]').astype(dates.dtype)
+        last_dates = np.maximum.reduceat(dates, offsets)
+        x = ((dates - anchors[owners]) // day).astype(float)
+        
+        counts = lengths.astype(float)
+        mean_x = np.bincount(owners, weights=x) / counts
+        mean_y = np.bincount(owners, weights=scores) / counts
+        dx = x - mean_x[owners]
+        co_xx = np.bincount(owners, weights=dx * dx)
+        co_xy = np.bincount(owners, weights=dx * (scores - mean_y[owners]))
+        
+        for row, i in enumerate(present):
+            statistics = TrendStatistics()
+            statistics.anchor = anchors[row]
+            statistics.last_date = last_dates[row]
+            statistics.count = int(lengths[row])
+            statistics.mean_x = float(mean_x[row])
+            statistics.mean_y = float(mean_y[row])
+            statistics.co_xx = float(co_xx[row])
+            statistics.co_xy = float(co_xy[row])
+            results[i] = statistics
+        
+        return results
+    
+    def forecast(self, statistics: Optional[TrendStatistics]) -> List[Dict]:
+        """Predict productivity scores for the 7 days after the latest observation"""
+        return self.forecast_batch([statistics])[0]
+    
+    def forecast_batch(self, statistics_list: List[Optional[TrendStatistics]]) -> List[List[Dict]]:
+        """Forecast the next 7 days for many users in one vectorized step"""
+        results = [[] for _ in statistics_list]
+        ready = [
+            i for i, statistics in enumerate(statistics_list)
+            if statistics is not None and statistics.count >= 7
+        ]
+        if not ready:
+            return results
+        
+        day = np.timedelta64(1, 'D')
+        anchors = np.array([statistics_list[i].anchor for i in ready], dtype='datetime64[us]')
+        last_dates = np.array([statistics_list[i].last_date for i in ready], dtype='datetime64[us]')
+        coefficients = np.array([statistics_list[i].coefficients() for i in ready])
         
-        if len(X) == 0:
+        future_dates = last_dates[:, None] + np.arange(1, 8) * day
+        future_x = (future_dates - anchors[:, None]) // day
+        predicted = coefficients[:, 1:2] + coefficients[:, 0:1] * future_x
+        predicted = np.round(np.clip(predicted, 0, 100), 1)  # Clamp between 0-100
+        
+        for row, i in enumerate(ready):
+            confidence = 'medium' if statistics_list[i].count >= 30 else 'low'
+            results[i] = [
+                {
+                    'date': date.isoformat(),
+                    'predicted_score': score,
+                    'confidence': confidence
+                }
+                for date, score in zip(future_dates[row].tolist(), predicted[row].tolist())
+            ]
+        
+        return results
+    
+    def train(self, historical_data: Union[np.ndarray, List[Dict]]):
+        """Train the trend prediction model"""
+        if len(historical_data) < 7:
             logger.warning("Insufficient data for trend prediction")
             return
         
-        self.model.fit(X, y)
+        self.statistics = self.build_statistics(historical_data)
         self.is_trained = True
         logger.info("Trend predictor trained successfully")
     
-    def predict_next_week(self, historical_data: List[Dict]) -> List[Dict]:
+    def predict_next_week(self, historical_data: Union[np.ndarray, List[Dict]]) -> List[Dict]:
         """Predict productivity scores for the next 7 days"""
-        if not self.is_trained:
+        if not self.is_trained or len(historical_data) < 7:
+            return []
+        
+        return self.forecast(self.statistics)
+
+class ModelRegistry:
+    """
+    Versioned on-disk store for trained engine components.
+    Each save writes root_dir/<name>/v<version>.joblib plus a JSON metadata sidecar.
+    Loads are uncompressed joblib with memory-mapped arrays where possible, so
+    several workers on one host share the model pages. Only load trusted directories.
+    """
+    
+    def __init__(self, root_dir: str, mmap_mode: Optional[str] = 'r'):
+        self.root_dir = root_dir
+        self.mmap_mode = mmap_mode
+    
+    def _path(self, name: str, version: int, suffix: str) -> str:
+        return os.path.join(self.root_dir, name, f"v{version:04d}{suffix}")
+    
+    def versions(self, name: str) -> List[int]:
+        """Saved versions of a component, oldest first"""
+        directory = os.path.join(self.root_dir, name)
+        if not os.path.isdir(directory):
             return []
         
-        X, _ = self.prepare_time_series_data(historical_data)
+        return sorted(
+            int(filename[1:-len('.joblib')])
+            for filename in os.listdir(directory)
+            if filename.startswith('v') and filename.endswith('.joblib')
+        )
+    
+    def metadata(self, name: str, version: int) -> Dict:
+        """Metadata recorded when a version was saved"""
+        with open(self._path(name, version, '.json')) as f:
+            return json.load(f)
+    
+    def save(self, name: str, component, keep_last: Optional[int] = None) -> int:
+        """Save a trained component as a new version and return its version number"""
+        os.makedirs(os.path.join(self.root_dir, name), exist_ok=True)
+        
+        # Claim the next version number atomically via the metadata file
+        version = (self.versions(name) or [0])[-1] + 1
+        while True:
+            try:
+                meta_file = open(self._path(name, version, '.json'), 'x')
+                break
+            except FileExistsError:
+                version += 1
+        
+        import joblib
+        import sklearn
+        
+        with meta_file:
+            json.dump({
+                'version': version,
+                'component': type(component).__name__,
+                'saved_at': datetime.now().isoformat(),
+                'sklearn_version': sklearn.__version__
+            }, meta_file)
+        
+        # Write under a temporary name so readers never see a partial model
+        path = self._path(name, version, '.joblib')
+        joblib.dump(component, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        logger.info(f"Saved {name} version {version}")
+        
+        if keep_last:
+            for old_version in self.versions(name)[:-keep_last]:
+                os.remove(self._path(name, old_version, '.joblib'))
+                os.remove(self._path(name, old_version, '.json'))
+        
+        return version
+    
+    def load(self, name: str, version: Optional[int] = None):
+        """Load a component version (latest by default), or None if nothing is saved"""
+        if version is None:
+            versions = self.versions(name)
+            if not versions:
+                return None
+            version = versions[-1]
+        
+        import joblib
+        import sklearn
+        
+        saved_with = self.metadata(name, version).get('sklearn_version')
+        if saved_with != sklearn.__version__:
+            logger.warning(
+                f"{name} version {version} was saved with scikit-learn {saved_with}, "
+                f"running {sklearn.__version__}"
+            )
+        
+        component = joblib.load(self._path(name, version, '.joblib'), mmap_mode=self.mmap_mode)
+        if hasattr(component, 'generation'):
+            # The saved generation came from another process's counter
+            component.generation = next(_model_generations)
+        logger.info(f"Loaded {name} version {version}")
+        return component
+
+class FeatureStore:
+    """
+    On-disk columnar store of parsed task, time log and daily history records.
+    Rows keep their compact record dtypes (TaskRecords.dtype, TIME_LOG_DTYPE,
+    HISTORY_DTYPE) in .npy parts partitioned by date and user, under
+    root_dir/<table>/<YYYY-MM>/users-<bucket>/ with users_per_partition users per
+    bucket. Each part is sorted by user code and carries that parallel code array
+    (and task ids and titles for tasks, '' where missing), so a user's rows in a part are one contiguous slice:
+    training and inference memory-map already parsed columns instead of re-reading
+    JSON. Appends add immutable parts; compact() merges each partition's parts,
+    keeping the latest row per task id or history date. Assumes a single writer.
+    """
+    
+    # table -> (record dtype, timestamp field used for the month partition)
+    tables = {
+        'tasks': (TaskRecords.dtype, 'created_at'),
+        'time_logs': (TIME_LOG_DTYPE, 'start_time'),
+        'history': (HISTORY_DTYPE, 'date')
+    }
+    
+    # user_data field -> table
+    user_data_tables = {
+        'recent_tasks': 'tasks',
+        'time_logs': 'time_logs',
+        'historical_data': 'history'
+    }
+    
+    # Users per user partition within a month; user codes are assigned in arrival order
+    users_per_partition = 4096
+    
+    def __init__(self, root_dir: str, mmap_mode: Optional[str] = 'r'):
+        self.root_dir = root_dir
+        self.mmap_mode = mmap_mode
+        os.makedirs(root_dir, exist_ok=True)
+        
+        # User ids are stored once; parts hold int32 codes
+        self._users_path = os.path.join(root_dir, 'users.json')
+        try:
+            with open(self._users_path) as f:
+                self.user_ids = json.load(f)
+        except FileNotFoundError:
+            self.user_ids = []
+        self.user_codes = {user_id: code for code, user_id in enumerate(self.user_ids)}
+    
+    def _codes(self, user_ids: Iterable[str], create: bool = False) -> np.ndarray:
+        """int32 codes for user ids; -1 for unknown users unless create is set"""
+        codes = []
+        added = False
+        for user_id in user_ids:
+            code = self.user_codes.get(user_id)
+            if code is None and create:
+                code = self.user_codes[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+                added = True
+            codes.append(-1 if code is None else code)
+        
+        if added:
+            self._write(self._users_path, lambda f: f.write(json.dumps(self.user_ids).encode()))
+        return np.array(codes, dtype=np.int32)
+    
+    @staticmethod
+    def _write(path: str, write):
+        # Write under a temporary name so readers never see a partial file
+        with open(path + '.tmp', 'wb') as f:
+            write(f)
+        os.replace(path + '.tmp', path)
+    
+    def _save_part(self, directory: str, name: str, codes: np.ndarray, records,
+                   task_columns: Optional[Dict[str, np.ndarray]] = None):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, name)
+        for column, values in (task_columns or {}).items():
+            self._write(f"{base}.{column}.npy", lambda f: np.save(f, values))
+        self._write(base + '.users.npy', lambda f: np.save(f, codes))
+        # The records file goes last: its presence makes the part visible
+        self._write(base + '.npy', lambda f: np.save(f, records))
+    
+    def _remove_part(self, directory: str, name: str):
+        for suffix in ('.npy', '.users.npy', '.ids.npy', '.titles.npy'):
+            path = os.path.join(directory, name + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def append(self, table: str, user_ids: List[str], rows: List) -> int:
+        """
+        Append rows for the given users: rows[i] holds user_ids[i]'s new entries,
+        as a dict list or already in the table's record form. Returns rows written.
+        """
+        to_records, concatenate = {
+            'tasks': (TaskRecords.from_dicts, TaskRecords.concatenate),
+            'time_logs': (time_logs_to_records, np.concatenate),
+            'history': (history_to_records, np.concatenate)
+        }[table]
+        records, lengths = _pack_records(rows, to_records, concatenate)
+        if not len(records):
+            return 0
+        codes = np.repeat(self._codes(user_ids, create=True), lengths)
+        
+        if table == 'tasks':
+            task_columns = {}
+            for column in ('ids', 'titles'):
+                values = getattr(records, column)
+                values = [None] * len(records) if values is None else values.tolist()
+                task_columns[column] = np.array(['' if value is None else str(value) for value in values])
+            data = records.data
+        else:
+            task_columns, data = None, records
+        
+        # One stable sort groups every part's rows by user without reordering each user's rows
+        order = np.argsort(codes, kind='stable')
+        codes, data = codes[order], data[order]
+        if task_columns is not None:
+            task_columns = {column: values[order] for column, values in task_columns.items()}
         
-        if len(X) == 0:
+        _, date_field = self.tables[table]
+        months = data[date_field].astype('datetime64[M]')
+        labels = np.where(np.isnat(months), 'undated', months.astype(str))
+        buckets = codes // self.users_per_partition
+        name = f"part-{time.time_ns():020d}-{os.getpid()}"
+        for label in np.unique(labels):
+            in_month = labels == label
+            for bucket in np.unique(buckets[in_month]):
+                part_rows = np.flatnonzero(in_month & (buckets == bucket))
+                part_columns = None if task_columns is None else {
+                    column: values[part_rows] for column, values in task_columns.items()
+                }
+                self._save_part(
+                    self._partition_dir(table, str(label), int(bucket)), name, codes[part_rows],
+                    data[part_rows], part_columns
+                )
+        return len(data)
+    
+    def append_user_data(self, users: Dict[str, Dict]) -> Dict[str, int]:
+        """Append new recent_tasks, time_logs and historical_data of many users at once"""
+        written = {}
+        for field, table in self.user_data_tables.items():
+            present = {user_id: data[field] for user_id, data in users.items() if data.get(field) is not None}
+            written[table] = self.append(table, list(present), list(present.values()))
+        return written
+    
+    def _partition_dir(self, table: str, label: str, bucket: int) -> str:
+        return os.path.join(self.root_dir, table, label, f"users-{bucket:05d}")
+    
+    def partitions(self, table: str, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+        """Month partitions ('YYYY-MM', plus 'undated') of a table, optionally within [start, end]"""
+        directory = os.path.join(self.root_dir, table)
+        if not os.path.isdir(directory):
             return []
         
-        # Get the last date from historical data
-        last_date = datetime.fromisoformat(historical_data[-1]['date'])
+        labels = sorted(os.listdir(directory))
+        if start is not None or end is not None:
+            labels = [
+                label for label in labels
+                if label != 'undated' and (start is None or label >= start) and (end is None or label <= end)
+            ]
+        return labels
+    
+    def _partition_dirs(self, table: str, start: Optional[str] = None, end: Optional[str] = None,
+                        buckets: Optional[np.ndarray] = None) -> Iterator[str]:
+        """User partition directories by month, optionally only the given user buckets"""
+        for label in self.partitions(table, start, end):
+            month_dir = os.path.join(self.root_dir, table, label)
+            for bucket_dir in sorted(os.listdir(month_dir)):
+                if buckets is None or int(bucket_dir[len('users-'):]) in buckets:
+                    yield os.path.join(month_dir, bucket_dir)
+    
+    def _part_names(self, directory: str) -> List[str]:
+        """Visible parts of a partition in append order"""
+        return sorted(
+            filename[:-len('.npy')] for filename in os.listdir(directory)
+            if filename.endswith('.npy') and not filename.endswith(('.users.npy', '.ids.npy', '.titles.npy'))
+        )
+    
+    def _load_part(self, table: str, directory: str, name: str) -> Tuple[np.ndarray, object]:
+        base = os.path.join(directory, name)
+        codes = np.load(base + '.users.npy', mmap_mode=self.mmap_mode)
+        records = np.load(base + '.npy', mmap_mode=self.mmap_mode)
+        if table == 'tasks':
+            records = TaskRecords(
+                records, np.load(base + '.ids.npy', mmap_mode=self.mmap_mode),
+                np.load(base + '.titles.npy', mmap_mode=self.mmap_mode)
+            )
+        return codes, records
+    
+    def scan(self, table: str, start: Optional[str] = None,
+             end: Optional[str] = None) -> Iterator[Tuple[np.ndarray, object]]:
+        """
+        (user codes, records) for every part in partition and append order, memory-mapped
+        without copying; task parts come as TaskRecords carrying their ids and titles
+        """
+        for directory in self._partition_dirs(table, start, end):
+            for name in self._part_names(directory):
+                yield self._load_part(table, directory, name)
+    
+    def task_records(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[TaskRecords]:
+        """Stored tasks part by part, e.g. for ProcrastinationDetector.train_large"""
+        for _, records in self.scan('tasks', start, end):
+            yield records
+    
+    def user_slices(self, table: str, user_ids: Optional[List[str]] = None,
+                    start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, List]:
+        """
+        Each user's rows (all stored users by default) as memory-mapped slices, one per
+        part holding any, in month and append order. Only the users' own partitions are
+        opened and nothing is copied; empty for unknown users.
+        """
+        user_ids = list(self.user_ids) if user_ids is None else list(user_ids)
+        codes = self._codes(user_ids)
+        slices = {user_id: [] for user_id in user_ids}
+        known = codes >= 0
+        if not known.any():
+            return slices
+        
+        buckets = np.unique(codes[known] // self.users_per_partition)
+        for directory in self._partition_dirs(table, start, end, buckets):
+            for name in self._part_names(directory):
+                part_codes, records = self._load_part(table, directory, name)
+                # Parts are sorted by user code, so each user's rows are one range
+                begins = np.searchsorted(part_codes, codes, side='left')
+                ends = np.searchsorted(part_codes, codes, side='right')
+                for user_id, known_user, begin, finish in zip(user_ids, known, begins, ends):
+                    if known_user and finish > begin:
+                        slices[user_id].append(records[begin:finish])
+        return slices
+    
+    def read_users(self, table: str, user_ids: Optional[List[str]] = None,
+                   start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, object]:
+        """
+        Each user's rows (all stored users by default) in the table's record form,
+        ordered by month partition and then append order; empty for unknown users.
+        Rows held in a single part (e.g. one compacted month) come back as a
+        memory-mapped view; rows spread over several parts are joined, copying only
+        that user's rows.
+        """
+        concatenate = TaskRecords.concatenate if table == 'tasks' else np.concatenate
+        dtype, _ = self.tables[table]
+        empty = concatenate([]) if table == 'tasks' else np.zeros(0, dtype=dtype)
+        return {
+            user_id: parts[0] if len(parts) == 1 else concatenate(parts) if parts else empty
+            for user_id, parts in self.user_slices(table, user_ids, start, end).items()
+        }
+    
+    def compact(self, table: Optional[str] = None) -> Dict[str, int]:
+        """
+        Merge each partition's parts into one sorted by user, dropping superseded rows
+        (same task id, or same history date, appended again). Readers scanning
+        during compaction may briefly see a partition's rows twice. Returns rows removed.
+        """
+        removed = {}
+        for name in [table] if table else list(self.tables):
+            removed[name] = 0
+            for directory in self._partition_dirs(name):
+                part_names = self._part_names(directory)
+                if len(part_names) < 2:
+                    continue
+                
+                parts = [
+                    (np.load(os.path.join(directory, part + '.users.npy')),
+                     np.load(os.path.join(directory, part + '.npy')),
+                     np.load(os.path.join(directory, part + '.ids.npy')) if name == 'tasks' else None,
+                     np.load(os.path.join(directory, part + '.titles.npy')) if name == 'tasks' else None)
+                    for part in part_names
+                ]
+                codes = np.concatenate([part[0] for part in parts])
+                records = np.concatenate([part[1] for part in parts])
+                ids = np.concatenate([part[2] for part in parts]) if name == 'tasks' else None
+                titles = np.concatenate([part[3] for part in parts]) if name == 'tasks' else None
+                
+                # Latest occurrence of each (user, task id) or (user, date); time logs have no key
+                if name == 'time_logs':
+                    keep = np.arange(len(codes))
+                else:
+                    key = ids if name == 'tasks' else records['date'].astype(np.int64)
+                    order = np.lexsort((-np.arange(len(codes)), key, codes))
+                    firsts = np.ones(len(order), dtype=bool)
+                    firsts[1:] = (codes[order][1:] != codes[order][:-1]) | (key[order][1:] != key[order][:-1])
+                    keep = order[firsts]
+                    if name == 'tasks':
+                        # Tasks without an id cannot supersede each other
+                        keep = np.union1d(keep, np.flatnonzero(ids == ''))
+                keep = keep[np.lexsort((keep, codes[keep]))]
+                
+                merged = f"part-{time.time_ns():020d}-{os.getpid()}"
+                self._save_part(directory, merged, codes[keep], records[keep],
+                                None if ids is None else {'ids': ids[keep], 'titles': titles[keep]})
+                for part in part_names:
+                    self._remove_part(directory, part)
+                removed[name] += len(codes) - len(keep)
         
-        # Predict next 7 days
-        predictions = []
-        for i in range(1, 8):
-            future_date = last_date + timedelta(days=i)
-            days_since_start = (future_date - datetime.fromisoformat(historical_data[0]['date'])).days
+        return removed
+
+class InsightsCache:
+    """
+    Bounded LRU cache of per-component insight results with TTL expiry.
+    Keys fingerprint only the part of user_data a component reads, so a component
+    is recomputed only when its own inputs change. Cached values are shared
+    between callers and must be treated as read-only.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.counters = {'hits': 0, 'misses': 0, 'expirations': 0, 'evictions': 0}
+        self.component_counters = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def fingerprint(value) -> str:
+        """Stable digest of a JSON-like component input, TaskRecords or record array"""
+        digest = hashlib.blake2b(digest_size=16)
+        if isinstance(value, TrendStatistics):
+            value = vars(value)
+        elif isinstance(value, TaskRecords):
+            digest.update(value.data.tobytes())
+            value = [
+                None if column is None else column.tolist()
+                for column in (value.ids, value.titles, value.segments)
+            ]
+        elif isinstance(value, np.ndarray):
+            digest.update(str(value.dtype).encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+            value = None
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+    
+    def get(self, key: Tuple) -> Optional[Tuple[object, datetime]]:
+        """(value, computed_at) for a live entry, or None on a miss"""
+        with self._lock:
+            component_counters = self.component_counters.setdefault(key[0], {'hits': 0, 'misses': 0})
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+                del self._entries[key]
+                self.counters['expirations'] += 1
+                entry = None
             
-            predicted_score = self.model.predict([[days_since_start]])[0]
-            predicted_score = max(0, min(100, predicted_score))  # Clamp between 0-100
+            if entry is None:
+                self.counters['misses'] += 1
+                component_counters['misses'] += 1
+                return None
             
-            predictions.append({
-                'date': future_date.isoformat(),
-                'predicted_score': round(predicted_score, 1),
-                'confidence': 'medium' if len(historical_data) >= 30 else 'low'
-            })
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            component_counters['hits'] += 1
+            return entry[0], entry[1]
+    
+    def put(self, key: Tuple, value, computed_at: datetime):
+        """Store a result, evicting least recently used entries beyond max_entries"""
+        with self._lock:
+            self._entries[key] = (value, computed_at, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        """Hit/miss/eviction counters overall and per component"""
+        with self._lock:
+            return {
+                **self.counters,
+                'entries': len(self._entries),
+                'components': {name: dict(counts) for name, counts in self.component_counters.items()}
+            }
+
+class StageMetrics:
+    """
+    Thread-safe per-stage counters and latency histograms for FocusFlowAI.
+    Any object with the same record() method can be passed to the engine instead,
+    e.g. an adapter that forwards to an existing metrics client.
+    """
+    
+    default_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    
+    def __init__(self, buckets: Tuple[float, ...] = default_buckets):
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
+    
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+    
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    def record(self, stage: str, seconds: float, items: int = 1, error: bool = False):
+        """Record one stage execution: wall time, input size and whether it raised"""
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = {
+                    'calls': 0, 'errors': 0, 'items': 0, 'seconds': 0.0,
+                    'bucket_counts': [0] * (len(self.buckets) + 1)
+                }
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['items'] += items
+            stats['seconds'] += seconds
+            stats['bucket_counts'][int(np.searchsorted(self.buckets, seconds))] += 1
+    
+    def export(self) -> Dict:
+        """Counters and cumulative latency histograms per stage"""
+        with self._lock:
+            exported = {}
+            for stage, stats in self._stages.items():
+                cumulative = np.cumsum(stats['bucket_counts']).tolist()
+                exported[stage] = {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'items': stats['items'],
+                    'seconds_total': stats['seconds'],
+                    'histogram': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], cumulative))
+                }
+            return exported
+    
+    def to_prometheus(self, prefix: str = 'focusflow_ai_stage') -> str:
+        """Export in the Prometheus text exposition format"""
+        exported = self.export()
+        lines = []
+        for family, key in (('calls', 'calls'), ('errors', 'errors'), ('items', 'items')):
+            lines.append(f"# TYPE {prefix}_{family}_total counter")
+            for stage, stats in exported.items():
+                lines.append(f'{prefix}_{family}_total{{stage="{stage}"}} {stats[key]}')
         
-        return predictions
+        lines.append(f"# TYPE {prefix}_seconds histogram")
+        for stage, stats in exported.items():
+            for bound, count in stats['histogram'].items():
+                lines.append(f'{prefix}_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{prefix}_seconds_sum{{stage="{stage}"}} {stats["seconds_total"]}')
+            lines.append(f'{prefix}_seconds_count{{stage="{stage}"}} {stats["calls"]}')
+        return "\n".join(lines) + "\n"
+    
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+class _StageTimer:
+    """Times one stage and reports it to the metrics object and/or a timings dict"""
+    
+    def __init__(self, metrics, timings: Optional[Dict[str, float]], stage: str, items: int):
+        self.metrics = metrics
+        self.timings = timings
+        self.stage = stage
+        self.items = items
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        if self.metrics is not None:
+            self.metrics.record(self.stage, elapsed, self.items, exc_type is not None)
+        if self.timings is not None:
+            self.timings[self.stage] = round(self.timings.get(self.stage, 0) + elapsed * 1000, 3)
+        return False
+
+# Shared no-op context used when instrumentation is disabled
+_NO_STAGE = nullcontext()
 
 class FocusFlowAI:
-    """Main AI engine that coordinates all ML models"""
+    """
+    Main AI engine that coordinates all ML models.
+    Insight generation only reads trained components and keeps per-request state
+    local, so one engine can be shared across threads. To retrain while serving,
+    train a new component and assign it (e.g. engine.procrastination_detector = detector).
+    """
     
-    def __init__(self):
+    # Trained components saved to and warm-started from a ModelRegistry
+    persisted_components = ('procrastination_detector', 'optimal_time_analyzer')
+    
+    # Stage -> insight key that generate_insights_batch can reuse from earlier insights;
+    # the cheap productivity score, burnout risk and recommendations are always recomputed
+    reusable_insights = {
+        'procrastination': 'procrastination_patterns',
+        'optimal_time': 'optimal_working_hours',
+        'trend': 'weekly_predictions'
+    }
+    
+    def __init__(self, registry: Optional[ModelRegistry] = None,
+                 cache: Optional[InsightsCache] = None,
+                 metrics: Optional[StageMetrics] = None,
+                 attach_timings: bool = False,
+                 feature_store: Optional[FeatureStore] = None,
+                 store_lookback_months: Optional[int] = None):
         self.productivity_scorer = ProductivityScorer()
         self.procrastination_detector = ProcrastinationDetector()
         self.optimal_time_analyzer = OptimalTimeAnalyzer()
         self.burnout_detector = BurnoutDetector()
         self.trend_predictor = TrendPredictor()
+        
+        self.registry = registry
+        self.cache = cache
+        # Stage instrumentation; attach_timings adds 'stage_timings_ms' to each result
+        self.metrics = metrics
+        self.attach_timings = attach_timings
+        # Users given by user_id alone read their records from feature_store; tasks and
+        # time logs only from the last store_lookback_months months (all when None)
+        self.feature_store = feature_store
+        self.store_lookback_months = store_lookback_months
+        self._models_loaded = registry is None
+        self._load_lock = threading.Lock()
     
-    def generate_comprehensive_insights(self, user_data: Dict) -> Dict:
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        del state['_load_lock']
+        return state
+    
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._load_lock = threading.Lock()
+    
+    def _require_feature_store(self) -> FeatureStore:
+        if self.feature_store is None:
+            raise ValueError("No feature store configured")
+        return self.feature_store
+    
+    def ingest(self, users: Dict[str, Dict]) -> Dict[str, int]:
+        """Append users' new tasks, time logs and daily history to the feature store"""
+        return self._require_feature_store().append_user_data(users)
+    
+    def train_from_store(self, start: Optional[str] = None, end: Optional[str] = None,
+                         **train_options) -> Dict:
         """
-        Generate comprehensive AI insights for a user
+        Retrain the procrastination detector on stored tasks (months start..end,
+        'YYYY-MM') with train_large, reading parsed columns part by part
         """
-        insights = {
-            'productivity_score': 0,
-            'procrastination_patterns': [],
-            'optimal_working_hours': [],
-            'burnout_risk': {'risk_level': 'low', 'risk_score': 0},
-            'weekly_predictions': [],
-            'recommendations': [],
-            'generated_at': datetime.now().isoformat()
-        }
-        
-        try:
-            # Calculate productivity score
-            insights['productivity_score'] = self.productivity_scorer.calculate_daily_score(user_data)
-            
-            # Detect procrastination patterns
-            if user_data.get('recent_tasks'):
-                insights['procrastination_patterns'] = self.procrastination_detector.detect_procrastination(
-                    user_data['recent_tasks']
-                )
+        return self.procrastination_detector.train_large(
+            self._require_feature_store().task_records(start, end), **train_options
+        )
+    
+    def backfill_trends(self, user_ids: Optional[List[str]] = None) -> Dict[str, Optional[TrendStatistics]]:
+        """
+        TrendStatistics for users (all stored users by default) from their stored daily
+        history, ready to pass as user_data['trend_statistics'] and extend with add()
+        """
+        histories = self._require_feature_store().read_users('history', user_ids)
+        statistics = self.trend_predictor.build_statistics_batch(list(histories.values()))
+        return dict(zip(histories, statistics))
+    
+    def _with_stored_features(self, users: List[Dict]) -> List[Dict]:
+        """
+        Users whose recent_tasks, time_logs or historical_data are absent get them from
+        the feature store by user_id, as memory-mapped records; others are returned as given
+        """
+        if self.feature_store is None:
+            return users
+        
+        start = None
+        if self.store_lookback_months is not None:
+            this_month = np.datetime64(datetime.now(timezone.utc).date(), 'M')
+            start = str(this_month - (self.store_lookback_months - 1))
+        
+        stored = {}
+        for field, table in FeatureStore.user_data_tables.items():
+            user_ids = [user['user_id'] for user in users if 'user_id' in user and field not in user]
+            if user_ids:
+                # Trends fit the whole daily history, so the lookback applies to tasks and logs
+                stored[field] = self.feature_store.read_users(
+                    table, user_ids, None if table == 'history' else start
+                )
+        if not stored:
+            return users
+        
+        filled = []
+        for user in users:
+            fields = {
+                field: rows[user['user_id']] for field, rows in stored.items()
+                if 'user_id' in user and field not in user
+            }
+            filled.append({**user, **fields} if fields else user)
+        return filled
+    
+    def save_models(self, registry: Optional[ModelRegistry] = None,
+                    keep_last: Optional[int] = None) -> Dict[str, int]:
+        """Save every trained component as a new registry version"""
+        registry = registry or self.registry
+        if registry is None:
+            raise ValueError("No model registry configured")
+        
+        saved_versions = {}
+        for name in self.persisted_components:
+            component = getattr(self, name)
+            if getattr(component, 'is_trained', True):
+                saved_versions[name] = registry.save(name, component, keep_last=keep_last)
+        
+        return saved_versions
+    
+    def load_models(self, versions: Optional[Dict[str, int]] = None):
+        """Replace components with saved versions (latest unless pinned in versions)"""
+        if self.registry is None:
+            raise ValueError("No model registry configured")
+        
+        versions = versions or {}
+        for name in self.persisted_components:
+            component = self.registry.load(name, versions.get(name))
+            if component is not None:
+                setattr(self, name, component)
+        
+        self._models_loaded = True
+    
+    def _ensure_models_loaded(self):
+        """Lazily warm-start from the registry on first use"""
+        if self._models_loaded:
+            return
+        
+        with self._load_lock:
+            if self._models_loaded:
+                return
+            try:
+                self.load_models()
+            except Exception as e:
+                logger.error(f"Error loading models from registry: {e}")
+                self._models_loaded = True
+    
+    def generate_comprehensive_insights(self, user_data: Dict) -> Dict:
+        """
+        Generate comprehensive AI insights for a user
+        """
+        self._ensure_models_loaded()
+        [user_data] = self._with_stored_features([user_data])
+        
+        timings = {} if self.attach_timings else None
+        # Completion times of the results used; older when reused from the cache
+        computed_at = [datetime.now()]
+        insights = {
+            'productivity_score': 0,
+            'procrastination_patterns': [],
+            'optimal_working_hours': [],
+            'burnout_risk': {'risk_level': 'low', 'risk_score': 0},
+            'weekly_predictions': [],
+            'recommendations': [],
+            'generated_at': computed_at[0].isoformat()
+        }
+        
+        try:
+            # Calculate productivity score
+            with self._stage('productivity_score', 1, timings):
+                insights['productivity_score'] = self.productivity_scorer.calculate_daily_score(user_data)
+            
+            # Detect procrastination patterns
+            recent_tasks = _rows(user_data.get('recent_tasks'))
+            if len(recent_tasks):
+                with self._stage('procrastination', len(recent_tasks), timings):
+                    insights['procrastination_patterns'] = self._cached(
+                        'procrastination', recent_tasks,
+                        self.procrastination_detector.detect_procrastination, computed_at, timings
+                    )
             
             # Analyze optimal working hours
-            if user_data.get('time_logs'):
-                time_analysis = self.optimal_time_analyzer.analyze_productivity_patterns(
-                    user_data['time_logs']
-                )
-                insights['optimal_working_hours'] = time_analysis['optimal_hours']
+            time_logs = _rows(user_data.get('time_logs'))
+            if len(time_logs):
+                with self._stage('optimal_time', len(time_logs), timings):
+                    insights['optimal_working_hours'] = self._cached(
+                        'optimal_time', time_logs,
+                        lambda time_logs: self.optimal_time_analyzer.analyze_productivity_patterns(
+                            time_logs
+                        )['optimal_hours'],
+                        computed_at, timings
+                    )
             
             # Assess burnout risk
-            insights['burnout_risk'] = self.burnout_detector.assess_burnout_risk(user_data)
+            with self._stage('burnout', 1, timings):
+                insights['burnout_risk'] = self.burnout_detector.assess_burnout_risk(user_data)
             
-            # Generate weekly predictions
-            if user_data.get('historical_data'):
-                self.trend_predictor.train(user_data['historical_data'])
-                insights['weekly_predictions'] = self.trend_predictor.predict_next_week(
-                    user_data['historical_data']
-                )
+            # Generate weekly predictions, reusing incrementally maintained statistics if given
+            trend_input = self._trend_input(user_data)
+            if _trend_size(trend_input):
+                with self._stage('trend', _trend_size(trend_input), timings):
+                    insights['weekly_predictions'] = self._cached(
+                        'trend', trend_input, lambda value: self._forecast_trends([value])[0],
+                        computed_at, timings
+                    )
             
             # Generate personalized recommendations
-            insights['recommendations'] = self._generate_recommendations(insights)
+            with self._stage('recommendations', 1, timings):
+                insights['recommendations'] = self._generate_recommendations(insights)
+            insights['generated_at'] = min(computed_at).isoformat()
             
         except Exception as e:
             logger.error(f"Error generating AI insights: {e}")
             insights['error'] = "Failed to generate complete insights"
         
+        if timings is not None:
+            insights['stage_timings_ms'] = timings
+        
         return insights
     
+    def _stage(self, stage: str, items: int = 1, timings: Optional[Dict[str, float]] = None):
+        """Context manager timing one stage; a shared no-op when instrumentation is off"""
+        if self.metrics is None and timings is None:
+            return _NO_STAGE
+        return _StageTimer(self.metrics, timings, stage, items)
+    
+    def _trend_input(self, user_data: Dict):
+        """Incrementally maintained TrendStatistics if given, otherwise the raw history"""
+        trend_statistics = user_data.get('trend_statistics')
+        if trend_statistics is not None:
+            return trend_statistics
+        return _rows(user_data.get('historical_data'))
+    
+    def _forecast_trends(self, trend_inputs: List) -> List[List[Dict]]:
+        """Weekly forecasts for a mix of TrendStatistics and raw histories"""
+        built_statistics = self.trend_predictor.build_statistics_batch([
+            [] if isinstance(value, TrendStatistics) else value for value in trend_inputs
+        ])
+        return self.trend_predictor.forecast_batch([
+            value if isinstance(value, TrendStatistics) else built
+            for value, built in zip(trend_inputs, built_statistics)
+        ])
+    
+    def _cache_key(self, component: str, value) -> Tuple:
+        # Detection results depend on the trained model as well as the tasks
+        if component == 'procrastination':
+            detector = self.procrastination_detector
+            model_key = (detector.generation, detector.backend, detector.is_trained)
+        else:
+            model_key = None
+        return component, model_key, self.cache.fingerprint(value)
+    
+    def _cached(self, component: str, value, compute, computed_at: List[datetime],
+                timings: Optional[Dict[str, float]] = None):
+        """Single-input form of _cached_batch"""
+        [result], [cached_at] = self._cached_batch(
+            component, [value], lambda values: [compute(values[0])], timings
+        )
+        if cached_at is not None:
+            computed_at.append(cached_at)
+        return result
+    
+    def _cached_batch(self, component: str, values: List, compute_batch,
+                      timings: Optional[Dict[str, float]] = None) -> Tuple[List, List[Optional[datetime]]]:
+        """
+        Component results for each input, computing only cache misses in one
+        compute_batch call (timed as the '<component>.model' stage). Also returns
+        when each cached result was computed (None for results computed now).
+        """
+        if self.cache is None:
+            with self._stage(f"{component}.model", len(values), timings):
+                return compute_batch(values), [None] * len(values)
+        
+        keys = [self._cache_key(component, value) for value in values]
+        results = [None] * len(values)
+        cached_at = [None] * len(values)
+        misses = []
+        for i, key in enumerate(keys):
+            entry = self.cache.get(key)
+            if entry is None:
+                misses.append(i)
+            else:
+                results[i], cached_at[i] = entry
+        
+        if misses:
+            now = datetime.now()
+            with self._stage(f"{component}.model", len(misses), timings):
+                computed = compute_batch([values[i] for i in misses])
+            for i, result in zip(misses, computed):
+                results[i] = result
+                self.cache.put(keys[i], result, now)
+        
+        return results, cached_at
+    
+    def _refreshed_batch(self, component: str, values: List, compute_batch,
+                         timings: Optional[Dict[str, float]],
+                         previous: Optional[List[Optional[Dict]]],
+                         stale: Optional[List[set]]) -> Tuple[List, List[Optional[datetime]]]:
+        """
+        _cached_batch over the users whose insight for this component is stale;
+        the others reuse it from their previous insights, dated by its generated_at.
+        """
+        if previous is None:
+            return self._cached_batch(component, values, compute_batch, timings)
+        
+        key = self.reusable_insights[component]
+        results = [None] * len(values)
+        computed_at = [None] * len(values)
+        todo = []
+        for i, earlier in enumerate(previous):
+            if earlier is None or key not in earlier or key in stale[i]:
+                todo.append(i)
+            else:
+                results[i] = earlier[key]
+                computed_at[i] = datetime.fromisoformat(earlier['generated_at'])
+        
+        if todo:
+            computed, cached_at = self._cached_batch(
+                component, [values[i] for i in todo], compute_batch, timings
+            )
+            for i, result, at in zip(todo, computed, cached_at):
+                results[i], computed_at[i] = result, at
+        
+        return results, computed_at
+    
+    def generate_insights_batch(self, users: List[Dict], chunk_size: int = 1000,
+                                previous: Optional[List[Optional[Dict]]] = None,
+                                stale: Optional[List[set]] = None) -> List[Dict]:
+        """
+        Generate comprehensive AI insights for many users at once.
+        Each chunk of users is scored, detected and predicted in vectorized passes and
+        split back out per user, matching generate_comprehensive_insights. A chunk the
+        vectorized path cannot handle falls back to the single-user path. With a
+        feature store, each chunk's users given by user_id alone are read from it.
+        
+        previous optionally holds each user's earlier insights (None for none) and
+        stale the insight keys whose inputs changed since; the other reusable_insights
+        are copied from previous instead of recomputed.
+        """
+        self._ensure_models_loaded()
+        if previous is not None and stale is None:
+            stale = [set(self.reusable_insights.values())] * len(users)
+        
+        results = []
+        for start in range(0, len(users), chunk_size):
+            chunk = self._with_stored_features(users[start:start + chunk_size])
+            try:
+                if previous is None:
+                    results.extend(self._generate_insights_chunk(chunk))
+                else:
+                    results.extend(self._generate_insights_chunk(
+                        chunk, previous[start:start + chunk_size], stale[start:start + chunk_size]
+                    ))
+            except Exception as e:
+                logger.warning(f"Batch insights fell back to per-user path: {e}")
+                results.extend(self.generate_comprehensive_insights(user) for user in chunk)
+        
+        return results
+    
+    def _generate_insights_chunk(self, users: List[Dict],
+                                 previous: Optional[List[Optional[Dict]]] = None,
+                                 stale: Optional[List[set]] = None) -> List[Dict]:
+        """Vectorized insights for one chunk of users"""
+        generated_at = datetime.now()
+        timings = {} if self.attach_timings else None
+        
+        with self._stage('productivity_score', len(users), timings):
+            columns = {
+                field: np.fromiter(
+                    (user.get(field, default) for user in users), dtype=float, count=len(users)
+                )
+                for field, default in self.productivity_scorer.field_defaults.items()
+            }
+            scores = self.productivity_scorer.calculate_scores(columns, clip=False)
+        
+        task_lists = [_rows(user.get('recent_tasks')) for user in users]
+        with self._stage('procrastination', sum(map(len, task_lists)), timings):
+            patterns, patterns_at = self._refreshed_batch(
+                'procrastination', task_lists,
+                self.procrastination_detector.detect_procrastination_batch, timings, previous, stale
+            )
+        
+        log_lists = [_rows(user.get('time_logs')) for user in users]
+        with self._stage('optimal_time', sum(map(len, log_lists)), timings):
+            optimal_hours, optimal_hours_at = self._refreshed_batch(
+                'optimal_time', log_lists, self.optimal_time_analyzer.optimal_hours_batch, timings,
+                previous, stale
+            )
+        
+        with self._stage('burnout', len(users), timings):
+            burnout_risks = [self.burnout_detector.assess_burnout_risk(user) for user in users]
+        
+        trend_inputs = [self._trend_input(user) for user in users]
+        with self._stage('trend', sum(map(_trend_size, trend_inputs)), timings):
+            predictions, predictions_at = self._refreshed_batch(
+                'trend', trend_inputs, self._forecast_trends, timings, previous, stale
+            )
+        
+        results = []
+        with self._stage('recommendations', len(users), timings):
+            for i in range(len(users)):
+                cached_at = [at for at in (patterns_at[i], optimal_hours_at[i], predictions_at[i]) if at]
+                insights = {
+                    'productivity_score': self.productivity_scorer.as_daily_score(scores[i]),
+                    'procrastination_patterns': patterns[i],
+                    'optimal_working_hours': optimal_hours[i],
+                    'burnout_risk': burnout_risks[i],
+                    'weekly_predictions': predictions[i],
+                    'recommendations': [],
+                    'generated_at': min([generated_at] + cached_at).isoformat()
+                }
+                insights['recommendations'] = self._generate_recommendations(insights)
+                results.append(insights)
+        
+        # Batched stages are shared by the chunk, so each user gets the chunk's breakdown
+        if timings is not None:
+            for insights in results:
+                insights['stage_timings_ms'] = dict(timings)
+        
+        # Non-numeric score fields (None, strings) read as defaults or numbers above but
+        # fail the single-user path, so those users get its partial result instead
+        for i, user in enumerate(users):
+            if not all(
+                isinstance(user.get(field, default), numbers.Real)
+                for field, default in self.productivity_scorer.field_defaults.items()
+            ):
+                results[i] = self.generate_comprehensive_insights(user)
+        
+        return results
+    
     def _generate_recommendations(self, insights: Dict) -> List[str]:
         """Generate personalized recommendations based on insights"""
         recommendations = []
@@ -502,6 +2870,1554 @@ class FocusFlowAI:
         
         return recommendations[:5]  # Limit to top 5 recommendations
 
+def _trend_size(trend_input) -> int:
+    """Days behind a trend input, whether raw history or TrendStatistics"""
+    if isinstance(trend_input, TrendStatistics):
+        return trend_input.count
+    return len(trend_input)
+
+# Engine used by process pool workers, set once per worker by _init_insights_worker
+_worker_engine = None
+
+def _init_insights_worker(engine: FocusFlowAI):
+    global _worker_engine
+    _worker_engine = engine
+
+def _run_insights(user_data: Dict) -> Dict:
+    return _worker_engine.generate_comprehensive_insights(user_data)
+
+def _run_insights_batch(users: List[Dict]) -> List[Dict]:
+    return _worker_engine.generate_insights_batch(users)
+
+class InsightsRunner:
+    """
+    Fans insight requests out over a thread or process pool with bounded concurrency.
+    Threads share one engine; processes each get a copy of it at start-up (shared
+    copy-on-write under fork, or via memory-mapped registry models). Submitting blocks
+    once max_pending requests are in flight, which gives producers backpressure.
+    """
+    
+    def __init__(self, engine: FocusFlowAI, max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, use_processes: bool = False):
+        self.engine = engine
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self.use_processes = use_processes
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        
+        if use_processes:
+            self._executor = ProcessPoolExecutor(
+                self.max_workers, initializer=_init_insights_worker, initargs=(engine,)
+            )
+        else:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='insights')
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self, wait: bool = True):
+        """Shut the pool down, by default after in-flight requests finish"""
+        self._executor.shutdown(wait=wait)
+    
+    def _submit(self, fn, *args) -> Future:
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+    
+    def submit(self, user_data: Dict) -> Future:
+        """Schedule insights for one user; blocks while the pool is saturated"""
+        if self.use_processes:
+            return self._submit(_run_insights, user_data)
+        return self._submit(self.engine.generate_comprehensive_insights, user_data)
+    
+    def submit_batch(self, users: List[Dict]) -> Future:
+        """Schedule batched insights for a list of users; blocks while the pool is saturated"""
+        if self.use_processes:
+            return self._submit(_run_insights_batch, users)
+        return self._submit(self.engine.generate_insights_batch, users)
+    
+    def map(self, users: Iterable[Dict], batch_size: int = 100) -> Iterator[Dict]:
+        """
+        Insights for every user in input order.
+        Users are pulled from the iterable lazily and sent in batches, so at most
+        max_pending batches are buffered regardless of how many users there are.
+        """
+        pending = deque()
+        batch = []
+        for user_data in users:
+            batch.append(user_data)
+            if len(batch) < batch_size:
+                continue
+            while len(pending) >= self.max_pending:
+                yield from pending.popleft().result()
+            pending.append(self.submit_batch(batch))
+            batch = []
+        
+        if batch:
+            pending.append(self.submit_batch(batch))
+        while pending:
+            yield from pending.popleft().result()
+
+class InsightsService:
+    """
+    Asyncio HTTP service backing the /api/ai routes (TCP or Unix socket).
+    Requests arriving within batch_window_ms of each other are micro-batched into
+    one generate_insights_batch call on the runner's pool, keeping the event loop free.
+    
+    POST /insights, /patterns, /recommendations with a user_data JSON body;
+    GET /metrics returns request latency percentiles.
+    """
+    
+    routes = {
+        '/insights': None,
+        '/patterns': 'procrastination_patterns',
+        '/recommendations': 'recommendations'
+    }
+    
+    def __init__(self, runner: InsightsRunner, batch_window_ms: float = 5.0,
+                 max_batch_size: int = 64, max_queue: int = 1024):
+        self.runner = runner
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_queue = max_queue
+        self.latencies = deque(maxlen=10000)
+        self.batch_sizes = deque(maxlen=10000)
+        self._queue = None
+        self._batch_slots = None
+        self._batcher = None
+        self._server = None
+    
+    async def start(self, host: str = '127.0.0.1', port: int = 8001,
+                    unix_path: Optional[str] = None):
+        """Start the batcher and listen on a TCP port, or a Unix socket if unix_path is set"""
+        import asyncio
+        
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        # Never hand the runner more batches than it accepts without blocking
+        self._batch_slots = asyncio.Semaphore(self.runner.max_pending)
+        self._batcher = asyncio.create_task(self._batch_loop())
+        
+        if unix_path:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=unix_path)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info(f"Insights service listening on {unix_path or f'{host}:{port}'}")
+    
+    async def stop(self):
+        """Stop accepting connections and cancel the batcher"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher:
+            self._batcher.cancel()
+    
+    async def serve(self, host: str = '127.0.0.1', port: int = 8001,
+                    unix_path: Optional[str] = None):
+        """Run the service until cancelled"""
+        await self.start(host, port, unix_path)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+    
+    async def get_insights(self, user_data: Dict) -> Dict:
+        """Insights for one user, batched with other requests arriving at the same time"""
+        import asyncio
+        
+        future = asyncio.get_running_loop().create_future()
+        started = time.perf_counter()
+        self._queue.put_nowait((user_data, future))
+        try:
+            return await future
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+    
+    def latency_summary(self) -> Dict:
+        """Request count, p50/p99 latency and mean batch size over recent requests"""
+        if not self.latencies:
+            return {'requests': 0}
+        
+        latencies_ms = np.array(self.latencies) * 1000
+        return {
+            'requests': len(latencies_ms),
+            'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+            'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+            'mean_batch_size': round(float(np.mean(self.batch_sizes)), 2) if self.batch_sizes else 0
+        }
+    
+    async def _batch_loop(self):
+        """Collect requests for up to batch_window and dispatch them as one batch"""
+        import asyncio
+        
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            await self._batch_slots.acquire()
+            self.batch_sizes.append(len(batch))
+            try:
+                future = asyncio.wrap_future(self.runner.submit_batch([user for user, _ in batch]))
+            except Exception as e:
+                self._batch_slots.release()
+                for _, waiter in batch:
+                    waiter.set_exception(e)
+                continue
+            future.add_done_callback(lambda done, batch=batch: self._resolve_batch(batch, done))
+    
+    def _resolve_batch(self, batch: List[Tuple[Dict, 'asyncio.Future']], done: 'asyncio.Future'):
+        self._batch_slots.release()
+        if done.exception() is not None:
+            for _, waiter in batch:
+                if not waiter.done():
+                    waiter.set_exception(done.exception())
+            return
+        
+        for (_, waiter), insights in zip(batch, done.result()):
+            if not waiter.done():
+                waiter.set_result(insights)
+    
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, object]:
+        import asyncio
+        
+        if method == 'GET' and path == '/metrics':
+            return 200, self.latency_summary()
+        if path not in self.routes:
+            return 404, {'error': 'Not found'}
+        if method != 'POST':
+            return 405, {'error': 'Method not allowed'}
+        
+        try:
+            user_data = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': 'Invalid JSON body'}
+        
+        try:
+            insights = await self.get_insights(user_data)
+        except asyncio.QueueFull:
+            return 503, {'error': 'Insights service overloaded'}
+        except Exception as e:
+            logger.error(f"Error serving AI insights: {e}")
+            return 500, {'error': 'Failed to generate insights'}
+        
+        field = self.routes[path]
+        return 200, insights if field is None else {field: insights.get(field, [])}
+    
+    async def _handle_connection(self, reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter'):
+        """Minimal HTTP/1.1 handling with keep-alive"""
+        import asyncio
+        
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                
+                started = time.perf_counter()
+                status, payload = await self._dispatch(method, path.split('?', 1)[0], body)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                
+                content = json.dumps(payload, default=_json_default).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {_HTTP_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(content)}\r\n"
+                    f"X-Response-Time-Ms: {elapsed_ms:.3f}\r\n\r\n".encode('latin-1') + content
+                )
+                await writer.drain()
+                
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+_HTTP_REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    500: 'Internal Server Error', 503: 'Service Unavailable'
+}
+
+def _json_default(value):
+    """Serialize NumPy scalars left in insights and driver timestamps in stream positions"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class ConnectionPool:
+    """
+    Small thread-safe pool of DB-API connections (psycopg2, sqlite3, ...).
+    Connections are created on demand by connect(), at most max_size at a time;
+    a connection whose work raised is rolled back before it is reused.
+    """
+    
+    def __init__(self, connect, max_size: int = 4):
+        self._connect = connect
+        self.max_size = max_size
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = self._connect()
+            
+            try:
+                yield connection
+            except Exception:
+                try:
+                    connection.rollback()
+                except Exception:
+                    connection.close()
+                    raise
+                with self._lock:
+                    self._idle.append(connection)
+                raise
+            with self._lock:
+                self._idle.append(connection)
+        finally:
+            self._slots.release()
+    
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+def _placeholder(connection) -> str:
+    """Parameter marker of the connection's DB-API driver ('?' for sqlite3, '%s' for psycopg2)"""
+    driver = sys.modules.get(type(connection).__module__.split('.')[0])
+    paramstyle = getattr(driver, 'paramstyle', 'qmark')
+    if paramstyle == 'qmark':
+        return '?'
+    if paramstyle in ('format', 'pyformat'):
+        return '%s'
+    raise ValueError(f"Unsupported DB-API paramstyle: {paramstyle}")
+
+def _iso(value):
+    """ISO-8601 string for datetimes and dates returned by the driver; strings pass through"""
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+def _timestamp_key(value) -> datetime:
+    """Comparable datetime of a driver timestamp (datetime, or ISO text with 'T' or space)"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+def _shift_timestamp(value, delta: timedelta):
+    """
+    Driver timestamp moved by delta, kept in the driver's representation so it binds
+    and compares like the column: datetimes stay datetimes and text keeps its layout
+    ('YYYY-MM-DD HH:MM:SS' must not be compared as text with 'YYYY-MM-DDTHH:MM:SS').
+    """
+    if isinstance(value, datetime):
+        return value + delta
+    shifted = datetime.fromisoformat(value) + delta
+    return shifted.isoformat(sep=value[10] if len(value) > 10 else 'T')
+
+def _day(value) -> Optional[str]:
+    """'YYYY-MM-DD' of a timestamp or date (ISO string or driver object)"""
+    return None if value is None else _iso(value)[:10]
+
+def _fetch_chunks(connection, name: str, query: str, parameters: Tuple,
+                  chunk_size: int) -> Iterator[List[Dict]]:
+    """Rows of a query as dicts, chunk_size at a time, through a server-side cursor where supported"""
+    try:
+        # psycopg2 named cursors keep the result set on the server
+        cursor = connection.cursor(name=name)
+        cursor.itersize = chunk_size
+    except TypeError:
+        cursor = connection.cursor()
+    
+    try:
+        cursor.execute(query, parameters)
+        columns = None
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            if columns is None:
+                columns = [column[0] for column in cursor.description]
+            yield [dict(zip(columns, values)) for values in chunk]
+    finally:
+        cursor.close()
+
+class ReportLoader:
+    """
+    Bulk data access for report generation over the FocusFlow schema.
+    Streams tasks, time_logs, habit_logs, habits and daily ai_reports ordered by
+    user_id through server-side cursors (named cursors on psycopg2, plain cursors
+    on sqlite3) fetched chunk_size rows at a time, merges the streams by user so
+    only one user's rows are held at once, and assembles engine user_data without
+    per-user queries. Results are written back to ai_reports with multi-row upserts.
+    Reads and writes use separate pooled connections, so a SQLite stand-in needs
+    journal_mode=WAL to commit while the read cursors are open.
+    """
+    
+    # Row limit per multi-row INSERT; 7 parameters each stays under SQLite's variable limit
+    write_batch_size = 100
+    
+    def __init__(self, pool: ConnectionPool, chunk_size: int = 10000, lookback_days: int = 30):
+        self.pool = pool
+        self.chunk_size = chunk_size
+        self.lookback_days = lookback_days
+    
+    def _queries(self, marker: str, since: str, until: str,
+                 user_ids: Optional[List[str]] = None) -> Dict[str, Tuple[str, Tuple]]:
+        """Per-table streaming (query, parameters), each ordered by user_id, optionally for some users"""
+        users, user_params = "", ()
+        if user_ids is not None:
+            users = f" AND user_id IN ({', '.join([marker] * len(user_ids))})"
+            user_params = tuple(user_ids)
+        
+        return {
+            'tasks': (
+                "SELECT t.user_id, t.id, t.title, t.priority, t.status, t.estimated_minutes, "
+                "t.actual_minutes, t.due_date, t.completed_at, t.created_at, "
+                "(SELECT MIN(l.start_time) FROM time_logs l WHERE l.task_id = t.id) AS started_at "
+                f"FROM tasks t WHERE (t.created_at >= {marker} OR t.completed_at IS NULL)"
+                f"{users.replace('user_id', 't.user_id')} ORDER BY t.user_id, t.created_at",
+                (since,) + user_params
+            ),
+            'time_logs': (
+                "SELECT user_id, task_id, start_time, end_time, duration_minutes FROM time_logs "
+                f"WHERE start_time >= {marker}{users} ORDER BY user_id, start_time",
+                (since,) + user_params
+            ),
+            'habit_logs': (
+                "SELECT user_id, habit_id, completed_at FROM habit_logs "
+                f"WHERE completed_at >= {marker}{users} ORDER BY user_id, completed_at",
+                (since,) + user_params
+            ),
+            'habits': (
+                "SELECT user_id, COUNT(*) AS active_habits FROM habits "
+                f"WHERE is_active{users} GROUP BY user_id ORDER BY user_id",
+                user_params
+            ),
+            'ai_reports': (
+                "SELECT user_id, report_date, productivity_score FROM ai_reports "
+                f"WHERE report_type = 'daily' AND report_date >= {marker} AND report_date < {marker}"
+                f"{users} ORDER BY user_id, report_date",
+                (since, until) + user_params
+            )
+        }
+    
+    def _stream(self, connection, table: str, query: str,
+                parameters: Tuple) -> Iterator[Tuple[str, str, List[Dict]]]:
+        """(user_id, table, rows) per user from one cursor, fetched in chunks"""
+        user_id, rows = None, []
+        for chunk in _fetch_chunks(connection, f"focusflow_{table}", query, parameters, self.chunk_size):
+            for row in chunk:
+                row_user = str(row.pop('user_id'))
+                if row_user != user_id and rows:
+                    yield user_id, table, rows
+                    rows = []
+                user_id = row_user
+                rows.append(row)
+        if rows:
+            yield user_id, table, rows
+    
+    def iter_user_data(self, report_date: Optional[date] = None,
+                       user_ids: Optional[List[str]] = None) -> Iterator[Tuple[str, Dict]]:
+        """
+        (user_id, user_data) for every user with activity, in user_id order.
+        user_ids restricts the scan to those users (one IN list, so keep it to a batch).
+        """
+        report_date = report_date or date.today()
+        since = (report_date - timedelta(days=self.lookback_days)).isoformat()
+        
+        with self.pool.connection() as connection:
+            try:
+                queries = self._queries(_placeholder(connection), since, report_date.isoformat(), user_ids)
+                streams = [
+                    self._stream(connection, table, query, parameters)
+                    for table, (query, parameters) in queries.items()
+                ]
+                merged = heapq.merge(*streams, key=lambda group: group[0])
+                for user_id, groups in itertools.groupby(merged, key=lambda group: group[0]):
+                    rows = {table: table_rows for _, table, table_rows in groups}
+                    yield user_id, self.build_user_data(rows, report_date)
+            finally:
+                # Reads only; ends the transaction holding the server-side cursors
+                connection.rollback()
+    
+    def iter_batches(self, batch_size: int = 1000,
+                     report_date: Optional[date] = None) -> Iterator[Tuple[List[str], List[Dict]]]:
+        """(user_ids, user_data list) batches for FocusFlowAI.generate_insights_batch"""
+        user_ids, users = [], []
+        for user_id, user_data in self.iter_user_data(report_date):
+            user_ids.append(user_id)
+            users.append(user_data)
+            if len(users) >= batch_size:
+                yield user_ids, users
+                user_ids, users = [], []
+        if users:
+            yield user_ids, users
+    
+    def read_reports(self, user_ids: List[str], report_date: Optional[date] = None,
+                     report_type: str = 'daily') -> Dict[str, Dict]:
+        """Stored insights by user for one report date, for the users that have a report"""
+        report_date = (report_date or date.today()).isoformat()
+        reports = {}
+        with self.pool.connection() as connection:
+            marker = _placeholder(connection)
+            cursor = connection.cursor()
+            try:
+                for start in range(0, len(user_ids), self.write_batch_size):
+                    batch = list(user_ids[start:start + self.write_batch_size])
+                    cursor.execute(
+                        "SELECT user_id, insights FROM ai_reports "
+                        f"WHERE report_type = {marker} AND report_date = {marker} "
+                        f"AND user_id IN ({', '.join([marker] * len(batch))})",
+                        [report_type, report_date] + batch
+                    )
+                    for user_id, insights in cursor.fetchall():
+                        # JSONB arrives decoded from psycopg2, as text from sqlite3
+                        reports[str(user_id)] = json.loads(insights) if isinstance(insights, str) else insights
+            finally:
+                cursor.close()
+            connection.rollback()
+        return reports
+    
+    def build_user_data(self, rows: Dict[str, List[Dict]], report_date: date) -> Dict:
+        """Engine user_data for report_date from one user's rows of each table"""
+        day = report_date.isoformat()
+        window = {(report_date - timedelta(days=offset)).isoformat() for offset in range(7)}
+        tasks = rows.get('tasks', [])
+        time_logs = rows.get('time_logs', [])
+        habit_logs = rows.get('habit_logs', [])
+        reports = rows.get('ai_reports', [])
+        active_habits = sum(int(row['active_habits']) for row in rows.get('habits', []))
+        
+        completed_today = [task for task in tasks if _day(task['completed_at']) == day]
+        due_in_window = [task for task in tasks if _day(task['due_date']) in window]
+        overdue = [
+            task for task in due_in_window
+            if task['completed_at'] is None
+            or datetime.fromisoformat(_iso(task['completed_at'])) > datetime.fromisoformat(_iso(task['due_date']))
+        ]
+        
+        working_minutes = 0.0
+        for log in time_logs:
+            if _day(log['start_time']) in window:
+                minutes = log['duration_minutes']
+                if minutes is None and log['end_time'] is not None:
+                    started = datetime.fromisoformat(_iso(log['start_time']))
+                    minutes = (datetime.fromisoformat(_iso(log['end_time'])) - started).total_seconds() / 60
+                working_minutes += minutes or 0
+        
+        habit_days = sum(1 for log in habit_logs if _day(log['completed_at']) in window)
+        
+        # A time log scores the time efficiency, rated as ProductivityScorer does, of the
+        # completed task it was spent on. Other logs carry no productivity signal and are
+        # left out, so optimal hours come only from scored work (none when nothing is scored)
+        task_efficiency = {
+            str(task['id']): min(task['estimated_minutes'] / task['actual_minutes'] * 100, 100)
+            for task in tasks
+            if task['completed_at'] is not None
+            and (task['estimated_minutes'] or 0) > 0 and (task['actual_minutes'] or 0) > 0
+        }
+        return {
+            # Productivity score inputs for report_date
+            'tasks_completed': len(completed_today),
+            'total_tasks': sum(
+                1 for task in tasks
+                if _day(task['due_date']) == day or _day(task['completed_at']) == day
+            ),
+            'estimated_minutes': sum(task['estimated_minutes'] or 0 for task in completed_today),
+            'actual_minutes': sum(task['actual_minutes'] or 0 for task in completed_today),
+            'habits_completed': sum(1 for log in habit_logs if _day(log['completed_at']) == day),
+            'total_habits': active_habits,
+            'focus_sessions': sum(1 for log in time_logs if _day(log['start_time']) == day),
+            'distraction_events': 0,
+            # Burnout inputs over the 7 days ending on report_date
+            'avg_daily_working_hours': working_minutes / 60 / 7,
+            'productivity_trend': [
+                float(report['productivity_score']) for report in reports[-14:]
+                if report['productivity_score'] is not None
+            ],
+            'habit_completion_rate': min(habit_days / (active_habits * 7), 1.0) if active_habits else 1.0,
+            'task_overdue_rate': len(overdue) / len(due_in_window) if due_in_window else 0,
+            # Component inputs
+            'recent_tasks': [
+                {
+                    'id': str(task['id']),
+                    'title': task['title'],
+                    'priority': task['priority'],
+                    'created_at': _iso(task['created_at']),
+                    'started_at': _iso(task['started_at']),
+                    'completed_at': _iso(task['completed_at']),
+                    'estimated_minutes': task['estimated_minutes'],
+                    'actual_minutes': task['actual_minutes']
+                }
+                for task in tasks
+            ],
+            'time_logs': [
+                {
+                    'task_id': str(log['task_id']),
+                    'start_time': _iso(log['start_time']),
+                    'duration_minutes': log['duration_minutes'],
+                    'productivity_score': task_efficiency[str(log['task_id'])]
+                }
+                for log in time_logs
+                if log['task_id'] is not None and str(log['task_id']) in task_efficiency
+            ],
+            'historical_data': [
+                {'date': _iso(report['report_date']), 'productivity_score': float(report['productivity_score'])}
+                for report in reports if report['productivity_score'] is not None
+            ]
+        }
+    
+    def write_reports(self, user_ids: List[str], insights_list: List[Dict],
+                      report_date: Optional[date] = None, report_type: str = 'daily') -> int:
+        """Upsert one ai_reports row per user, replacing any report for the same user, type and date"""
+        report_date = (report_date or date.today()).isoformat()
+        rows = [
+            (
+                user_id, report_type, report_date,
+                round(float(insights.get('productivity_score', 0)), 2),
+                json.dumps(insights, default=_json_default),
+                json.dumps(insights.get('recommendations', []), default=_json_default),
+                json.dumps({
+                    'procrastination_patterns': insights.get('procrastination_patterns', []),
+                    'optimal_working_hours': insights.get('optimal_working_hours', []),
+                    'burnout_risk': insights.get('burnout_risk', {})
+                }, default=_json_default)
+            )
+            for user_id, insights in zip(user_ids, insights_list)
+        ]
+        
+        with self.pool.connection() as connection:
+            marker = _placeholder(connection)
+            cursor = connection.cursor()
+            try:
+                for start in range(0, len(rows), self.write_batch_size):
+                    batch = rows[start:start + self.write_batch_size]
+                    values = ", ".join([f"({', '.join([marker] * 7)})"] * len(batch))
+                    cursor.execute(
+                        "INSERT INTO ai_reports (user_id, report_type, report_date, productivity_score, "
+                        f"insights, recommendations, patterns_detected) VALUES {values} "
+                        "ON CONFLICT (user_id, report_type, report_date) DO UPDATE SET "
+                        "productivity_score = EXCLUDED.productivity_score, insights = EXCLUDED.insights, "
+                        "recommendations = EXCLUDED.recommendations, "
+                        "patterns_detected = EXCLUDED.patterns_detected",
+                        [value for row in batch for value in row]
+                    )
+            finally:
+                cursor.close()
+            connection.commit()
+        
+        return len(rows)
+    
+    def run(self, engine: 'FocusFlowAI', report_date: Optional[date] = None,
+            batch_size: int = 1000, report_type: str = 'daily') -> Dict:
+        """Load, generate insights in batches and write them back; returns counts and timings"""
+        report_date = report_date or date.today()
+        stats = {'users': 0, 'batches': 0, 'load_seconds': 0.0, 'insights_seconds': 0.0, 'write_seconds': 0.0}
+        
+        batches = self.iter_batches(batch_size, report_date)
+        while True:
+            started = time.perf_counter()
+            batch = next(batches, None)
+            stats['load_seconds'] += time.perf_counter() - started
+            if batch is None:
+                break
+            user_ids, users = batch
+            
+            started = time.perf_counter()
+            insights_list = engine.generate_insights_batch(users)
+            stats['insights_seconds'] += time.perf_counter() - started
+            
+            started = time.perf_counter()
+            self.write_reports(user_ids, insights_list, report_date, report_type)
+            stats['write_seconds'] += time.perf_counter() - started
+            
+            stats['users'] += len(users)
+            stats['batches'] += 1
+        
+        logger.info(f"Wrote {report_type} reports for {stats['users']} users in {stats['batches']} batches")
+        return stats
+
+class RecomputeScheduler:
+    """
+    Change-driven recompute of ai_reports: only users with new or updated rows since
+    the last poll are reloaded and rescored, and of their insights only the
+    components fed by the changed tables are recomputed (the rest are reused from
+    the user's stored report for the same date).
+    
+    The first poll reads one grouped query per change source; later polls read the
+    rows changed since the watermark, so an index on each source's change column keeps
+    polls cheap. Watermarks keep the driver's own timestamp values. Polls re-read a
+    grace window behind the watermark to catch rows committed late with an earlier
+    timestamp; (row id, timestamp) pairs already seen keep those from re-marking users. Dirty users are coalesced (one entry per user,
+    stale components unioned) in a queue of at most max_pending users; a full queue
+    holds the watermark back, so the remaining changes are picked up by later polls.
+    The first poll marks every user with rows; seed watermarks to start later, and
+    pass sources without user_events where the gamification schema is not installed.
+    """
+    
+    # table -> (change timestamp column, stale insight keys besides the always-recomputed ones).
+    # A task's started_at is its first time log, so time logs also feed procrastination;
+    # time logs are scored by their task's efficiency, so tasks also feed optimal hours.
+    change_sources = {
+        'tasks': ('updated_at', {'procrastination_patterns', 'optimal_working_hours'}),
+        'time_logs': ('updated_at', {'optimal_working_hours', 'procrastination_patterns'}),
+        'habit_logs': ('created_at', set()),
+        'habits': ('updated_at', set()),
+        'user_events': ('created_at', set())
+    }
+    
+    def __init__(self, engine: 'FocusFlowAI', loader: ReportLoader, batch_size: int = 500,
+                 max_pending: int = 100000, grace_seconds: float = 300,
+                 sources: Optional[Dict[str, Tuple[str, set]]] = None):
+        self.engine = engine
+        self.loader = loader
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.grace = timedelta(seconds=grace_seconds)
+        self.sources = self.change_sources if sources is None else sources
+        
+        self.watermarks = {}  # table -> latest change timestamp consumed, as the driver returned it
+        self._seen = {table: {} for table in self.sources}  # table -> (row id, timestamp) -> timestamp
+        self._dirty = {}  # user_id -> [first marked (perf_counter), changes, stale insight keys]
+        self._lock = threading.Lock()
+        self.counters = {
+            'changes': 0, 'users_marked': 0, 'coalesced': 0, 'deferred_polls': 0,
+            'users_recomputed': 0, 'users_missing': 0, 'reports_reused': 0, 'batches': 0,
+            'poll_seconds': 0.0, 'load_seconds': 0.0, 'insights_seconds': 0.0, 'write_seconds': 0.0
+        }
+        self._latencies = deque(maxlen=10000)  # seconds from dirty to written, recent users
+    
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+    
+    def mark_dirty(self, user_id: str, stale: Iterable[str] = (), changes: int = 1) -> bool:
+        """Queue a user for recompute; False (and nothing queued) if the queue is full"""
+        with self._lock:
+            entry = self._dirty.get(user_id)
+            if entry is None:
+                if len(self._dirty) >= self.max_pending:
+                    return False
+                self._dirty[user_id] = [time.perf_counter(), changes, set(stale)]
+                self.counters['users_marked'] += 1
+            else:
+                entry[1] += changes
+                entry[2].update(stale)
+                self.counters['coalesced'] += 1
+            self.counters['changes'] += changes
+            return True
+    
+    def poll(self) -> int:
+        """Mark users with changes since the last poll dirty; returns the changes queued"""
+        started = time.perf_counter()
+        marked = 0
+        with self.loader.pool.connection() as connection:
+            marker = _placeholder(connection)
+            cursor = connection.cursor()
+            try:
+                for table, (column, stale) in self.sources.items():
+                    marked += self._poll_source(cursor, marker, table, column, stale)
+            finally:
+                cursor.close()
+            connection.rollback()
+        self.counters['poll_seconds'] += time.perf_counter() - started
+        return marked
+    
+    def _poll_source(self, cursor, marker: str, table: str, column: str, stale: set) -> int:
+        watermark = self.watermarks.get(table)
+        if watermark is None:
+            cursor.execute(f"SELECT user_id, NULL, MAX({column}), COUNT(*) FROM {table} GROUP BY user_id ORDER BY 3")
+        else:
+            # Bound in the column's own representation, so text timestamps compare like stored values
+            cursor.execute(
+                f"SELECT user_id, id, {column}, 1 FROM {table} WHERE {column} > {marker} ORDER BY {column}",
+                (_shift_timestamp(watermark, -self.grace),)
+            )
+        
+        seen = self._seen[table]
+        marked = 0
+        latest = watermark
+        deferred = False
+        for user_id, row_id, changed_at, changes in cursor.fetchall():
+            key = None if row_id is None else (str(row_id), _iso(changed_at))
+            if key in seen:
+                continue
+            if not self.mark_dirty(str(user_id), stale, changes):
+                # Queue full: stop here so later polls resume from this change
+                self.counters['deferred_polls'] += 1
+                deferred = True
+                break
+            marked += 1
+            if changed_at is None:
+                continue
+            if key is not None:
+                seen[key] = changed_at
+            if latest is None or _timestamp_key(changed_at) > _timestamp_key(latest):
+                latest = changed_at
+        
+        if watermark is None and latest is not None and not deferred:
+            # The grouped first pass queued every row; remember the ones the next poll re-reads
+            cursor.execute(
+                f"SELECT id, {column} FROM {table} WHERE {column} > {marker}",
+                (_shift_timestamp(latest, -self.grace),)
+            )
+            for row_id, changed_at in cursor.fetchall():
+                seen[(str(row_id), _iso(changed_at))] = changed_at
+        
+        if latest is not None:
+            self.watermarks[table] = latest
+            # Rows older than the grace window are never re-read
+            horizon = _timestamp_key(_shift_timestamp(latest, -self.grace))
+            self._seen[table] = {key: at for key, at in seen.items() if _timestamp_key(at) > horizon}
+        return marked
+    
+    def _next_batch(self) -> List[Tuple[str, set, float]]:
+        """Take up to batch_size dirty users, longest-waiting first"""
+        with self._lock:
+            oldest = heapq.nsmallest(self.batch_size, self._dirty.items(), key=lambda item: item[1][0])
+            batch = []
+            for user_id, (marked_at, _, stale) in oldest:
+                del self._dirty[user_id]
+                batch.append((user_id, stale, marked_at))
+            return batch
+    
+    def drain(self, report_date: Optional[date] = None, report_type: str = 'daily',
+              max_batches: Optional[int] = None) -> int:
+        """Recompute and persist dirty users batch by batch; returns how many were written"""
+        report_date = report_date or date.today()
+        written = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            batch = self._next_batch()
+            if not batch:
+                break
+            user_ids = [user_id for user_id, _, _ in batch]
+            
+            started = time.perf_counter()
+            loaded = dict(self.loader.iter_user_data(report_date, user_ids))
+            reports = self.loader.read_reports(user_ids, report_date, report_type)
+            self.counters['load_seconds'] += time.perf_counter() - started
+            
+            # Users without rows left (e.g. deleted) have nothing to report
+            present = [(user_id, stale, marked_at) for user_id, stale, marked_at in batch if user_id in loaded]
+            self.counters['users_missing'] += len(batch) - len(present)
+            ids = [user_id for user_id, _, _ in present]
+            previous = [reports.get(user_id) for user_id in ids]
+            self.counters['reports_reused'] += sum(report is not None for report in previous)
+            
+            started = time.perf_counter()
+            insights_list = self.engine.generate_insights_batch(
+                [loaded[user_id] for user_id in ids], previous=previous,
+                stale=[stale for _, stale, _ in present]
+            )
+            self.counters['insights_seconds'] += time.perf_counter() - started
+            
+            started = time.perf_counter()
+            self.loader.write_reports(ids, insights_list, report_date, report_type)
+            finished = time.perf_counter()
+            self.counters['write_seconds'] += finished - started
+            
+            self._latencies.extend(finished - marked_at for _, _, marked_at in present)
+            self.counters['users_recomputed'] += len(present)
+            self.counters['batches'] += 1
+            written += len(present)
+            batches += 1
+        
+        return written
+    
+    def run_once(self, report_date: Optional[date] = None, report_type: str = 'daily') -> Dict:
+        """Poll for changes and recompute everything dirty; returns metrics()"""
+        self.poll()
+        self.drain(report_date, report_type)
+        return self.metrics()
+    
+    def metrics(self) -> Dict:
+        """Counters, queue depth, throughput of the recompute stages and dirty-to-written latency"""
+        metrics = dict(self.counters, pending=self.pending)
+        busy = metrics['load_seconds'] + metrics['insights_seconds'] + metrics['write_seconds']
+        metrics['users_per_s'] = metrics['users_recomputed'] / busy if busy else 0.0
+        if self._latencies:
+            latencies = np.array(self._latencies)
+            metrics['latency_p50_s'] = float(np.percentile(latencies, 50))
+            metrics['latency_p99_s'] = float(np.percentile(latencies, 99))
+        return metrics
+
+def _event_columns(events) -> Dict[str, np.ndarray]:
+    """Columns of user_events rows given as a list of dicts or a dict of equal-length columns"""
+    fields = ('user_id', 'event_type_id', 'occurred_at', 'duration_minutes', 'points_earned', 'weightage_applied')
+    if isinstance(events, dict):
+        return {field: np.asarray(events.get(field, [None] * len(events['user_id'])), dtype=object)
+                for field in fields}
+    return {field: _object_array([event.get(field) for event in events]) for field in fields}
+
+def _period_starts(period: str, days: np.ndarray) -> np.ndarray:
+    """First day of the daily, weekly (Monday) or monthly period containing each day"""
+    if period == 'daily':
+        return days
+    if period == 'weekly':
+        # 1970-01-01 was a Thursday
+        return days - (days.astype(np.int64) + 3) % 7
+    if period == 'monthly':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"Unknown leaderboard period: {period}")
+
+class GamificationEngine:
+    """
+    In-memory points, streaks, daily-goal progress and leaderboards over user_events.
+    Events are folded in as an ordered stream: each batch adds its users' points,
+    event counts and minutes into users x columns buckets per day, week, month and
+    all time with vectorized scatter-adds, so profiles, goals and leaderboards are
+    reads of the buckets rather than scans of the events table. Day, week and month
+    buckets older than retain_days are dropped; all-time totals are kept.
+    
+    Points follow gamification-api.js, round((base + duration bonus) x weightage):
+    each event's base is points_earned / weightage_applied, reweighed with the
+    weightage in force at occurred_at per event_weightage_history (or the latest
+    one when retroactive), so history changes only rescore the events they reach.
+    """
+    
+    # Aggregate columns of every bucket
+    columns = ('points', 'events', 'minutes', 'score_sum', 'score_days')
+    
+    # Leaderboard periods, as in leaderboards.leaderboard_type
+    periods = ('daily', 'weekly', 'monthly', 'all_time')
+    
+    # daily_goals.goal_type -> bucket column measuring progress (productive_hours in minutes)
+    goal_columns = {'productive_hours': 'minutes', 'events_count': 'events', 'points_target': 'points'}
+    
+    def __init__(self, top_n: int = 100, retain_days: int = 7, retroactive: bool = False):
+        self.top_n = top_n
+        self.retain_days = retain_days
+        self.retroactive = retroactive
+        
+        self.user_ids = []
+        self.user_index = {}
+        self.capacity = 0
+        self.daily_streak = np.zeros(0, dtype=np.int64)
+        self.longest_streak = np.zeros(0, dtype=np.int64)
+        self.last_day = np.zeros(0, dtype='datetime64[D]')
+        self.latest_day = None
+        
+        self.buckets = {}  # (period, start day or None for all_time) -> users x columns
+        self.history = {}  # event_type_id -> (changed_at datetime64[us], new_weightage), by changed_at
+        self.position = {}  # stream positions (GamificationStream), saved with snapshots
+        self._boards = {}  # (period, start, column) -> [top rows or None, rows touched since]
+    
+    def _rows(self, user_ids) -> np.ndarray:
+        """Row of each user, adding rows (with amortized growth) for new users"""
+        for user_id in user_ids:
+            if user_id not in self.user_index:
+                self.user_index[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+        
+        n_users = len(self.user_ids)
+        if n_users > self.capacity:
+            capacity = max(n_users, 2 * self.capacity)
+            grow = capacity - self.capacity
+            self.daily_streak = np.concatenate([self.daily_streak, np.zeros(grow, dtype=np.int64)])
+            self.longest_streak = np.concatenate([self.longest_streak, np.zeros(grow, dtype=np.int64)])
+            self.last_day = np.concatenate(
+                [self.last_day, np.full(grow, np.datetime64('NaT'), dtype='datetime64[D]')]
+            )
+            for key, bucket in self.buckets.items():
+                self.buckets[key] = np.concatenate([bucket, np.zeros((grow, len(self.columns)))])
+            self.capacity = capacity
+        return np.array([self.user_index[user_id] for user_id in user_ids], dtype=np.int64)
+    
+    def _bucket(self, key: Tuple, create: bool = False) -> Optional[np.ndarray]:
+        bucket = self.buckets.get(key)
+        if bucket is None and create:
+            bucket = self.buckets[key] = np.zeros((self.capacity, len(self.columns)))
+        return bucket
+    
+    def _horizon(self, period: str) -> Optional[np.datetime64]:
+        """Start of the oldest retained period"""
+        if self.latest_day is None:
+            return None
+        oldest = np.array([self.latest_day - (self.retain_days - 1)])
+        return _period_starts(period, oldest)[0]
+    
+    def _advance(self, days: np.ndarray):
+        """Move latest_day forward and drop buckets that fell out of retention"""
+        days = days[~np.isnat(days)]
+        if not len(days) or (self.latest_day is not None and days.max() <= self.latest_day):
+            return
+        self.latest_day = days.max()
+        expired = [
+            key for key in self.buckets
+            if key[0] != 'all_time' and key[1] < self._horizon(key[0])
+        ]
+        for key in expired:
+            del self.buckets[key]
+        self._boards = {key: board for key, board in self._boards.items() if key[:2] in self.buckets}
+    
+    def _add(self, rows: np.ndarray, days: np.ndarray, values: np.ndarray):
+        """Scatter-add per-event column deltas into the all-time and retained period buckets"""
+        for period in self.periods:
+            if period == 'all_time':
+                groups = [((period, None), slice(None))]
+            else:
+                starts = _period_starts(period, days)
+                horizon = self._horizon(period)
+                groups = [
+                    ((period, start), starts == start) for start in np.unique(starts[~np.isnat(starts)])
+                    if horizon is None or start >= horizon
+                ]
+            
+            for key, selected in groups:
+                np.add.at(self._bucket(key, create=True), rows[selected], values[selected])
+                for (period_, start, column), board in self._boards.items():
+                    if (period_, start) != key or board[0] is None:
+                        continue
+                    changes = values[selected, self.columns.index(column)]
+                    if (changes < 0).any() or len(board[1]) > 64:
+                        # Scores went down (or many batches queued): next read ranks from scratch
+                        board[0] = None
+                        board[1] = []
+                    else:
+                        board[1].append(rows[selected][changes != 0])
+    
+    def _reweigh(self, history: Optional[Tuple[np.ndarray, np.ndarray]], instants: np.ndarray,
+                 points: np.ndarray, weightage: np.ndarray) -> np.ndarray:
+        """Points of events under a weightage history; events before its first change keep their points"""
+        if history is None:
+            return points
+        changed_at, new_weightage = history
+        if self.retroactive:
+            weights = np.full(len(points), new_weightage[-1])
+        else:
+            index = np.searchsorted(changed_at, instants, side='right') - 1
+            weights = np.where(index >= 0, new_weightage[np.maximum(index, 0)], weightage)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Math.round in the API rounds halves up
+            reweighed = np.floor(points / weightage * weights + 0.5)
+        return np.where(weightage > 0, reweighed, points)
+    
+    def _credit(self, columns: Dict[str, np.ndarray], instants: np.ndarray) -> np.ndarray:
+        """Points credited for each event under the current weightage history"""
+        points = columns['points_earned'].astype(float)
+        weightage = columns['weightage_applied'].astype(float)
+        credit = points.copy()
+        if self.history:
+            type_ids = columns['event_type_id'].astype(str)
+            for type_id in set(np.unique(type_ids)) & set(self.history):
+                selected = type_ids == type_id
+                credit[selected] = self._reweigh(
+                    self.history[type_id], instants[selected], points[selected], weightage[selected]
+                )
+        return credit
+    
+    def apply_events(self, events) -> int:
+        """
+        Fold a batch of user_events rows (list of dicts or dict of columns with user_id,
+        event_type_id, occurred_at, duration_minutes, points_earned, weightage_applied)
+        into totals, streaks, goal progress and leaderboards. Returns the rows applied.
+        """
+        columns = _event_columns(events)
+        if not len(columns['user_id']):
+            return 0
+        instants, wall_clock = _parse_timestamps([_iso(value) for value in columns['occurred_at']])
+        days = wall_clock.astype('datetime64[D]')
+        valid = ~np.isnat(days)
+        columns = {field: values[valid] for field, values in columns.items()}
+        instants, days = instants[valid], days[valid]
+        
+        rows = self._rows([str(user_id) for user_id in columns['user_id']])
+        values = np.zeros((len(rows), len(self.columns)))
+        values[:, 0] = self._credit(columns, instants)
+        values[:, 1] = 1
+        values[:, 2] = np.nan_to_num(columns['duration_minutes'].astype(float))
+        
+        self._advance(days)
+        self._add(rows, days, values)
+        self._update_streaks(rows, days)
+        return len(rows)
+    
+    def _update_streaks(self, rows: np.ndarray, days: np.ndarray):
+        """Daily streaks by activity day; a day before a user's last active day leaves the streak alone"""
+        for day in np.unique(days):
+            users = np.unique(rows[days == day])
+            last = self.last_day[users]
+            newer = np.isnat(last) | (last < day)
+            users, last = users[newer], last[newer]
+            continued = ~np.isnat(last) & (last == day - 1)
+            self.daily_streak[users] = np.where(continued, self.daily_streak[users] + 1, 1)
+            self.longest_streak[users] = np.maximum(self.longest_streak[users], self.daily_streak[users])
+            self.last_day[users] = day
+    
+    def apply_weightage_changes(self, changes: List[Dict], fetch_events) -> int:
+        """
+        Add event_weightage_history rows (event_type_id, new_weightage, changed_at) and
+        rescore the events they affect. fetch_events(event_type_id, since) yields
+        batches of already applied events of that type occurring at or after since
+        (None: all of them, as retroactive scoring needs). Returns the events rescored.
+        """
+        by_type = {}
+        for change in changes:
+            by_type.setdefault(str(change['event_type_id']), []).append(change)
+        
+        rescored = 0
+        for type_id, rows in by_type.items():
+            previous = self.history.get(type_id)
+            changed_at = _parse_timestamps([_iso(row['changed_at']) for row in rows])[0]
+            new_weightage = np.array([float(row['new_weightage']) for row in rows])
+            if previous is not None:
+                changed_at = np.concatenate([previous[0], changed_at])
+                new_weightage = np.concatenate([previous[1], new_weightage])
+            order = np.argsort(changed_at, kind='stable')
+            self.history[type_id] = (changed_at[order], new_weightage[order])
+            
+            since = None if self.retroactive else min((row['changed_at'] for row in rows), key=_timestamp_key)
+            for events in fetch_events(type_id, since):
+                columns = _event_columns(events)
+                if not len(columns['user_id']):
+                    continue
+                instants, wall_clock = _parse_timestamps([_iso(value) for value in columns['occurred_at']])
+                points = columns['points_earned'].astype(float)
+                weightage = columns['weightage_applied'].astype(float)
+                delta = (
+                    self._reweigh(self.history[type_id], instants, points, weightage)
+                    - self._reweigh(previous, instants, points, weightage)
+                )
+                changed = np.flatnonzero(delta != 0)
+                if len(changed):
+                    values = np.zeros((len(changed), len(self.columns)))
+                    values[:, 0] = delta[changed]
+                    rows = self._rows([str(columns['user_id'][i]) for i in changed])
+                    self._add(rows, wall_clock[changed].astype('datetime64[D]'), values)
+                rescored += len(changed)
+        
+        return rescored
+    
+    def record_productivity_scores(self, user_ids: List[str], dates: List, scores) -> int:
+        """
+        Daily productivity scores (e.g. ProductivityScorer.calculate_scores or daily
+        ai_reports) for productivity_score leaderboards, ranked by the mean daily
+        score in the period. A repeated user and date replaces the earlier score.
+        Dates before the retained days are rejected (and logged): their daily bucket
+        is gone, so a re-sent score could not replace the one already counted in all
+        time. Returns the rows applied.
+        """
+        days = _parse_timestamps([_iso(value) for value in dates])[0].astype('datetime64[D]')
+        scores = np.asarray(scores, dtype=float)
+        valid = ~np.isnat(days) & ~np.isnan(scores)
+        rows = self._rows([str(user_id) for user_id in user_ids])[valid]
+        days, scores = days[valid], scores[valid]
+        if not len(days):
+            return 0
+        self._advance(days)
+        
+        retained = days >= self._horizon('daily')
+        if not retained.all():
+            logger.warning(
+                f"Rejected {int((~retained).sum())} productivity scores dated before the "
+                f"{self.retain_days} retained days"
+            )
+            rows, days, scores = rows[retained], days[retained], scores[retained]
+        
+        applied = 0
+        score_sum, score_days = self.columns.index('score_sum'), self.columns.index('score_days')
+        for day in np.unique(days):
+            on_day = np.flatnonzero(days == day)
+            # A user repeated within one date keeps its last score
+            _, last = np.unique(rows[on_day][::-1], return_index=True)
+            on_day = on_day[::-1][last]
+            
+            # Replace any earlier score of the same user and date
+            bucket = self._bucket(('daily', day), create=True)
+            values = np.zeros((len(on_day), len(self.columns)))
+            values[:, score_sum] = scores[on_day] - bucket[rows[on_day], score_sum]
+            values[:, score_days] = 1 - bucket[rows[on_day], score_days]
+            self._add(rows[on_day], days[on_day], values)
+            applied += len(on_day)
+        return applied
+    
+    def _period_key(self, period: str, on: Optional[date]) -> Tuple:
+        if period == 'all_time':
+            return period, None
+        if on is None:
+            day = self.latest_day
+        else:
+            day = np.datetime64(_iso(on)[:10], 'D')
+        if day is None:
+            return period, None
+        return period, _period_starts(period, np.array([day]))[0]
+    
+    def leaderboard(self, period: str = 'all_time', metric: str = 'points',
+                    on: Optional[date] = None, top_n: Optional[int] = None) -> List[Dict]:
+        """
+        Top users of the period containing `on` (default: the latest event day) by
+        points, events, streak (current daily streak) or productivity_score, with
+        competition ranks. Points and events boards are kept incrementally: while
+        scores only grow, a refresh re-ranks the previous top plus the users touched since.
+        """
+        top_n = top_n or self.top_n
+        n_users = len(self.user_ids)
+        key = self._period_key(period, on)
+        bucket = self.buckets.get(key) if key[1] is not None or period == 'all_time' else None
+        
+        if metric == 'streak':
+            scores = self.daily_streak[:n_users].astype(float)
+            ranked = np.flatnonzero(scores > 0)
+        elif bucket is None:
+            return []
+        elif metric == 'productivity_score':
+            days = bucket[:n_users, self.columns.index('score_days')]
+            ranked = np.flatnonzero(days > 0)
+            scores = np.zeros(n_users)
+            scores[ranked] = bucket[ranked, self.columns.index('score_sum')] / days[ranked]
+        elif metric in ('points', 'events'):
+            scores = bucket[:n_users, self.columns.index(metric)]
+            board = self._boards.get(key + (metric,))
+            if board is not None and board[0] is not None and top_n <= self.top_n:
+                ranked = np.unique(np.concatenate([board[0]] + board[1]))
+                ranked = ranked[scores[ranked] > 0]
+            else:
+                ranked = np.flatnonzero(scores > 0)
+        else:
+            raise ValueError(f"Unknown leaderboard metric: {metric}")
+        
+        # Highest score first, earlier users first among ties; cached boards keep top_n rows
+        keep = max(top_n, self.top_n)
+        if len(ranked) > keep:
+            cutoff = np.partition(scores[ranked], len(ranked) - keep)[len(ranked) - keep]
+            ranked = ranked[scores[ranked] >= cutoff]
+        ranked = ranked[np.lexsort((ranked, -scores[ranked]))][:keep]
+        if metric in ('points', 'events'):
+            self._boards[key + (metric,)] = [ranked, []]
+        
+        ranked = ranked[:top_n]
+        top_scores = scores[ranked]
+        ranks = np.searchsorted(-top_scores, -top_scores, side='left') + 1
+        return [
+            {'rank': int(rank), 'user_id': self.user_ids[row], 'score': float(score)}
+            for rank, row, score in zip(ranks, ranked, top_scores)
+        ]
+    
+    def profiles(self, user_ids: Optional[List[str]] = None) -> List[Dict]:
+        """user_gamification_profiles fields for the given (default: all) users, levels as in the schema"""
+        if user_ids is None:
+            user_ids = self.user_ids
+        known = [user_id for user_id in user_ids if user_id in self.user_index]
+        rows = np.array([self.user_index[user_id] for user_id in known], dtype=np.int64)
+        totals = self._bucket(('all_time', None))
+        if totals is None:
+            return []
+        
+        experience = totals[rows, self.columns.index('points')].astype(np.int64)
+        levels = np.floor(np.sqrt(experience / 100.0)).astype(np.int64) + 1
+        to_next = levels ** 2 * 100 - (experience - (levels - 1) ** 2 * 100)
+        events = totals[rows, self.columns.index('events')].astype(np.int64)
+        return [
+            {
+                'user_id': user_id,
+                'total_points': int(experience[i]),
+                'current_level': int(levels[i]),
+                'experience_points': int(experience[i]),
+                'points_to_next_level': int(to_next[i]),
+                'daily_streak': int(self.daily_streak[row]),
+                'longest_streak': int(self.longest_streak[row]),
+                'last_activity_date': None if np.isnat(self.last_day[row]) else str(self.last_day[row]),
+                'total_events_logged': int(events[i])
+            }
+            for i, (user_id, row) in enumerate(zip(known, rows))
+        ]
+    
+    def goal_progress(self, goals: List[Dict]) -> List[Dict]:
+        """
+        Progress of daily_goals rows (user_id, goal_date, goal_type, target_value),
+        as current_value and is_completed. Goal types without an event measure
+        (specific_events, custom) and days outside retention get current_value None.
+        """
+        progress = []
+        for goal in goals:
+            column = self.goal_columns.get(goal['goal_type'])
+            row = self.user_index.get(str(goal['user_id']))
+            bucket = self.buckets.get(('daily', np.datetime64(_iso(goal['goal_date'])[:10], 'D')))
+            if column is None or bucket is None:
+                current = None
+            else:
+                current = 0.0 if row is None else float(bucket[row, self.columns.index(column)])
+            progress.append(dict(
+                goal, current_value=current,
+                is_completed=current is not None and current >= float(goal['target_value'])
+            ))
+        return progress
+    
+    def save_snapshot(self, path: str):
+        """Write the full state (including stream positions) to one .npz file, atomically"""
+        n_users = len(self.user_ids)
+        keys = list(self.buckets)
+        types = list(self.history)
+        arrays = {
+            'daily_streak': self.daily_streak[:n_users],
+            'longest_streak': self.longest_streak[:n_users],
+            'last_day': self.last_day[:n_users],
+            'meta': np.array(json.dumps({
+                'top_n': self.top_n,
+                'retain_days': self.retain_days,
+                'retroactive': self.retroactive,
+                'user_ids': self.user_ids,
+                'latest_day': None if self.latest_day is None else str(self.latest_day),
+                'buckets': [[period, None if start is None else str(start)] for period, start in keys],
+                'history_types': types,
+                'position': self.position
+            }, default=_json_default))
+        }
+        for i, key in enumerate(keys):
+            arrays[f"bucket_{i}"] = self.buckets[key][:n_users]
+        for i, type_id in enumerate(types):
+            arrays[f"history_{i}_changed_at"], arrays[f"history_{i}_weightage"] = self.history[type_id]
+        
+        # Write under a temporary name so a crash never leaves a partial snapshot
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(path + '.tmp', path)
+    
+    @classmethod
+    def load_snapshot(cls, path: str) -> 'GamificationEngine':
+        with np.load(path) as snapshot:
+            meta = json.loads(str(snapshot['meta']))
+            engine = cls(meta['top_n'], meta['retain_days'], meta['retroactive'])
+            engine.user_ids = meta['user_ids']
+            engine.user_index = {user_id: row for row, user_id in enumerate(engine.user_ids)}
+            engine.capacity = len(engine.user_ids)
+            engine.daily_streak = snapshot['daily_streak']
+            engine.longest_streak = snapshot['longest_streak']
+            engine.last_day = snapshot['last_day']
+            if meta['latest_day'] is not None:
+                engine.latest_day = np.datetime64(meta['latest_day'], 'D')
+            for i, (period, start) in enumerate(meta['buckets']):
+                start = None if start is None else np.datetime64(start, 'D')
+                engine.buckets[(period, start)] = snapshot[f"bucket_{i}"]
+            for i, type_id in enumerate(meta['history_types']):
+                engine.history[type_id] = (
+                    snapshot[f"history_{i}_changed_at"], snapshot[f"history_{i}_weightage"]
+                )
+            engine.position = meta['position']
+        return engine
+
+class GamificationStream:
+    """
+    Feeds a GamificationEngine from the database: user_events and
+    event_weightage_history are read in (created_at / changed_at, id) order from
+    stored positions in chunk_size batches, weightage changes rescore only the
+    consumed events of their event type, and the engine is snapshotted every
+    snapshot_every events so a restart resumes from the snapshot's positions.
+    Reads re-cover a grace window behind each position to pick up rows committed
+    late with an earlier timestamp, skipping ids already consumed.
+    """
+    
+    def __init__(self, engine: GamificationEngine, pool: ConnectionPool, chunk_size: int = 10000,
+                 snapshot_path: Optional[str] = None, snapshot_every: int = 100000,
+                 grace_seconds: float = 300):
+        self.engine = engine
+        self.pool = pool
+        self.chunk_size = chunk_size
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.grace = timedelta(seconds=grace_seconds)
+        self._since_snapshot = 0
+        self.snapshots = 0
+    
+    @classmethod
+    def restore(cls, pool: ConnectionPool, snapshot_path: str, **options) -> 'GamificationStream':
+        """Stream resuming from snapshot_path, or starting from scratch if there is none yet"""
+        engine_options = {
+            name: options.pop(name) for name in ('top_n', 'retain_days', 'retroactive') if name in options
+        }
+        if os.path.exists(snapshot_path):
+            engine = GamificationEngine.load_snapshot(snapshot_path)
+        else:
+            engine = GamificationEngine(**engine_options)
+        return cls(engine, pool, snapshot_path=snapshot_path, **options)
+    
+    def _consume_table(self, connection, table: str, columns: str, order_column: str, apply) -> int:
+        """
+        apply() each chunk of rows not consumed yet, advancing the stored position after
+        each chunk (and snapshotting when due, so snapshots never hold half a chunk)
+        """
+        # 'at' keeps the driver's own timestamp value, so the bound compares like the column
+        position = self.engine.position.setdefault(table, {'at': None, 'recent': {}})
+        query = f"SELECT id, {order_column}, {columns} FROM {table}"
+        parameters = ()
+        if position['at'] is not None:
+            query += f" WHERE {order_column} > {_placeholder(connection)}"
+            parameters = (_shift_timestamp(position['at'], -self.grace),)
+        query += f" ORDER BY {order_column}, id"
+        
+        consumed = 0
+        for rows in _fetch_chunks(connection, f"focusflow_{table}", query, parameters, self.chunk_size):
+            fresh = [row for row in rows if str(row['id']) not in position['recent']]
+            apply(fresh)
+            for row in fresh:
+                position['recent'][str(row['id'])] = _iso(row[order_column])
+            last = rows[-1][order_column]
+            if position['at'] is None or _timestamp_key(last) > _timestamp_key(position['at']):
+                position['at'] = last
+            
+            consumed += len(fresh)
+            self._since_snapshot += len(fresh)
+            if self.snapshot_path and self._since_snapshot >= self.snapshot_every:
+                self._snapshot()
+        
+        # Ids older than the grace window are never re-read
+        if position['at'] is not None:
+            horizon = _timestamp_key(position['at']) - self.grace
+            position['recent'] = {
+                row_id: at for row_id, at in position['recent'].items()
+                if _timestamp_key(at) >= horizon
+            }
+        return consumed
+    
+    def _snapshot(self):
+        self.engine.save_snapshot(self.snapshot_path)
+        self._since_snapshot = 0
+        self.snapshots += 1
+    
+    def _consumed_events(self, connection, event_type_id: str, since) -> Iterator[List[Dict]]:
+        """Consumed events of one type occurring at or after since, for rescoring"""
+        marker = _placeholder(connection)
+        query = (
+            "SELECT id, created_at, user_id, event_type_id, occurred_at, points_earned, weightage_applied "
+            f"FROM user_events WHERE event_type_id = {marker}"
+        )
+        parameters = (event_type_id,)
+        if since is not None:
+            query += f" AND occurred_at >= {marker}"
+            parameters += (since,)
+        
+        position = self.engine.position.get('user_events', {'at': None, 'recent': {}})
+        if position['at'] is None:
+            return
+        settled = _timestamp_key(position['at']) - self.grace
+        query += f" AND created_at <= {marker}"
+        parameters += (position['at'],)
+        for rows in _fetch_chunks(connection, 'focusflow_rescore', query, parameters, self.chunk_size):
+            # Inside the grace window only ids actually consumed were credited
+            yield [
+                row for row in rows
+                if _timestamp_key(row['created_at']) < settled
+                or str(row['id']) in position['recent']
+            ]
+    
+    def consume(self) -> Dict:
+        """Apply every new event and weightage change; returns counts and seconds taken"""
+        started = time.perf_counter()
+        snapshots = self.snapshots
+        stats = {'events': 0, 'weightage_changes': 0, 'events_rescored': 0}
+        
+        def apply_events(events):
+            stats['events'] += self.engine.apply_events(events)
+        
+        def apply_changes(changes):
+            stats['weightage_changes'] += len(changes)
+            stats['events_rescored'] += self.engine.apply_weightage_changes(
+                changes, lambda type_id, since: self._consumed_events(connection, type_id, since)
+            )
+        
+        with self.pool.connection() as connection:
+            try:
+                self._consume_table(
+                    connection, 'user_events',
+                    'user_id, event_type_id, occurred_at, duration_minutes, points_earned, weightage_applied',
+                    'created_at', apply_events
+                )
+                self._consume_table(
+                    connection, 'event_weightage_history', 'event_type_id, new_weightage', 'changed_at',
+                    apply_changes
+                )
+            finally:
+                connection.rollback()
+        
+        if self.snapshot_path and self._since_snapshot:
+            self._snapshot()
+        stats['snapshots'] = self.snapshots - snapshots
+        stats['seconds'] = time.perf_counter() - started
+        return stats
+    
+    def sync_productivity_scores(self, since: date) -> int:
+        """Feed daily ai_reports scores from since onwards to productivity_score leaderboards"""
+        applied = 0
+        with self.pool.connection() as connection:
+            query = (
+                "SELECT user_id, report_date, productivity_score FROM ai_reports "
+                f"WHERE report_type = 'daily' AND report_date >= {_placeholder(connection)} "
+                "AND productivity_score IS NOT NULL"
+            )
+            try:
+                for rows in _fetch_chunks(connection, 'focusflow_scores', query, (since.isoformat(),),
+                                          self.chunk_size):
+                    applied += self.engine.record_productivity_scores(
+                        [row['user_id'] for row in rows], [row['report_date'] for row in rows],
+                        [float(row['productivity_score']) for row in rows]
+                    )
+            finally:
+                connection.rollback()
+        return applied
+    
+    def refresh_leaderboards(self, on: Optional[date] = None) -> int:
+        """
+        Rewrite leaderboard_entries of every active leaderboard from the engine's
+        top users (no events scan); returns the entries written
+        """
+        written = 0
+        with self.pool.connection() as connection:
+            marker = _placeholder(connection)
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT id, leaderboard_type, metric FROM leaderboards WHERE is_active")
+                for leaderboard_id, period, metric in cursor.fetchall():
+                    entries = self.engine.leaderboard(period, metric, on)
+                    cursor.execute(f"DELETE FROM leaderboard_entries WHERE leaderboard_id = {marker}",
+                                   (leaderboard_id,))
+                    for start in range(0, len(entries), ReportLoader.write_batch_size):
+                        batch = entries[start:start + ReportLoader.write_batch_size]
+                        values = ", ".join([f"({', '.join([marker] * 4)})"] * len(batch))
+                        cursor.execute(
+                            f"INSERT INTO leaderboard_entries (leaderboard_id, user_id, rank, score) VALUES {values}",
+                            [value for entry in batch
+                             for value in (leaderboard_id, entry['user_id'], entry['rank'], entry['score'])]
+                        )
+                    written += len(entries)
+            finally:
+                cursor.close()
+            connection.commit()
+        return written
+
 # Example usage and testing
 if __name__ == "__main__":
     # Initialize AI engine
@@ -0,0 +1,22 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ai-engine.py and ai-benchmark.py are not importable module names; expose them
+# as ai_engine and ai_benchmark
+for name, file_name in (('ai_engine', 'ai-engine.py'), ('ai_benchmark', 'ai-benchmark.py')):
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, file_name))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+
+@pytest.fixture(scope='session')
+def workload():
+    """Small seeded workload; payloads are regenerated per call, so tests may mutate them"""
+    from ai_benchmark import SyntheticWorkload
+    return SyntheticWorkload(tasks_per_user=20, logs_per_user=60, max_history_days=60)
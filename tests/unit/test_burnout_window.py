@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from ai_engine import BurnoutDetector, BurnoutWindow
+
+def reference_inputs(days, window_days):
+    """assess_burnout_risk inputs from one user's daily rows, computed per user"""
+    window = days[-window_days:]
+    habits = sum(day['total_habits'] for day in window)
+    due = sum(day['tasks_due'] for day in window)
+    return {
+        'avg_daily_working_hours': np.mean([day['working_hours'] for day in window]),
+        'productivity_trend': [day['productivity_score'] for day in days[-7:]],
+        'habit_completion_rate': sum(day['habits_completed'] for day in window) / habits if habits else 1.0,
+        'task_overdue_rate': sum(day['tasks_overdue'] for day in window) / due if due else 0.0
+    }
+
+class TestBurnoutWindow:
+    @pytest.fixture(autouse=True)
+    def history(self):
+        rng = np.random.default_rng(7)
+        self.start = date(2024, 3, 1)
+        # Users observed on a varying number of days, some fewer than the 7-day trend
+        self.history = {}
+        for user in range(40):
+            n_days = int(rng.integers(1, 16))
+            self.history[f'user-{user}'] = [{
+                'date': (self.start + timedelta(days=int(offset))).isoformat(),
+                'working_hours': float(rng.uniform(4, 13)),
+                'productivity_score': float(rng.uniform(10, 90)),
+                'habits_completed': float(rng.integers(0, 4)),
+                'total_habits': float(rng.integers(0, 4)),
+                'tasks_overdue': float(rng.integers(0, 3)),
+                'tasks_due': float(rng.integers(0, 5))
+            } for offset in np.sort(rng.choice(20, n_days, replace=False))]
+        self.detector = BurnoutDetector()
+
+    def fill(self, window):
+        # One frame per calendar date, as the daily aggregation job would send them
+        for offset in range(20):
+            day = (self.start + timedelta(days=offset)).isoformat()
+            rows = [dict(row, user_id=user) for user, days in self.history.items()
+                    for row in days if row['date'] == day]
+            if rows:
+                window.append({key: [row[key] for row in rows] for key in rows[0]})
+
+    @pytest.mark.parametrize('window_days', [7, 10])
+    def test_batch_reports_match_assess_burnout_risk(self, window_days):
+        window = BurnoutWindow(window_days)
+        self.fill(window)
+        result = self.detector.assess_burnout_risk_batch(window.burnout_inputs(), details=True)
+
+        expected = [
+            self.detector.assess_burnout_risk(reference_inputs(self.history[user], window_days))
+            for user in window.user_ids
+        ]
+        assert result['reports'] == expected
+        assert result['risk_score'].tolist() == [report['risk_score'] for report in expected]
+        assert {report['risk_level'] for report in expected} != {'low'}
+
+    def test_same_date_replaces_and_older_dates_are_ignored(self):
+        window = BurnoutWindow()
+        window.append({'user_id': ['a'], 'date': ['2024-03-02'], 'working_hours': [8.0]})
+        window.append({'user_id': ['a', 'a'], 'date': ['2024-03-02', '2024-03-01'],
+                       'working_hours': [12.0, 20.0]})
+        inputs = window.burnout_inputs()
+        assert window.days_seen[0] == 1
+        assert inputs['avg_daily_working_hours'].tolist() == [12.0]
+
+    def test_window_must_cover_trend(self):
+        with pytest.raises(ValueError):
+            BurnoutWindow(window_days=5)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from ai_engine import OptimalTimeAnalyzer, time_logs_to_records
+
+def reference_profile(time_logs):
+    """Per-user loop: mean score per hour minus the user's overall mean"""
+    by_hour = OptimalTimeAnalyzer().analyze_productivity_patterns(time_logs)['productivity_by_hour']
+    scores = [log.get('productivity_score', 50) for log in time_logs if log.get('start_time')]
+    profile = np.zeros(24)
+    for hour, mean in by_hour.items():
+        profile[hour] = mean - np.mean(scores)
+    return profile
+
+class TestCohorts:
+    @pytest.fixture(autouse=True)
+    def users(self, workload):
+        self.log_lists = [user['time_logs'] for user in workload.users(60)]
+        self.analyzer = OptimalTimeAnalyzer()
+
+    def test_profiles_match_per_user_loop(self):
+        profiles, has_logs = self.analyzer.productivity_profiles(self.log_lists + [[]])
+        assert has_logs.tolist() == [True] * len(self.log_lists) + [False]
+        assert np.allclose(profiles[:-1], [reference_profile(logs) for logs in self.log_lists])
+        assert not profiles[-1].any()
+
+    def test_record_arrays_match_dicts(self):
+        records = [time_logs_to_records(logs) for logs in self.log_lists]
+        assert np.allclose(
+            self.analyzer.productivity_profiles(records)[0],
+            self.analyzer.productivity_profiles(self.log_lists)[0]
+        )
+
+    def test_chunked_fit_assigns_nearest_center(self):
+        chunks = [self.log_lists[start:start + 20] for start in range(0, 60, 20)]
+        report = self.analyzer.fit_cohorts(iter(chunks))
+        assert report == {'users': 60, 'batches': 3, 'cohorts': 3}
+
+        cohorts = self.analyzer.assign_cohorts(self.log_lists + [[]])
+        profiles, _ = self.analyzer.productivity_profiles(self.log_lists)
+        assert cohorts[:-1].tolist() == self.analyzer.model.predict(profiles).tolist()
+        assert cohorts[-1] == -1
+
+    def test_small_chunks_are_pooled_until_a_batch_fills(self):
+        chunks = [[logs] for logs in self.log_lists[:7]]
+        report = self.analyzer.fit_cohorts(chunks)
+        assert report == {'users': 7, 'batches': 3, 'cohorts': 3}
+
+    def test_assigning_before_fitting_raises(self):
+        with pytest.raises(ValueError):
+            self.analyzer.assign_cohorts(self.log_lists)
+
+    def test_too_few_users_to_fit_raises(self):
+        with pytest.raises(ValueError):
+            self.analyzer.fit_cohorts([self.log_lists[:2]])
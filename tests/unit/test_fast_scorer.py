@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from ai_engine import ProcrastinationDetector
+
+class TestFastScorer:
+    @pytest.fixture(autouse=True)
+    def detector(self, workload):
+        tasks = workload.training_tasks(3000)
+        self.train_tasks, self.held_out = tasks[:2000], tasks[2000:]
+        self.detector = ProcrastinationDetector()
+        self.detector.train(self.train_tasks)
+        self.detector.distill(self.train_tasks)
+
+    def test_fast_scores_agree_with_forest_on_held_out_tasks(self):
+        report = self.detector.evaluate_fast_scorer(self.held_out, requests=20)
+        assert report['tasks'] == 1000
+        assert report['agreement'] >= 0.95
+        assert report['rank_correlation'] >= 0.95
+        assert report['mean_abs_error'] < 0.02
+        assert abs(report['fast_outlier_rate'] - report['forest_outlier_rate']) < 0.02
+
+    def test_fast_backend_flags_match_fast_scores(self):
+        scores = self.detector.score_tasks(self.held_out, backend='fast')
+        detected = self.detector.detect_procrastination(self.held_out, backend='fast')
+        assert [d['task_id'] for d in detected] == [
+            self.held_out[i].get('id') for i in np.flatnonzero(scores < 0)
+        ]
+
+    def test_retraining_discards_fast_scorer(self):
+        self.detector.train(self.held_out)
+        with pytest.raises(ValueError):
+            self.detector.score_tasks(self.held_out, backend='fast')
+        with pytest.raises(ValueError):
+            self.detector.evaluate_fast_scorer(self.held_out)
+
+    def test_distill_requires_trained_detector(self):
+        with pytest.raises(ValueError):
+            ProcrastinationDetector().distill(self.train_tasks)
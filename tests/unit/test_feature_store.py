@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+
+from ai_engine import FeatureStore, FocusFlowAI, history_to_records, time_logs_to_records
+
+def without_timestamps(insights):
+    return {key: value for key, value in insights.items() if key != 'generated_at'}
+
+class TestFeatureStore:
+    @pytest.fixture(autouse=True)
+    def store(self, tmp_path, workload):
+        self.root = str(tmp_path / 'features')
+        self.store = FeatureStore(self.root)
+        self.users = {user['user_id']: user for user in workload.users(3)}
+        for user in self.users.values():
+            user['time_logs'].sort(key=lambda log: log['start_time'])
+
+    def test_ingest_and_read_round_trip(self):
+        written = self.store.append_user_data(self.users)
+        assert written['time_logs'] == sum(len(user['time_logs']) for user in self.users.values())
+
+        logs = self.store.read_users('time_logs')
+        history = self.store.read_users('history')
+        tasks = self.store.read_users('tasks')
+        for user_id, user in self.users.items():
+            assert np.array_equal(logs[user_id], time_logs_to_records(user['time_logs']))
+            assert np.array_equal(history[user_id], history_to_records(user['historical_data']))
+            assert tasks[user_id].ids.tolist() == [task['id'] for task in user['recent_tasks']]
+        assert len(self.store.read_users('tasks', ['unknown'])['unknown']) == 0
+
+    def test_partitions_by_month_and_user(self):
+        self.store.users_per_partition = 2
+        self.store.append_user_data(self.users)
+
+        month = self.store.partitions('history')[-1]
+        assert sorted(os.listdir(os.path.join(self.root, 'history', month))) == ['users-00000', 'users-00001']
+
+    def test_single_part_reads_are_memory_mapped_views(self):
+        self.store.append_user_data(self.users)
+        user_id = 'user-1'
+        month = self.store.partitions('history')[-1]
+
+        [rows] = self.store.user_slices('history', [user_id], month, month)[user_id]
+        assert isinstance(rows, np.memmap)
+        assert isinstance(self.store.read_users('history', [user_id], month, month)[user_id], np.memmap)
+
+    def test_compact_keeps_latest_history_row(self):
+        self.store.append('history', ['u1'], [[{'date': '2024-03-01', 'productivity_score': 10}]])
+        self.store.append('history', ['u1'], [[{'date': '2024-03-01', 'productivity_score': 90}]])
+
+        assert self.store.compact('history') == {'history': 1}
+        [row] = self.store.read_users('history', ['u1'])['u1']
+        assert row['productivity_score'] == 90
+
+    def test_insights_read_records_from_store(self, workload):
+        engine = FocusFlowAI(feature_store=self.store)
+        engine.procrastination_detector.train(workload.training_tasks(500))
+        engine.ingest(self.users)
+
+        fields = FeatureStore.user_data_tables
+        by_id = [{key: value for key, value in user.items() if key not in fields} for user in self.users.values()]
+        expected = [without_timestamps(insights) for insights in engine.generate_insights_batch(list(self.users.values()))]
+
+        assert [without_timestamps(insights) for insights in engine.generate_insights_batch(by_id)] == expected
+        assert without_timestamps(engine.generate_comprehensive_insights(by_id[0])) == expected[0]
@@ -0,0 +1,106 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from ai_engine import ConnectionPool, GamificationEngine, GamificationStream
+
+SCHEMA = """
+CREATE TABLE user_events (
+    id TEXT PRIMARY KEY, user_id TEXT, event_type_id TEXT, occurred_at TEXT, duration_minutes INTEGER,
+    points_earned INTEGER, weightage_applied REAL, created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE event_weightage_history (
+    id TEXT PRIMARY KEY, event_type_id TEXT, user_id TEXT, old_weightage REAL, new_weightage REAL,
+    changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+class TestGamificationStream:
+    @pytest.fixture(autouse=True)
+    def database(self, tmp_path):
+        path = str(tmp_path / 'focusflow.db')
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+        self.pool = ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False))
+        self.snapshot_path = str(tmp_path / 'gamification.npz')
+        self.stream = GamificationStream(GamificationEngine(), self.pool, snapshot_path=self.snapshot_path)
+        self.events = 0
+        yield
+        self.pool.close()
+        self.connection.close()
+
+    def log_event(self, user_id='u1', points=10):
+        self.events += 1
+        self.connection.execute(
+            "INSERT INTO user_events (id, user_id, event_type_id, occurred_at, points_earned, weightage_applied) "
+            "VALUES (?, ?, 'deep_work', '2024-03-10 09:00:00', ?, 1.0)", (f"e{self.events}", user_id, points)
+        )
+        self.connection.commit()
+
+    def total_points(self, engine, user_id='u1'):
+        [profile] = engine.profiles([user_id])
+        return profile['total_points']
+
+    def test_same_day_events_with_text_timestamps(self):
+        self.log_event()
+        assert self.stream.consume()['events'] == 1
+        # CURRENT_TIMESTAMP text ('YYYY-MM-DD HH:MM:SS') must not be compared with an ISO 'T' bound
+        assert ' ' in self.stream.engine.position['user_events']['at']
+
+        self.log_event(points=5)
+        assert self.stream.consume()['events'] == 1
+        assert self.stream.consume()['events'] == 0
+        assert self.total_points(self.stream.engine) == 15
+
+    def test_weightage_change_rescores_consumed_events(self):
+        self.log_event()
+        self.stream.consume()
+        self.connection.execute(
+            "INSERT INTO event_weightage_history (id, event_type_id, user_id, old_weightage, new_weightage, "
+            "changed_at) VALUES ('h1', 'deep_work', 'u1', 1.0, 2.0, '2024-03-10 08:00:00')"
+        )
+        self.connection.commit()
+
+        assert self.stream.consume()['events_rescored'] == 1
+        assert self.total_points(self.stream.engine) == 20
+
+    def test_snapshot_restores_positions(self):
+        self.log_event()
+        self.stream.consume()
+
+        restored = GamificationStream.restore(self.pool, self.snapshot_path)
+        self.log_event(points=5)
+        assert restored.consume()['events'] == 1
+        assert self.total_points(restored.engine) == 15
+
+    def test_snapshot_accepts_driver_datetimes(self, tmp_path):
+        engine = GamificationEngine()
+        engine.position['user_events'] = {'at': datetime(2024, 3, 10, 9, tzinfo=timezone.utc), 'recent': {}}
+        engine.save_snapshot(str(tmp_path / 'positions.npz'))
+
+        restored = GamificationEngine.load_snapshot(str(tmp_path / 'positions.npz'))
+        assert restored.position['user_events']['at'] == '2024-03-10T09:00:00+00:00'
+
+
+class TestProductivityScores:
+    def setup_method(self):
+        self.engine = GamificationEngine(retain_days=7)
+
+    def all_time_score(self, user_id='u1'):
+        board = self.engine.leaderboard('all_time', 'productivity_score')
+        return {row['user_id']: row['score'] for row in board}[user_id]
+
+    def test_resent_score_replaces_the_earlier_one(self):
+        self.engine.record_productivity_scores(['u1'], ['2024-03-10'], [50])
+        assert self.engine.record_productivity_scores(['u1'], ['2024-03-10'], [90]) == 1
+        assert self.all_time_score() == 90
+
+    def test_score_before_retention_is_not_counted_twice(self):
+        self.engine.record_productivity_scores(['u1'], ['2024-03-01'], [80])
+        # A later day expires 2024-03-01's daily bucket
+        self.engine.record_productivity_scores(['u2'], ['2024-03-20'], [40])
+
+        assert self.engine.record_productivity_scores(['u1'], ['2024-03-01'], [60]) == 0
+        assert self.all_time_score() == 80
@@ -0,0 +1,109 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from ai_engine import HourlyAccumulator
+
+class TestHourlyAccumulator:
+    def setup_method(self):
+        self.offset = timezone(timedelta(hours=2))
+        self.start_times = [
+            datetime(2024, 1, 1, 9, 30, tzinfo=self.offset),
+            datetime(2024, 1, 1, 9, 45, tzinfo=self.offset),
+            datetime(2024, 1, 2, 14, 0, tzinfo=self.offset)
+        ]
+        self.scores = [80, 90, 40]
+
+    def test_update_accepts_aware_datetimes(self):
+        accumulator = HourlyAccumulator().update([
+            {'start_time': start_time, 'productivity_score': score}
+            for start_time, score in zip(self.start_times, self.scores)
+        ])
+
+        # Hours are bucketed by each value's own wall clock, as with ISO strings
+        assert accumulator.counts[9] == 2
+        assert accumulator.counts[14] == 1
+        assert accumulator.sums[9] == 170
+
+    def test_update_arrays_matches_iso_strings(self):
+        from_datetimes = HourlyAccumulator(by_weekday=True).update_arrays(self.start_times, self.scores)
+        from_strings = HourlyAccumulator(by_weekday=True).update_arrays(
+            [start_time.isoformat() for start_time in self.start_times], self.scores
+        )
+
+        assert np.array_equal(from_datetimes.counts, from_strings.counts)
+        assert np.array_equal(from_datetimes.sums, from_strings.sums)
+
+    def test_mixed_naive_and_aware_datetimes(self):
+        accumulator = HourlyAccumulator().update_arrays(
+            [datetime(2024, 1, 1, 9, 0), datetime(2024, 1, 1, 9, 0, tzinfo=timezone.utc)], [50, 50]
+        )
+        assert accumulator.counts[9] == 2
+
+    def test_decay_reference_is_compared_in_utc(self):
+        # The same instant as the first log, expressed in UTC
+        reference_time = self.start_times[0].astimezone(timezone.utc)
+        accumulator = HourlyAccumulator(half_life_days=1, reference_time=reference_time).update_arrays(
+            self.start_times[:1], self.scores[:1]
+        )
+        assert accumulator.counts[9] == pytest.approx(1)
+
+        accumulator.decay_to(reference_time.astimezone(self.offset) + timedelta(days=1))
+        assert accumulator.counts[9] == pytest.approx(0.5)
+
+    def test_default_reference_is_now(self, monkeypatch):
+        # A host clock far from UTC must not shift ages of UTC-normalized logs
+        monkeypatch.setenv('TZ', 'America/Los_Angeles')
+        time.tzset()
+        accumulator = HourlyAccumulator(half_life_days=1).update_arrays([datetime.now(self.offset)])
+        monkeypatch.undo()
+        time.tzset()
+        assert accumulator.counts.sum() == pytest.approx(1, abs=1e-3)
+
+
+class TestHourlyAccumulatorCursor:
+    def setup_method(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.execute(
+            "CREATE TABLE time_logs (id INTEGER PRIMARY KEY, start_time TEXT, productivity_score INTEGER)"
+        )
+        self.logs = [
+            ('2024-01-01 09:15:00', 80), ('2024-01-01 09:45:00', 60),
+            ('2024-01-02 14:00:00', 90), ('2024-01-03 20:30:00', None)
+        ]
+        self.connection.executemany(
+            "INSERT INTO time_logs (start_time, productivity_score) VALUES (?, ?)", self.logs
+        )
+
+    def teardown_method(self):
+        self.connection.close()
+
+    def expected(self):
+        return HourlyAccumulator().update([
+            {'start_time': start_time, 'productivity_score': 50 if score is None else score}
+            for start_time, score in self.logs
+        ])
+
+    def test_update_from_cursor_matches_dicts(self):
+        cursor = self.connection.execute("SELECT start_time, productivity_score FROM time_logs")
+        accumulator = HourlyAccumulator().update(cursor, chunk_size=3)
+        expected = self.expected()
+
+        assert accumulator.logs_seen == 4
+        assert np.array_equal(accumulator.counts, expected.counts)
+        assert accumulator.productivity_by_hour() == expected.productivity_by_hour()
+
+    def test_update_from_cursor_without_scores(self):
+        cursor = self.connection.execute("SELECT id, start_time FROM time_logs")
+        accumulator = HourlyAccumulator().update(cursor)
+        assert accumulator.productivity_by_hour() == {9: 50.0, 14: 50.0, 20: 50.0}
+
+    def test_row_tuples_need_columns(self):
+        rows = self.connection.execute("SELECT start_time, productivity_score FROM time_logs").fetchall()
+        with pytest.raises(ValueError):
+            HourlyAccumulator().update(rows)
+        accumulator = HourlyAccumulator().update(rows, columns=['start_time', 'productivity_score'])
+        assert accumulator.logs_seen == 4
@@ -0,0 +1,6 @@
+from ai_benchmark import check_import_budget, measure_import_cost
+
+def test_import_stays_within_budget():
+    # measure_import_cost imports ai-engine.py in a fresh interpreter
+    cost = measure_import_cost()
+    assert check_import_budget(cost) == []
@@ -0,0 +1,33 @@
+import pytest
+
+from ai_engine import FocusFlowAI
+
+def without_timestamps(insights):
+    return {key: value for key, value in insights.items() if key != 'generated_at'}
+
+class TestInsightsBatch:
+    @pytest.fixture(autouse=True)
+    def engine(self, workload):
+        self.engine = FocusFlowAI()
+        self.engine.procrastination_detector.train(workload.training_tasks(500))
+        self.users = workload.users(6)
+        # Completing more tasks than planned pushes the weighted total past 100
+        self.users[0].update(tasks_completed=9, total_tasks=3, estimated_minutes=60, actual_minutes=30)
+        self.users[1].update(tasks_completed=0, total_tasks=5, habits_completed=0, focus_sessions=3,
+                             distraction_events=20)
+
+    def test_batch_matches_single_user_insights(self):
+        batch = self.engine.generate_insights_batch(self.users, chunk_size=4)
+        single = [self.engine.generate_comprehensive_insights(user) for user in self.users]
+
+        assert [without_timestamps(insights) for insights in batch] == [
+            without_timestamps(insights) for insights in single
+        ]
+
+    def test_productivity_score_has_the_single_user_type(self):
+        batch = self.engine.generate_insights_batch(self.users)
+        single = [self.engine.generate_comprehensive_insights(user) for user in self.users]
+
+        assert single[0]['productivity_score'] == 100
+        for batch_insights, single_insights in zip(batch, single):
+            assert type(batch_insights['productivity_score']) is type(single_insights['productivity_score'])
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+from sklearn.base import clone
+
+import ai_engine
+from ai_engine import FocusFlowAI, InsightsCache
+
+class TestInsightsCache:
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(ai_engine.time, 'monotonic', lambda: self.now)
+
+    def test_entries_expire_after_ttl(self):
+        cache = InsightsCache(ttl_seconds=60)
+        computed_at = datetime(2024, 3, 1)
+        cache.put(('trend', 'a'), 1, computed_at)
+        self.now += 60
+        assert cache.get(('trend', 'a')) == (1, computed_at)
+        self.now += 1
+        assert cache.get(('trend', 'a')) is None
+        assert cache.stats()['expirations'] == 1
+        assert cache.stats()['entries'] == 0
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = InsightsCache(max_entries=2)
+        computed_at = datetime(2024, 3, 1)
+        cache.put(('trend', 'a'), 1, computed_at)
+        cache.put(('trend', 'b'), 2, computed_at)
+        cache.get(('trend', 'a'))
+        cache.put(('trend', 'c'), 3, computed_at)
+        assert cache.get(('trend', 'b')) is None
+        assert cache.get(('trend', 'a')) == (1, computed_at)
+        assert cache.get(('trend', 'c')) == (3, computed_at)
+        assert cache.stats()['evictions'] == 1
+        assert cache.stats()['components'] == {'trend': {'hits': 3, 'misses': 1}}
+
+class TestDetectionCacheKey:
+    @pytest.fixture(autouse=True)
+    def engine(self, workload):
+        self.user = workload.user(0)
+        self.engine = FocusFlowAI(cache=InsightsCache())
+        self.engine.procrastination_detector.train(workload.training_tasks(500))
+
+    def procrastination_counts(self):
+        return self.engine.cache.stats()['components']['procrastination']
+
+    @pytest.mark.parametrize('attribute', ['model', 'scaler'])
+    def test_assigning_model_or_scaler_invalidates_detections(self, attribute):
+        detector = self.engine.procrastination_detector
+        self.engine.generate_comprehensive_insights(self.user)
+        self.engine.generate_comprehensive_insights(self.user)
+        assert self.procrastination_counts() == {'hits': 1, 'misses': 1}
+
+        generation = detector.generation
+        setattr(detector, attribute, clone(getattr(detector, attribute)).fit(
+            detector.extract_features(self.user['recent_tasks'])
+        ))
+        assert detector.generation != generation
+
+        self.engine.generate_comprehensive_insights(self.user)
+        assert self.procrastination_counts() == {'hits': 1, 'misses': 2}
+
+    def test_retraining_invalidates_detections(self, workload):
+        self.engine.generate_comprehensive_insights(self.user)
+        self.engine.procrastination_detector.train(workload.training_tasks(400))
+        self.engine.generate_comprehensive_insights(self.user)
+        assert self.procrastination_counts() == {'hits': 0, 'misses': 2}
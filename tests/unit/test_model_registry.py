@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from ai_engine import FocusFlowAI, ModelRegistry, ProcrastinationDetector
+
+class TestModelRegistry:
+    @pytest.fixture(autouse=True)
+    def registry(self, tmp_path, workload):
+        self.registry = ModelRegistry(str(tmp_path / 'models'))
+        self.tasks = workload.training_tasks(500)
+        self.detector = ProcrastinationDetector()
+        self.detector.train(self.tasks)
+
+    def test_round_trip_scores_match(self):
+        version = self.registry.save('procrastination_detector', self.detector)
+        loaded = self.registry.load('procrastination_detector', version)
+        assert loaded.is_trained
+        assert np.array_equal(loaded.score_tasks(self.tasks), self.detector.score_tasks(self.tasks))
+        assert loaded.generation != self.detector.generation
+
+    def test_load_defaults_to_latest_and_keep_last_prunes(self):
+        for _ in range(3):
+            self.registry.save('procrastination_detector', self.detector, keep_last=2)
+        assert self.registry.versions('procrastination_detector') == [2, 3]
+        assert self.registry.metadata('procrastination_detector', 3)['component'] == 'ProcrastinationDetector'
+        assert self.registry.load('procrastination_detector') is not None
+
+    def test_missing_component_loads_none(self):
+        assert self.registry.load('procrastination_detector') is None
+
+    def test_engine_save_and_load_models(self, workload):
+        engine = FocusFlowAI(registry=self.registry)
+        engine.procrastination_detector = self.detector
+        versions = engine.save_models()
+        assert versions['procrastination_detector'] == 1
+
+        restored = FocusFlowAI(registry=self.registry)
+        restored.load_models()
+        tasks = workload.user(0)['recent_tasks']
+        assert (restored.procrastination_detector.detect_procrastination(tasks)
+                == self.detector.detect_procrastination(tasks))
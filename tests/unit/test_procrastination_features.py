@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import numpy as np
+
+from ai_engine import ProcrastinationDetector
+
+PRIORITY_WEIGHT = {'low': 1, 'medium': 2, 'high': 3, 'urgent': 4}
+
+def reference_features(tasks):
+    """Per-task feature loop the columnar pipeline replaced"""
+    features = []
+    for task in tasks:
+        if task.get('created_at') and task.get('started_at'):
+            delay = (
+                datetime.fromisoformat(task['started_at']) - datetime.fromisoformat(task['created_at'])
+            ).total_seconds() / 3600
+        else:
+            delay = 0
+        time_ratio = task.get('actual_minutes', 60) / max(task.get('estimated_minutes', 60), 1)
+        postponements = task.get('postponement_count', 0)
+        completion_hour = datetime.fromisoformat(task['completed_at']).hour if task.get('completed_at') else 12
+        priority = PRIORITY_WEIGHT.get(task.get('priority', 'medium'), 2)
+        features.append([delay, time_ratio, postponements, completion_hour, priority])
+    return np.array(features, dtype=float)
+
+class TestTaskFeatures:
+    def setup_method(self):
+        self.detector = ProcrastinationDetector()
+
+    def test_columnar_features_match_per_task_loop(self, workload):
+        tasks = workload.training_tasks(300)
+        assert np.allclose(self.detector.extract_features(tasks), reference_features(tasks))
+
+    def test_missing_fields_take_the_loop_defaults(self):
+        tasks = [
+            {'created_at': '2024-03-01T09:00:00'},
+            {'created_at': '2024-03-01T09:00:00', 'started_at': '2024-03-02T10:30:00', 'priority': 'urgent',
+             'estimated_minutes': 0, 'actual_minutes': 45, 'completed_at': '2024-03-02T18:15:00'},
+            {'priority': 'unknown', 'postponement_count': 4}
+        ]
+        assert np.allclose(self.detector.extract_features(tasks), reference_features(tasks))
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from ai_engine import ProcrastinationDetector
+
+class TestScoreTasks:
+    @pytest.fixture(autouse=True)
+    def detector(self, workload):
+        self.tasks = workload.training_tasks(500)
+        self.detector = ProcrastinationDetector()
+        self.detector.train(self.tasks)
+
+    def decision_scores(self, tasks):
+        detector = self.detector
+        return detector.model.decision_function(detector.scaler.transform(detector.extract_features(tasks)))
+
+    def test_scores_match_decision_function(self):
+        assert np.allclose(self.detector.score_tasks(self.tasks), self.decision_scores(self.tasks))
+
+    def test_detections_are_the_negative_scores(self, workload):
+        tasks = workload.user(0)['recent_tasks']
+        scores = self.decision_scores(tasks)
+        detected = self.detector.detect_procrastination(tasks)
+        assert [d['task_id'] for d in detected] == [
+            tasks[i].get('id') for i in np.flatnonzero(scores < 0)
+        ]
+        assert np.allclose([d['procrastination_score'] for d in detected], np.abs(scores[scores < 0]))
+
+    def test_untrained_detector_scores_nothing(self):
+        assert len(ProcrastinationDetector().score_tasks(self.tasks)) == 0
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from ai_engine import ProductivityScorer
+
+class TestCalculateScores:
+    def setup_method(self):
+        self.scorer = ProductivityScorer()
+
+    def columns(self, users):
+        return {
+            field: np.array([user.get(field, np.nan) for user in users], dtype=float)
+            for field in ProductivityScorer.field_defaults
+        }
+
+    def test_matches_daily_score_per_user(self, workload):
+        users = workload.users(50)
+        scores = self.scorer.calculate_scores(self.columns(users))
+        assert scores.tolist() == [self.scorer.calculate_daily_score(user) for user in users]
+
+    def test_missing_values_take_dict_defaults(self):
+        users = [
+            {},
+            {'tasks_completed': 3, 'total_tasks': 0},
+            {'estimated_minutes': 90, 'actual_minutes': 0, 'focus_sessions': 2, 'distraction_events': 15},
+            {'tasks_completed': 12, 'total_tasks': 4, 'habits_completed': 5, 'total_habits': 1}
+        ]
+        expected = [self.scorer.calculate_daily_score(user) for user in users]
+
+        # NaN cells and absent columns both read as the dict defaults
+        assert self.scorer.calculate_scores(self.columns(users)).tolist() == expected
+        assert self.scorer.calculate_scores({'tasks_completed': [3.0]}).tolist() == [
+            self.scorer.calculate_daily_score({'tasks_completed': 3})
+        ]
+
+    def test_accepts_a_dataframe(self, workload):
+        pandas = pytest.importorskip('pandas')
+        users = workload.users(10)
+        frame = pandas.DataFrame([{field: user[field] for field in ProductivityScorer.field_defaults} for user in users])
+        assert np.array_equal(self.scorer.calculate_scores(frame), self.scorer.calculate_scores(self.columns(users)))
@@ -0,0 +1,96 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from ai_engine import ConnectionPool, FocusFlowAI, RecomputeScheduler, ReportLoader
+
+SCHEMA = """
+CREATE TABLE tasks (
+    id TEXT PRIMARY KEY, user_id TEXT, title TEXT, priority TEXT, status TEXT,
+    estimated_minutes INTEGER, actual_minutes INTEGER, due_date TEXT, completed_at TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP, updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE time_logs (
+    id INTEGER PRIMARY KEY, user_id TEXT, task_id TEXT, start_time TEXT, end_time TEXT,
+    duration_minutes INTEGER, updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE habits (
+    id INTEGER PRIMARY KEY, user_id TEXT, is_active BOOLEAN, updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE habit_logs (
+    id INTEGER PRIMARY KEY, user_id TEXT, habit_id INTEGER, completed_at TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE ai_reports (
+    id INTEGER PRIMARY KEY, user_id TEXT, report_type TEXT, report_date TEXT, productivity_score REAL,
+    insights TEXT NOT NULL, recommendations TEXT, patterns_detected TEXT,
+    UNIQUE(user_id, report_type, report_date)
+);
+"""
+
+SOURCES = {
+    table: source for table, source in RecomputeScheduler.change_sources.items() if table != 'user_events'
+}
+
+class TestRecomputeScheduler:
+    @pytest.fixture(autouse=True)
+    def database(self, tmp_path):
+        path = str(tmp_path / 'focusflow.db')
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(
+            "INSERT INTO tasks (id, user_id, title, priority, status, estimated_minutes, created_at) "
+            "VALUES ('t1', 'u1', 'Write report', 'high', 'pending', 60, '2024-03-09 09:00:00')"
+        )
+        self.connection.commit()
+        
+        self.pool = ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False))
+        self.scheduler = RecomputeScheduler(FocusFlowAI(), ReportLoader(self.pool), sources=SOURCES)
+        self.report_date = date(2024, 3, 10)
+        yield
+        self.pool.close()
+        self.connection.close()
+
+    def insert_time_log(self):
+        self.connection.execute(
+            "INSERT INTO time_logs (user_id, task_id, start_time, duration_minutes) "
+            "VALUES ('u1', 't1', '2024-03-10 10:00:00', 30)"
+        )
+        self.connection.commit()
+
+    def test_first_time_log_marks_procrastination_stale(self):
+        self.scheduler.run_once(self.report_date)
+        self.insert_time_log()
+
+        assert self.scheduler.poll() == 1
+        [(user_id, stale, _)] = self.scheduler._next_batch()
+        assert user_id == 'u1'
+        # The log sets the task's started_at, a procrastination feature
+        assert 'procrastination_patterns' in stale
+        assert 'optimal_working_hours' in stale
+
+    def test_poll_sees_same_day_changes_in_text_timestamps(self):
+        self.insert_time_log()
+        self.scheduler.run_once(self.report_date)
+        # CURRENT_TIMESTAMP text ('YYYY-MM-DD HH:MM:SS') must not be compared with an ISO 'T' bound
+        assert ' ' in self.scheduler.watermarks['time_logs']
+
+        self.insert_time_log()
+        assert self.scheduler.poll() == 1
+        assert self.scheduler.pending == 1
+
+    def test_same_second_change_is_not_dropped(self):
+        self.scheduler.run_once(self.report_date)
+        watermark = self.scheduler.watermarks['tasks']
+        self.connection.execute(
+            "INSERT INTO tasks (id, user_id, title, priority, status, created_at, updated_at) "
+            "VALUES ('t2', 'u1', 'Review', 'low', 'pending', '2024-03-10 08:00:00', ?)", (watermark,)
+        )
+        self.connection.commit()
+
+        assert self.scheduler.poll() == 1
+        # Re-reading the grace window does not queue the same rows again
+        self.scheduler._next_batch()
+        assert self.scheduler.poll() == 0
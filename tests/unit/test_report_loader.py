@@ -0,0 +1,104 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from ai_engine import ConnectionPool, FocusFlowAI, ReportLoader
+
+SCHEMA = """
+CREATE TABLE tasks (
+    id TEXT PRIMARY KEY, user_id TEXT, title TEXT, priority TEXT, status TEXT,
+    estimated_minutes INTEGER, actual_minutes INTEGER, due_date TEXT, completed_at TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE time_logs (
+    id INTEGER PRIMARY KEY, user_id TEXT, task_id TEXT, start_time TEXT, end_time TEXT, duration_minutes INTEGER
+);
+CREATE TABLE habits (id INTEGER PRIMARY KEY, user_id TEXT, is_active BOOLEAN);
+CREATE TABLE habit_logs (id INTEGER PRIMARY KEY, user_id TEXT, habit_id INTEGER, completed_at TEXT);
+CREATE TABLE ai_reports (
+    id INTEGER PRIMARY KEY, user_id TEXT, report_type TEXT, report_date TEXT, productivity_score REAL,
+    insights TEXT NOT NULL, recommendations TEXT, patterns_detected TEXT,
+    UNIQUE(user_id, report_type, report_date)
+);
+"""
+
+class TestReportLoader:
+    @pytest.fixture(autouse=True)
+    def database(self, request):
+        # A shared-cache in-memory database lives while any connection to it is open
+        uri = f"file:{request.node.name}?mode=memory&cache=shared"
+        self.connection = sqlite3.connect(uri, uri=True)
+        self.connection.executescript(SCHEMA)
+        self.connection.executemany(
+            "INSERT INTO tasks (id, user_id, title, priority, status, estimated_minutes, actual_minutes, "
+            "due_date, completed_at, created_at) VALUES (?, ?, ?, 'high', ?, ?, ?, ?, ?, ?)",
+            [
+                ('t1', 'u1', 'Write report', 'done', 60, 60, '2024-03-10', '2024-03-10 11:00:00',
+                 '2024-03-08 09:00:00'),
+                ('t2', 'u1', 'Review notes', 'done', 30, 60, '2024-03-10', '2024-03-10 16:00:00',
+                 '2024-03-09 09:00:00'),
+                ('t3', 'u1', 'Plan sprint', 'pending', 45, None, '2024-03-09', None, '2024-03-09 10:00:00'),
+                ('t4', 'u2', 'Tidy inbox', 'pending', 15, None, None, None, '2024-03-09 08:00:00')
+            ]
+        )
+        self.connection.executemany(
+            "INSERT INTO time_logs (user_id, task_id, start_time, duration_minutes) VALUES (?, ?, ?, ?)",
+            [
+                ('u1', 't1', '2024-03-10 10:00:00', 60), ('u1', 't2', '2024-03-10 15:00:00', 60),
+                ('u1', 't3', '2024-03-10 08:00:00', 30), ('u1', None, '2024-03-10 07:00:00', 15),
+                ('u2', 't4', '2024-03-10 09:00:00', 20)
+            ]
+        )
+        self.connection.executemany(
+            "INSERT INTO ai_reports (user_id, report_type, report_date, productivity_score, insights) "
+            "VALUES (?, 'daily', ?, ?, '{}')",
+            [('u1', '2024-03-08', 60.0), ('u1', '2024-03-09', 70.0)]
+        )
+        self.connection.execute("INSERT INTO habits (user_id, is_active) VALUES ('u1', 1)")
+        self.connection.execute("INSERT INTO habit_logs (user_id, habit_id, completed_at) VALUES ('u1', 1, '2024-03-10 07:30:00')")
+        self.connection.commit()
+
+        self.pool = ConnectionPool(lambda: sqlite3.connect(uri, uri=True, check_same_thread=False))
+        self.loader = ReportLoader(self.pool, chunk_size=2)
+        self.report_date = date(2024, 3, 10)
+        yield
+        self.pool.close()
+        self.connection.close()
+
+    def test_builds_user_data_for_every_active_user(self):
+        users = dict(self.loader.iter_user_data(self.report_date))
+        assert list(users) == ['u1', 'u2']
+
+        u1 = users['u1']
+        assert u1['tasks_completed'] == 2
+        assert u1['habits_completed'] == 1
+        assert u1['focus_sessions'] == 4
+        assert [task['id'] for task in u1['recent_tasks']] == ['t1', 't2', 't3']
+        # started_at is the task's first time log
+        assert u1['recent_tasks'][0]['started_at'] == '2024-03-10 10:00:00'
+        assert u1['historical_data'] == [
+            {'date': '2024-03-08', 'productivity_score': 60.0},
+            {'date': '2024-03-09', 'productivity_score': 70.0}
+        ]
+
+    def test_time_logs_score_their_completed_tasks_efficiency(self):
+        users = dict(self.loader.iter_user_data(self.report_date))
+        # Unfinished and task-less logs carry no score and are left out
+        assert [(log['task_id'], log['productivity_score']) for log in users['u1']['time_logs']] == [
+            ('t1', 100.0), ('t2', 50.0)
+        ]
+        assert users['u2']['time_logs'] == []
+
+        insights = FocusFlowAI().generate_insights_batch(list(users.values()))
+        assert insights[0]['optimal_working_hours'] == [10, 15]
+        assert insights[1]['optimal_working_hours'] == []
+
+    def test_written_reports_read_back(self):
+        user_ids, users = next(self.loader.iter_batches(report_date=self.report_date))
+        insights = FocusFlowAI().generate_insights_batch(users)
+
+        assert self.loader.write_reports(user_ids, insights, self.report_date) == 2
+        reports = self.loader.read_reports(user_ids, self.report_date)
+        assert reports['u1']['productivity_score'] == pytest.approx(insights[0]['productivity_score'])
+        assert reports['u2']['optimal_working_hours'] == []
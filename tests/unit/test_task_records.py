@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from ai_engine import FocusFlowAI, ProcrastinationDetector, TaskRecords
+
+class TestTaskRecordsInput:
+    @pytest.fixture(autouse=True)
+    def detector(self, workload):
+        self.detector = ProcrastinationDetector()
+        self.detector.train(workload.training_tasks(500))
+        self.tasks = workload.user(0)['recent_tasks']
+        self.records = TaskRecords.from_dicts(self.tasks)
+
+    def test_features_match_dict_input(self):
+        assert np.array_equal(
+            self.detector.extract_features(self.records), self.detector.extract_features(self.tasks)
+        )
+
+    def test_detections_match_dict_input(self):
+        detected = self.detector.detect_procrastination(self.records)
+        assert detected
+        assert detected == self.detector.detect_procrastination(self.tasks)
+
+    def test_batch_detections_match_dict_input(self, workload):
+        task_lists = [user['recent_tasks'] for user in workload.users(4)]
+        records = [TaskRecords.from_dicts(tasks) for tasks in task_lists]
+        assert (self.detector.detect_procrastination_batch(records)
+                == self.detector.detect_procrastination_batch(task_lists))
+
+    def test_training_on_records_matches_dicts(self, workload):
+        tasks = workload.training_tasks(500)
+        from_records = ProcrastinationDetector()
+        from_records.train(TaskRecords.from_dicts(tasks))
+        assert np.allclose(from_records.score_tasks(self.tasks), self.detector.score_tasks(self.tasks))
+
+    def test_slices_keep_identities(self):
+        part = self.records[2:5]
+        assert [part.identity(i) for i in range(len(part))] == [
+            (task.get('id'), task.get('title')) for task in self.tasks[2:5]
+        ]
+        joined = TaskRecords.concatenate([self.records[:2], self.records[2:]])
+        assert joined.data.tobytes() == self.records.data.tobytes()
+        assert list(joined.ids) == list(self.records.ids)
+
+    def test_engine_insights_match_dict_input(self):
+        engine = FocusFlowAI()
+        engine.procrastination_detector = self.detector
+        from_dicts = engine.generate_comprehensive_insights({'recent_tasks': self.tasks})
+        from_records = engine.generate_comprehensive_insights({'recent_tasks': self.records})
+        assert from_records['procrastination_patterns']
+        assert from_records['procrastination_patterns'] == from_dicts['procrastination_patterns']
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from ai_engine import ProcrastinationDetector, TaskRecords
+
+class TestTrainLarge:
+    @pytest.fixture(autouse=True)
+    def tasks(self, workload):
+        self.tasks = workload.training_tasks(1000)
+        self.recent = workload.user(0)['recent_tasks']
+
+    def test_unsampled_stream_matches_train(self):
+        reference = ProcrastinationDetector()
+        reference.train(self.tasks)
+        detector = ProcrastinationDetector()
+        report = detector.train_large(iter(self.tasks), chunk_size=128, sample_size=None, n_jobs=1)
+
+        assert report['trained']
+        assert (report['tasks'], report['chunks'], report['sampled']) == (1000, 8, 1000)
+        assert np.allclose(detector.score_tasks(self.recent), reference.score_tasks(self.recent))
+
+    def test_segments_score_with_their_own_models(self):
+        detector = ProcrastinationDetector()
+        report = detector.train_large(
+            TaskRecords.from_dicts(self.tasks), chunk_size=256, segment_by='priority', n_jobs=1
+        )
+
+        counts = detector.extract_task_columns(self.tasks)['priority']
+        assert report['segments'] == {
+            code: {'tasks': int((counts == code).sum()), 'trained': (counts == code).sum() >= 50}
+            for code in np.unique(counts)
+        }
+        assert set(detector.segment_models) == {
+            code for code, segment in report['segments'].items() if segment['trained']
+        }
+
+        features = detector.extract_features(self.recent)
+        priorities = features[:, 4]
+        expected = np.empty(len(features))
+        for code in np.unique(priorities):
+            rows = priorities == code
+            scaler, model = detector.segment_models.get(code, (detector.scaler, detector.model))
+            expected[rows] = model.decision_function(scaler.transform(features[rows]))
+        assert np.allclose(detector.score_tasks(self.recent), expected)
+
+    def test_field_segments_fall_back_to_global_model(self):
+        tasks = [dict(task, team='a' if i % 2 else None) for i, task in enumerate(self.tasks)]
+        detector = ProcrastinationDetector()
+        report = detector.train_large(tasks, chunk_size=256, segment_by='team', n_jobs=1)
+
+        assert report['segments'] == {'a': {'tasks': 500, 'trained': True}}
+        scores = detector.score_tasks(tasks[:20])
+        features = detector.extract_features(tasks[:20])
+        scaler, model = detector.segment_models['a']
+        assert np.allclose(scores[1::2], model.decision_function(scaler.transform(features[1::2])))
+        assert np.allclose(
+            scores[::2], detector.model.decision_function(detector.scaler.transform(features[::2]))
+        )
+
+    def test_too_few_tasks_leave_detector_untrained(self):
+        detector = ProcrastinationDetector()
+        report = detector.train_large(self.tasks[:20], n_jobs=1)
+        assert report['trained'] is False
+        assert not detector.is_trained
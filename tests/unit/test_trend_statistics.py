@@ -0,0 +1,62 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from ai_engine import TrendPredictor, TrendStatistics
+
+def statistics_values(statistics):
+    return (statistics.anchor, statistics.last_date, statistics.count, statistics.mean_x,
+            statistics.mean_y, statistics.co_xx, statistics.co_xy)
+
+class TestTrendStatistics:
+    def setup_method(self):
+        self.predictor = TrendPredictor()
+        rng = random.Random(3)
+        start = datetime(2024, 1, 1)
+        self.dated_history = [
+            {'date': (start + timedelta(days=day)).date().isoformat(), 'productivity_score': rng.uniform(30, 90)}
+            for day in range(40)
+        ]
+        # Timestamps at varying times of day, so offsets from a re-anchored start must not drift
+        self.timed_history = [
+            {
+                'date': (start + timedelta(days=day, hours=rng.randint(0, 23), minutes=rng.randint(0, 59))).isoformat(),
+                'productivity_score': rng.uniform(30, 90)
+            }
+            for day in range(40)
+        ]
+
+    def incremental(self, history):
+        statistics = TrendStatistics()
+        for entry in history:
+            statistics.add(entry['date'], entry['productivity_score'])
+        return statistics
+
+    @pytest.mark.parametrize('history_name', ['dated_history', 'timed_history'])
+    def test_add_matches_full_rebuild_in_any_order(self, history_name):
+        history = list(getattr(self, history_name))
+        random.Random(5).shuffle(history)
+
+        incremental = self.incremental(history)
+        rebuilt = self.predictor.build_statistics(history)
+
+        assert statistics_values(incremental)[:3] == statistics_values(rebuilt)[:3]
+        assert statistics_values(incremental)[3:] == pytest.approx(statistics_values(rebuilt)[3:])
+        assert self.predictor.forecast(incremental) == self.predictor.forecast(rebuilt)
+
+    def test_out_of_order_date_with_earlier_time_of_day(self):
+        statistics = TrendStatistics()
+        statistics.add('2024-01-03T06:00:00', 60)
+        statistics.add('2024-01-04T23:00:00', 70)
+        # Earlier date but later time of day than the first anchor
+        statistics.add('2024-01-01T20:00:00', 50)
+
+        rebuilt = self.predictor.build_statistics([
+            {'date': '2024-01-03T06:00:00', 'productivity_score': 60},
+            {'date': '2024-01-04T23:00:00', 'productivity_score': 70},
+            {'date': '2024-01-01T20:00:00', 'productivity_score': 50}
+        ])
+        # Offsets count calendar days: 2, 3 and 0
+        assert statistics.mean_x == pytest.approx(5 / 3)
+        assert statistics_values(statistics)[3:] == pytest.approx(statistics_values(rebuilt)[3:])